@@ -0,0 +1,206 @@
+"""
+Steps-vs-quality benchmark of the speech-latent diffusion solvers.
+
+Builds a small random-init streaming model (no checkpoint needed), samples latents for a fixed set
+of conditions with every solver and step count, and reports the MSE against a many-step reference
+together with the wall-clock time per token.
+
+    python demo/benchmark_diffusion.py --solvers dpm-solver++-2m unipc deis --steps 2 3 4 5
+
+With `--warm_start_sigma`, it also samples a sequence of correlated tokens with warm-started
+diffusion (each token starts from the previous latent) and compares it to cold starts.
+
+    python demo/benchmark_diffusion.py --solvers dpm-solver++-2m --steps 5 10 --warm_start_sigma 1.0
+
+With `--picard_tolerance`, it also runs the parallel-in-time (Picard) sampler and reports the
+iterations (sequential head calls) it needed per token.
+
+    python demo/benchmark_diffusion.py --solvers dpm-solver++-2m --steps 10 20 --picard_tolerance 1e-3
+
+With `--x0_tolerance`, it also runs the early-stopping loop (stop once successive x0 predictions
+change by at most the tolerance) and reports the diffusion steps it ran.
+
+    python demo/benchmark_diffusion.py --solvers dpm-solver++-2m unipc --steps 10 20 --x0_tolerance 1e-2
+"""
+import argparse
+import time
+
+import torch
+from transformers.models.qwen2.configuration_qwen2 import Qwen2Config
+
+from vibevoice.modular.configuration_vibevoice import VibeVoiceAcousticTokenizerConfig, VibeVoiceDiffusionHeadConfig
+from vibevoice.modular.configuration_vibevoice_streaming import VibeVoiceStreamingConfig
+from vibevoice.modular.modeling_vibevoice_streaming_inference import VibeVoiceStreamingForConditionalGenerationInference
+from vibevoice.schedule.solvers import available_solvers
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Benchmark diffusion solvers on a tiny random-init model")
+    parser.add_argument("--solvers", nargs="+", default=available_solvers(), choices=available_solvers())
+    parser.add_argument("--steps", nargs="+", type=int, default=[2, 3, 4, 5, 10])
+    parser.add_argument("--reference_solver", type=str, default="dpm-solver++-2m", choices=available_solvers())
+    parser.add_argument("--reference_steps", type=int, default=20)
+    parser.add_argument("--num_tokens", type=int, default=64, help="Number of conditions (tokens) per measurement")
+    parser.add_argument("--cfg_scale", type=float, default=1.5)
+    parser.add_argument("--hidden_size", type=int, default=256)
+    parser.add_argument("--head_layers", type=int, default=4)
+    parser.add_argument("--latent_size", type=int, default=64)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--warm_start_sigma", type=float, default=None, help="Also benchmark warm-started token sequences")
+    parser.add_argument("--condition_correlation", type=float, default=0.95, help="Correlation of consecutive warm-start conditions")
+    parser.add_argument("--picard_tolerance", type=float, default=None, help="Also benchmark Picard (parallel) sampling")
+    parser.add_argument("--picard_max_iterations", type=int, default=None)
+    parser.add_argument("--x0_tolerance", type=float, default=None, help="Also benchmark early stopping on x0 changes")
+    return parser.parse_args()
+
+
+def build_tiny_model(args):
+    """Streaming model with a small LM and a randomly initialized diffusion head."""
+    torch.manual_seed(args.seed)
+    decoder_config = Qwen2Config(
+        vocab_size=256,
+        hidden_size=args.hidden_size,
+        intermediate_size=2 * args.hidden_size,
+        num_hidden_layers=2,
+        num_attention_heads=4,
+        num_key_value_heads=2,
+    )
+    acoustic_config = VibeVoiceAcousticTokenizerConfig(vae_dim=args.latent_size, decoder_n_filters=4, encoder_ratios=[2], encoder_depths="1-1")
+    head_config = VibeVoiceDiffusionHeadConfig(
+        hidden_size=args.hidden_size, head_layers=args.head_layers, latent_size=args.latent_size
+    )
+    config = VibeVoiceStreamingConfig(
+        acoustic_tokenizer_config=acoustic_config,
+        decoder_config=decoder_config,
+        diffusion_head_config=head_config,
+        tts_backbone_num_hidden_layers=1,
+    )
+    model = VibeVoiceStreamingForConditionalGenerationInference(config)
+    # `initialize_weights` zeroes the adaLN and output layers, which would make every solver exact
+    with torch.no_grad():
+        for param in model.model.prediction_head.parameters():
+            if param.dim() >= 2:
+                param.normal_(0.0, 0.02)
+    return model.to(args.device).eval()
+
+
+@torch.no_grad()
+def sample(model, condition, neg_condition, solver, steps, cfg_scale, seed):
+    model.set_ddpm_inference_steps(num_steps=steps)
+    torch.manual_seed(seed)
+    return model.sample_speech_tokens(condition, neg_condition, cfg_scale=cfg_scale, solver=solver)
+
+
+@torch.no_grad()
+def time_per_token(model, condition, neg_condition, solver, steps, cfg_scale, repeats=20):
+    model.set_ddpm_inference_steps(num_steps=steps)
+    row, neg_row = condition[:1], neg_condition[:1]
+    model.sample_speech_tokens(row, neg_row, cfg_scale=cfg_scale, solver=solver)  # warm-up (plans, caches)
+    if condition.is_cuda:
+        torch.cuda.synchronize()
+    start = time.perf_counter()
+    for _ in range(repeats):
+        model.sample_speech_tokens(row, neg_row, cfg_scale=cfg_scale, solver=solver)
+    if condition.is_cuda:
+        torch.cuda.synchronize()
+    return (time.perf_counter() - start) / repeats
+
+
+@torch.no_grad()
+def warm_start_sequence(model, conditions, neg_conditions, solver, steps, cfg_scale, seed, warm_start_sigma):
+    """Sample the tokens one by one, warm-starting each from the previous latent; returns latents and head evaluations."""
+    model.set_ddpm_inference_steps(num_steps=steps)
+    scheduler = model._get_solver_scheduler(solver)
+    begin_index = model._warm_start_index(scheduler, warm_start_sigma)
+    torch.manual_seed(seed)
+    latents, previous = [], None
+    for condition, neg_condition in zip(conditions, neg_conditions):
+        previous = model.sample_speech_tokens(
+            condition[None], neg_condition[None], cfg_scale=cfg_scale, solver=solver,
+            warm_start_latents=previous, warm_start_sigma=warm_start_sigma,
+        )
+        latents.append(previous)
+    head_evaluations = steps + (len(conditions) - 1) * (steps - begin_index)
+    return torch.cat(latents), head_evaluations / len(conditions)
+
+
+def correlated_conditions(num_tokens, hidden_size, correlation, generator):
+    """AR(1) sequence of unit-variance conditions, mimicking consecutive TTS LM hidden states."""
+    conditions = [torch.randn(hidden_size, generator=generator)]
+    for _ in range(num_tokens - 1):
+        noise = torch.randn(hidden_size, generator=generator)
+        conditions.append(correlation * conditions[-1] + (1 - correlation**2) ** 0.5 * noise)
+    return torch.stack(conditions)
+
+
+def main():
+    args = parse_args()
+    model = build_tiny_model(args)
+
+    generator = torch.Generator().manual_seed(args.seed + 1)
+    condition = torch.randn(args.num_tokens, args.hidden_size, generator=generator).to(args.device)
+    neg_condition = torch.randn(args.num_tokens, args.hidden_size, generator=generator).to(args.device)
+
+    reference = sample(model, condition, neg_condition, args.reference_solver, args.reference_steps, args.cfg_scale, args.seed)
+    print(f"Reference: {args.reference_solver} @ {args.reference_steps} steps, {args.num_tokens} tokens, device={args.device}")
+    print(f"{'solver':<22}{'steps':>6}{'mse':>14}{'ms/token':>12}")
+    for solver in args.solvers:
+        for steps in args.steps:
+            latent = sample(model, condition, neg_condition, solver, steps, args.cfg_scale, args.seed)
+            mse = torch.mean((latent.float() - reference.float()) ** 2).item()
+            seconds = time_per_token(model, condition, neg_condition, solver, steps, args.cfg_scale)
+            print(f"{solver:<22}{steps:>6}{mse:>14.3e}{seconds * 1e3:>12.3f}")
+
+    if args.picard_tolerance is not None:
+        print(f"\nPicard sampling, tolerance {args.picard_tolerance}, max iterations {args.picard_max_iterations}")
+        print(f"{'solver':<22}{'steps':>6}{'mse':>14}{'ms/token':>12}{'iterations':>12}")
+        model.set_parallel_sampling(True, tolerance=args.picard_tolerance, max_iterations=args.picard_max_iterations)
+        for solver in args.solvers:
+            for steps in args.steps:
+                iterations = []
+                for row in range(args.num_tokens):
+                    latent = sample(model, condition[row:row + 1], neg_condition[row:row + 1], solver, steps, args.cfg_scale, args.seed + row)
+                    iterations.append(model.last_sampling_iterations)
+                latent = sample(model, condition, neg_condition, solver, steps, args.cfg_scale, args.seed)
+                mse = torch.mean((latent.float() - reference.float()) ** 2).item()
+                seconds = time_per_token(model, condition, neg_condition, solver, steps, args.cfg_scale)
+                print(f"{solver:<22}{steps:>6}{mse:>14.3e}{seconds * 1e3:>12.3f}{sum(iterations) / len(iterations):>12.2f}")
+        model.set_parallel_sampling(False)
+
+    if args.x0_tolerance is not None:
+        print(f"\nEarly stopping, x0 tolerance {args.x0_tolerance}")
+        print(f"{'solver':<22}{'steps':>6}{'mse':>14}{'steps run':>12}")
+        for solver in args.solvers:
+            for steps in args.steps:
+                model.set_ddpm_inference_steps(num_steps=steps)
+                latents, steps_run = [], []
+                torch.manual_seed(args.seed)
+                for row in range(args.num_tokens):
+                    latents.append(model.sample_speech_tokens(
+                        condition[row:row + 1], neg_condition[row:row + 1], cfg_scale=args.cfg_scale, solver=solver,
+                        x0_tolerance=args.x0_tolerance,
+                    ))
+                    steps_run.append(model.last_sampling_iterations)
+                mse = torch.mean((torch.cat(latents).float() - reference.float()) ** 2).item()
+                print(f"{solver:<22}{steps:>6}{mse:>14.3e}{sum(steps_run) / len(steps_run):>12.2f}")
+
+    if args.warm_start_sigma is None:
+        return
+    conditions = correlated_conditions(args.num_tokens, args.hidden_size, args.condition_correlation, generator).to(args.device)
+    # Warm starts follow a different noise trajectory, so compare sample statistics rather than per-token MSE
+    print(f"\nWarm start at sigma={args.warm_start_sigma}, condition correlation {args.condition_correlation}")
+    print(f"{'solver':<22}{'steps':>6}{'mode':>6}{'evals/token':>13}{'latent std':>12}{'token delta':>13}")
+    for solver in args.solvers:
+        for steps in args.steps:
+            cold = sample(model, conditions, neg_condition, solver, steps, args.cfg_scale, args.seed)
+            warm, evaluations = warm_start_sequence(
+                model, conditions, neg_condition, solver, steps, args.cfg_scale, args.seed, args.warm_start_sigma
+            )
+            for mode, latents, evals in (("cold", cold, steps), ("warm", warm, evaluations)):
+                latents = latents.float()
+                delta = torch.mean((latents[1:] - latents[:-1]) ** 2).item()
+                print(f"{solver:<22}{steps:>6}{mode:>6}{evals:>13.2f}{latents.std().item():>12.4f}{delta:>13.3e}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Equivalence check of batched diffusion sampling for rows that follow different schedules.
+
+Rows with other step counts or warm-start states follow other `DPMSolverSamplingPlan`s. `sample_speech_tokens`
+samples them in one loop with a `DPMSolverBatchPlan`. This script checks, on a small random-init model
+(no checkpoint needed):
+
+- `DPMSolverBatchPlan.batch_step` against `DPMSolverSamplingPlan.step` of every row's plan, on random
+  model outputs;
+- the batched token sampler against sampling each group of rows on its own with `_sample_with_plan`,
+  from the same initial noise, with and without CFG.
+
+    python demo/check_batch_plan.py --solvers dpm-solver++-2m dpm-solver++-3m --steps 3 5 10
+"""
+import argparse
+import itertools
+import sys
+
+import torch
+
+from benchmark_diffusion import build_tiny_model
+from vibevoice.modular.modeling_vibevoice_streaming_inference import _sample_with_batch_plan, _sample_with_plan
+from vibevoice.schedule.sampling_plan import DPMSolverBatchPlan
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check batched multi-plan sampling against per-plan sampling")
+    parser.add_argument("--solvers", nargs="+", default=["dpm-solver++-2m", "dpm-solver++-3m"])
+    parser.add_argument("--steps", nargs="+", type=int, default=[3, 5, 10])
+    parser.add_argument("--warm_start_sigma", type=float, default=1.0)
+    parser.add_argument("--rows_per_plan", type=int, default=3)
+    parser.add_argument("--cfg_scale", type=float, default=1.5)
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    parser.add_argument("--hidden_size", type=int, default=64)
+    parser.add_argument("--head_layers", type=int, default=2)
+    parser.add_argument("--latent_size", type=int, default=16)
+    parser.add_argument("--device", type=str, default="cuda" if torch.cuda.is_available() else "cpu")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def build_plans(model, solver, steps, warm_start_sigma):
+    """Cold and warm-started plans for every step count."""
+    scheduler = model._get_solver_scheduler(solver)
+    plans = []
+    for num_steps in steps:
+        model.set_ddpm_inference_steps(num_steps=num_steps)
+        for begin_index in sorted({0, model._warm_start_index(scheduler, warm_start_sigma, num_steps)}):
+            plans.append(model._get_sampling_plan(scheduler, begin_index, num_steps))
+    return plans
+
+
+def check_batch_step(plans, rows_per_plan, dim, device, generator):
+    """Largest difference between `batch_step` trajectories and per-plan `step` trajectories."""
+    batch_plan = DPMSolverBatchPlan(plans)
+    plan_indices = torch.arange(len(plans), device=device).repeat_interleave(rows_per_plan)
+    sample = torch.randn(len(plan_indices), dim, generator=generator).to(device)
+    outputs = torch.randn(batch_plan.max_steps, len(plan_indices), dim, generator=generator).to(device)
+
+    speech, history = sample, batch_plan.new_x0_history(len(plan_indices), dim, device)
+    for iteration in range(batch_plan.max_steps):
+        step_indices, active = batch_plan.step_indices(plan_indices, iteration)
+        speech, history = batch_plan.batch_step(step_indices, outputs[iteration], speech, history, active)
+
+    error = 0.0
+    for g, plan in enumerate(plans):
+        rows = (plan_indices == g).nonzero(as_tuple=True)[0]
+        reference, x0_history = sample[rows], []
+        for iteration, step_index in enumerate(range(plan.begin_index, plan.num_inference_steps)):
+            reference = plan.step(step_index, outputs[iteration][rows], reference, x0_history)
+        error = max(error, (speech[rows] - reference).abs().max().item())
+    return error
+
+
+def check_sampler(model, plans, rows_per_plan, cfg_scale, guided, device, generator):
+    """Largest difference between `_sample_with_batch_plan` and `_sample_with_plan` per group of rows."""
+    head = model._get_fused_prediction_head()
+    hidden_size = model.config.decoder_config.hidden_size
+    batch_plan = DPMSolverBatchPlan(plans)
+    plan_indices = torch.arange(len(plans), device=device).repeat_interleave(rows_per_plan)
+    batch_size = len(plan_indices)
+    condition = torch.randn(batch_size, hidden_size, generator=generator).to(device)
+    neg_condition = torch.randn(batch_size, hidden_size, generator=generator).to(device) if guided else None
+    sample = torch.randn(batch_size, model.config.acoustic_vae_dim, generator=generator).to(device)
+    # Guide the first half of every trajectory only, so that guided and unguided rows mix
+    guided_steps = [
+        tuple(plan.begin_index <= i < (plan.begin_index + plan.num_inference_steps) // 2 for i in range(plan.num_inference_steps))
+        for plan in plans
+    ]
+
+    with torch.no_grad():
+        speech = _sample_with_batch_plan(
+            head, batch_plan, plan_indices, guided_steps if guided else None, condition, neg_condition, sample, cfg_scale
+        )
+        error = 0.0
+        for g, plan in enumerate(plans):
+            rows = (plan_indices == g).nonzero(as_tuple=True)[0]
+            reference = _sample_with_plan(
+                head, plan, guided_steps[g], condition[rows], None if neg_condition is None else neg_condition[rows],
+                sample[rows], cfg_scale,
+            )
+            error = max(error, (speech[rows] - reference).abs().max().item())
+    return error
+
+
+def main():
+    args = parse_args()
+    model = build_tiny_model(args)
+    generator = torch.Generator().manual_seed(args.seed)
+    failures = 0
+    print(f"{'solver':<20}{'check':<22}{'max abs diff':>14}")
+    for solver in args.solvers:
+        plans = build_plans(model, solver, args.steps, args.warm_start_sigma)
+        errors = {"batch_step": check_batch_step(plans, args.rows_per_plan, args.latent_size, args.device, generator)}
+        for guided in (False, True):
+            name = "sampler, cfg" if guided else "sampler, no cfg"
+            errors[name] = check_sampler(model, plans, args.rows_per_plan, args.cfg_scale, guided, args.device, generator)
+        for name, error in errors.items():
+            ok = error <= args.tolerance
+            failures += not ok
+            print(f"{solver:<20}{name:<22}{error:>14.3e}{'' if ok else '  FAIL'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,134 @@
+"""
+Equivalence check of the streaming transposed convolution of the acoustic decoder.
+
+`SConvTranspose1d` streams by overlap-add (`_forward_overlap_add`): only the new frames go through the transposed
+convolution, and the cache holds the output tail that they overlap. This script checks, on random layers (no
+checkpoint needed), for every kernel size / stride / causal / trim setting:
+
+- streaming `forward` against the rerun path (`_forward_rerun`, which reconvolves the cached input). Plain layers
+  stream by overlap-add; weight-normed ones, whose weight is made stale as after `load_state_dict`, must fall back
+  to the rerun path;
+- both against the non-streaming output of every sample's whole input, for settings that trim all padding on
+  the right (causal, `trim_right_ratio=1`, as in the decoder). With left trimming, every streaming call emits samples
+  that later frames still add to, so the streamed output cannot equal the non-streaming one (on either path).
+
+Samples join at staggered calls, are decoded in shuffled batches of random chunk lengths, and use sparse sample
+indices, so new cache slots and non-prefix slot lookups are covered.
+
+    python demo/check_conv_transpose_streaming.py
+    python demo/check_conv_transpose_streaming.py --num_samples 8 --max_chunk 6 --trials 10
+"""
+import argparse
+import math
+import random
+import sys
+
+import torch
+
+from vibevoice.modular.modular_vibevoice_tokenizer import SConvTranspose1d, VibeVoiceTokenizerStreamingCache
+
+
+# (kernel_size, stride, causal, trim_right_ratio, norm); the decoder upsamples with kernel_size = 2 * stride
+SETTINGS = [
+    (4, 2, True, 1.0, "none"),
+    (16, 8, True, 1.0, "none"),
+    (7, 3, True, 1.0, "none"),
+    (6, 2, True, 0.5, "none"),
+    (6, 2, True, 0.0, "none"),
+    (3, 3, True, 1.0, "none"),
+    (5, 1, False, 1.0, "none"),
+    (8, 4, False, 1.0, "none"),
+    (4, 2, True, 1.0, "weight_norm"),
+    (7, 3, True, 1.0, "weight_norm"),
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check overlap-add streaming of SConvTranspose1d")
+    parser.add_argument("--num_samples", type=int, default=5)
+    parser.add_argument("--num_frames", type=int, default=24, help="Input frames per sample")
+    parser.add_argument("--max_chunk", type=int, default=4, help="Longest chunk (in frames) of a streaming call")
+    parser.add_argument("--channels", type=int, default=6)
+    parser.add_argument("--trials", type=int, default=5, help="Random call schedules per setting")
+    parser.add_argument("--tolerance", type=float, default=1e-5)
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def call_schedule(num_samples, num_frames, max_chunk, rng):
+    """Streaming calls as (sample ids, start frame per sample, chunk length), samples joining one by one."""
+    ids = rng.sample(range(100), num_samples)
+    joined, cursors, schedule = [], {}, []
+    while len(joined) < num_samples or any(cursors[i] < num_frames for i in joined):
+        if len(joined) < num_samples:
+            joined.append(ids[len(joined)])
+            cursors[joined[-1]] = 0
+        pending = [i for i in joined if cursors[i] < num_frames]
+        batch = rng.sample(pending, rng.randint(1, len(pending)))
+        length = min(rng.randint(1, max_chunk), *(num_frames - cursors[i] for i in batch))
+        schedule.append((batch, [cursors[i] for i in batch], length))
+        for i in batch:
+            cursors[i] += length
+    return ids, schedule
+
+
+def stream(forward, inputs, schedule):
+    """Per-sample output of `forward` over the call schedule, with one shared cache."""
+    cache = VibeVoiceTokenizerStreamingCache()
+    outputs = {i: [] for i in inputs}
+    for batch, starts, length in schedule:
+        x = torch.stack([inputs[i][:, start:start + length] for i, start in zip(batch, starts)])
+        y = forward(x, cache, torch.tensor(batch, dtype=torch.long))
+        for i, chunk in zip(batch, y):
+            outputs[i].append(chunk)
+    return {i: torch.cat(chunks, dim=-1) for i, chunks in outputs.items()}
+
+
+def max_diff(a, b):
+    if a.keys() != b.keys() or any(a[i].shape != b[i].shape for i in a):
+        return float("inf")
+    return max((a[i] - b[i]).abs().max().item() for i in a)
+
+
+def format_error(error, width):
+    return f"{'-':>{width}}" if error is None else f"{error:>{width}.3e}"
+
+
+def main():
+    args = parse_args()
+    torch.manual_seed(args.seed)
+    rng = random.Random(args.seed)
+    failures = 0
+    print(f"{'kernel':>6}{'stride':>7}{'causal':>8}{'trim':>6}{'norm':>13}{'stream vs rerun':>17}{'stream vs full':>16}{'rerun vs full':>15}")
+    for kernel_size, stride, causal, trim_right_ratio, norm in SETTINGS:
+        layer = SConvTranspose1d(
+            args.channels, args.channels, kernel_size, stride, causal=causal, trim_right_ratio=trim_right_ratio, norm=norm
+        ).eval()
+        torch.nn.init.normal_(layer.convtr.convtr.bias)
+        # Left-trimmed samples are emitted before later frames add to them
+        padding_right = math.ceil(layer.padding_total * trim_right_ratio) if causal else layer.padding_total // 2
+        streamable = padding_right == layer.padding_total
+        errors = [0.0, 0.0, 0.0]
+        with torch.no_grad():
+            for _ in range(args.trials):
+                ids, schedule = call_schedule(args.num_samples, args.num_frames, args.max_chunk, rng)
+                inputs = {i: torch.randn(args.channels, args.num_frames) for i in ids}
+                if norm == "weight_norm":
+                    # New magnitudes leave the weight attribute stale until a forward of the conv module recomputes it
+                    layer.convtr.convtr.weight_g.copy_(torch.rand_like(layer.convtr.convtr.weight_g) + 0.5)
+                streamed = stream(lambda x, c, s: layer(x, cache=c, sample_indices=s, use_cache=True), inputs, schedule)
+                rerun = stream(lambda x, c, s: layer._forward_rerun(x, c, s), inputs, schedule)
+                full = {i: layer(x[None])[0] for i, x in inputs.items()}
+                for k, (a, b) in enumerate([(streamed, rerun), (streamed, full), (rerun, full)]):
+                    errors[k] = max(errors[k], max_diff(a, b))
+        if not streamable:
+            errors[1] = errors[2] = None
+        ok = all(error is None or error <= args.tolerance for error in errors)
+        failures += not ok
+        columns = "".join(format_error(error, width) for error, width in zip(errors, (17, 16, 15)))
+        print(f"{kernel_size:>6}{stride:>7}{str(causal):>8}{trim_right_ratio:>6}{norm:>13}{columns}{'' if ok else '  FAIL'}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,116 @@
+"""
+Cut-point check of the incremental text tokenizer behind `TextInputStream`.
+
+Feeds texts to `TextInputStream` in randomly cut pieces and checks that the committed ids equal the
+one-shot encoding of the processor (`text.strip() + "\\n"`). Without `--tokenizer`, it trains a small
+byte-level BPE with the Qwen2 pre-tokenizer on demo/text_examples (no download needed).
+
+    python demo/check_incremental_tokenizer.py
+    python demo/check_incremental_tokenizer.py --tokenizer Qwen/Qwen2.5-0.5B --trials 50
+"""
+import argparse
+import glob
+import os
+import random
+import sys
+import tempfile
+
+from vibevoice.modular.modular_vibevoice_text_tokenizer import VibeVoiceTextTokenizerFast
+from vibevoice.modular.streamer import TextInputStream
+
+
+EXTRA_TEXTS = [
+    "Hello.\nWorld",
+    "a  b   c \n d",
+    "word \n\n  next",
+    "x,y;z!?  ",
+    "  lead and trail  ",
+    "naïve café élan",
+    "100,000.5 dollars",
+    "emoji 😀😀 ok",
+    "under_score __init__",
+    "tab\there",
+    "It's 2024: don't stop... (really?) \"quoted\"\n\nNew para.\tTab",
+    "你好，世界。今天天气很好！",
+    # Trailing whitespace after punctuation: the closing newline merges with the punctuation mark
+    "Hello world. ",
+    "How are you? ",
+    "Done!  \t ",
+    "First. Second? ",
+]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Check incremental tokenization against one-shot encoding")
+    parser.add_argument("--tokenizer", type=str, default=None, help="Tokenizer name or path; trains a small BPE if omitted")
+    parser.add_argument("--trials", type=int, default=20, help="Random cuts per text")
+    parser.add_argument("--seed", type=int, default=0)
+    return parser.parse_args()
+
+
+def train_small_tokenizer(corpus):
+    """Byte-level BPE with the Qwen2 pre-tokenizer, trained on `corpus`."""
+    from tokenizers import Tokenizer, models, pre_tokenizers, trainers
+    from transformers.models.qwen2.tokenization_qwen2 import PRETOKENIZE_REGEX
+
+    tokenizer = Tokenizer(models.BPE())
+    tokenizer.pre_tokenizer = pre_tokenizers.Sequence([
+        pre_tokenizers.Split(PRETOKENIZE_REGEX, "isolated"),
+        pre_tokenizers.ByteLevel(add_prefix_space=False, use_regex=False),
+    ])
+    trainer = trainers.BpeTrainer(
+        vocab_size=2000, initial_alphabet=pre_tokenizers.ByteLevel.alphabet(), special_tokens=["<|endoftext|>"]
+    )
+    tokenizer.train_from_iterator(corpus, trainer)
+    directory = tempfile.mkdtemp()
+    tokenizer.model.save(directory)
+    return VibeVoiceTextTokenizerFast(
+        vocab_file=os.path.join(directory, "vocab.json"), merges_file=os.path.join(directory, "merges.txt")
+    )
+
+
+def stream_ids(tokenizer, pieces):
+    stream = TextInputStream(tokenizer)
+    for piece in pieces:
+        stream.feed_text(piece)
+    stream.close_text()
+    return stream.token_ids
+
+
+def random_pieces(text, rng):
+    if len(text) < 2:
+        return [text]
+    cuts = sorted(rng.sample(range(1, len(text)), min(len(text) - 1, rng.randint(1, 30))))
+    return [text[a:b] for a, b in zip([0] + cuts, cuts + [len(text)])]
+
+
+def main():
+    args = parse_args()
+    examples = os.path.join(os.path.dirname(os.path.abspath(__file__)), "text_examples", "*.txt")
+    corpus = [open(path, encoding="utf-8").read() for path in sorted(glob.glob(examples))]
+    texts = corpus + EXTRA_TEXTS
+    if args.tokenizer is None:
+        # Repeat the extra texts so that merges such as ".\n" and "?\n" make it into the vocabulary
+        tokenizer = train_small_tokenizer(corpus + [text.strip() + "\n" for text in EXTRA_TEXTS] * 20)
+    else:
+        tokenizer = VibeVoiceTextTokenizerFast.from_pretrained(args.tokenizer)
+
+    rng = random.Random(args.seed)
+    failures = total = 0
+    for text in texts:
+        expected = tokenizer.encode(text.strip() + "\n", add_special_tokens=False)
+        # Whole text, character by character, then random cuts
+        for pieces in [[text], list(text)] + [random_pieces(text, rng) for _ in range(args.trials)]:
+            total += 1
+            ids = stream_ids(tokenizer, pieces)
+            if ids != expected:
+                failures += 1
+                print(f"MISMATCH {text[:40]!r} cut as {pieces[:6]!r}")
+                print(f"  stream:   {tokenizer.convert_ids_to_tokens(ids)[-8:]}")
+                print(f"  one-shot: {tokenizer.convert_ids_to_tokens(expected)[-8:]}")
+    print(f"{total - failures} / {total} cut patterns match the one-shot encoding")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,7 +7,11 @@ import time
 import torch
 import copy
 
-from vibevoice.modular.modeling_vibevoice_streaming_inference import VibeVoiceStreamingForConditionalGenerationInference
+from vibevoice.modular.modeling_vibevoice_streaming_inference import (
+    TTS_SPEECH_WINDOW_SIZE,
+    TTS_TEXT_WINDOW_SIZE,
+    VibeVoiceStreamingForConditionalGenerationInference,
+)
 from vibevoice.processor.vibevoice_streaming_processor import VibeVoiceStreamingProcessor
 from transformers.utils import logging
 
@@ -129,6 +133,36 @@ def parse_args():
         default=1.5,
         help="CFG (Classifier-Free Guidance) scale for generation (default: 1.5)",
     )
+    parser.add_argument(
+        "--compile_sampler",
+        action="store_true",
+        help="Compile the per-token diffusion loop with torch.compile (falls back to eager if unavailable)",
+    )
+    parser.add_argument(
+        "--picard_tolerance",
+        type=float,
+        default=None,
+        help="Sample speech latents with parallel-in-time Picard iterations, stopping at this tolerance (default: sequential)",
+    )
+    parser.add_argument(
+        "--text_window_size",
+        type=int,
+        default=TTS_TEXT_WINDOW_SIZE,
+        help="Text tokens per window; larger windows need fewer LM calls when the whole file is known upfront",
+    )
+    parser.add_argument(
+        "--speech_window_size",
+        type=int,
+        default=None,
+        help="Speech latents per window (default: the steady-state speech-to-text ratio applied to --text_window_size)",
+    )
+    parser.add_argument(
+        "--text_prefill",
+        type=str,
+        default="full",
+        choices=["none", "full", "background"],
+        help="Run the text LM over the whole script upfront ('full'), on a worker thread ('background') or per window ('none')",
+    )
     
     return parser.parse_args()
 
@@ -223,6 +257,10 @@ def main():
 
     model.eval()
     model.set_ddpm_inference_steps(num_steps=5)
+    if args.compile_sampler:
+        model.set_speech_sampler_compile(True)
+    if args.picard_tolerance is not None:
+        model.set_parallel_sampling(True, tolerance=args.picard_tolerance)
 
     if hasattr(model.model, 'language_model'):
        print(f"Language model attention: {model.model.language_model.config._attn_implementation}")
@@ -246,6 +284,9 @@ def main():
             inputs[k] = v.to(target_device)
 
     print(f"Starting generation with cfg_scale: {args.cfg_scale}")
+    speech_window_size = args.speech_window_size
+    if speech_window_size is None:
+        speech_window_size = max(1, round(args.text_window_size * TTS_SPEECH_WINDOW_SIZE / TTS_TEXT_WINDOW_SIZE))
 
     # Generate audio
     start_time = time.time()
@@ -253,6 +294,9 @@ def main():
         **inputs,
         max_new_tokens=None,
         cfg_scale=args.cfg_scale,
+        text_window_size=args.text_window_size,
+        speech_window_size=speech_window_size,
+        text_prefill=None if args.text_prefill == "none" else args.text_prefill,
         tokenizer=processor.tokenizer,
         generation_config={'do_sample': False},
         verbose=True,
@@ -6,10 +6,12 @@ def main():
     p.add_argument("--model_path", type=str, default="default_model")
     p.add_argument("--device", type=str, default="cuda", choices=["cpu", "cuda", "mpx", "mps"])
     p.add_argument("--reload", action="store_true", help="Reload the model or not")
+    p.add_argument("--max_concurrent_streams", type=int, default=1, help="Number of websocket streams served together (continuous batching when > 1)")
     args = p.parse_args()
     
     os.environ["MODEL_PATH"] = args.model_path
     os.environ["MODEL_DEVICE"] = args.device
+    os.environ["MAX_CONCURRENT_STREAMS"] = str(args.max_concurrent_streams)
 
     uvicorn.run("web.app:app", host="0.0.0.0", port=args.port, reload=args.reload)
 
@@ -17,12 +17,15 @@ from fastapi.staticfiles import StaticFiles
 from starlette.websockets import WebSocketDisconnect, WebSocketState
 
 from vibevoice.modular.modeling_vibevoice_streaming_inference import (
+    FirstChunkPolicy,
     VibeVoiceStreamingForConditionalGenerationInference,
 )
 from vibevoice.processor.vibevoice_streaming_processor import (
     VibeVoiceStreamingProcessor,
 )
 from vibevoice.modular.streamer import AudioStreamer
+from vibevoice.modular.streaming_scheduler import StreamingSessionScheduler
+from vibevoice.schedule.solvers import available_solvers
 
 import copy
 
@@ -44,11 +47,15 @@ class StreamingTTSService:
         model_path: str,
         device: str = "cuda",
         inference_steps: int = 5,
+        max_concurrent_streams: int = 1,
     ) -> None:
         # Keep model_path as string for HuggingFace repo IDs (Path() converts / to \ on Windows)
         self.model_path = model_path
         self.inference_steps = inference_steps
         self.sample_rate = SAMPLE_RATE
+        # > 1 serves several streams at once through a continuous batching scheduler
+        self.max_concurrent_streams = max(1, int(max_concurrent_streams))
+        self.scheduler: Optional[StreamingSessionScheduler] = None
 
         self.processor: Optional[VibeVoiceStreamingProcessor] = None
         self.model: Optional[VibeVoiceStreamingForConditionalGenerationInference] = None
@@ -123,6 +130,13 @@ class StreamingTTSService:
         self.default_voice_key = self._determine_voice_key(preset_name)
         self._ensure_voice_cached(self.default_voice_key)
 
+        if self.max_concurrent_streams > 1:
+            print(f"[startup] Continuous batching enabled for up to {self.max_concurrent_streams} streams")
+            self.scheduler = StreamingSessionScheduler(
+                self.model, self.processor, max_batch_size=self.max_concurrent_streams,
+            )
+            self.scheduler.start()
+
     def _load_voice_presets(self) -> Dict[str, Path]:
         voices_dir = BASE.parent / "voices" / "streaming_model"
         if not voices_dir.exists():
@@ -206,6 +220,9 @@ class StreamingTTSService:
         temperature: float,
         top_p: float,
         refresh_negative: bool,
+        cfg_steps: Optional[int],
+        solver: Optional[str],
+        first_chunk: Optional[FirstChunkPolicy],
         prefilled_outputs,
         stop_event: threading.Event,
     ) -> None:
@@ -214,6 +231,9 @@ class StreamingTTSService:
                 **inputs,
                 max_new_tokens=None,
                 cfg_scale=cfg_scale,
+                guidance_interval=cfg_steps,
+                solver=solver,
+                first_chunk=first_chunk,
                 tokenizer=self.processor.tokenizer,
                 generation_config={
                     "do_sample": do_sample,
@@ -240,6 +260,9 @@ class StreamingTTSService:
         top_p: float = 0.9,
         refresh_negative: bool = True,
         inference_steps: Optional[int] = None,
+        cfg_steps: Optional[int] = None,
+        solver: Optional[str] = None,
+        first_chunk: Optional[FirstChunkPolicy] = None,
         voice_key: Optional[str] = None,
         log_callback: Optional[Callable[[str, Dict[str, Any]], None]] = None,
         stop_event: Optional[threading.Event] = None,
@@ -264,6 +287,11 @@ class StreamingTTSService:
                     steps_to_use = parsed_steps
             except (TypeError, ValueError):
                 pass
+        if self.scheduler is not None:
+            # Diffusion steps are shared by the whole batch, per-request values are ignored
+            yield from self._stream_batched(text, cfg_scale, prefilled_outputs, emit, stop_event)
+            return
+
         if self.model:
             self.model.set_ddpm_inference_steps(num_steps=steps_to_use)
         self.inference_steps = steps_to_use
@@ -284,6 +312,9 @@ class StreamingTTSService:
                 "temperature": temperature,
                 "top_p": top_p,
                 "refresh_negative": refresh_negative,
+                "cfg_steps": cfg_steps,
+                "solver": solver,
+                "first_chunk": first_chunk,
                 "prefilled_outputs": prefilled_outputs,
                 "stop_event": stop_signal,
             },
@@ -296,28 +327,14 @@ class StreamingTTSService:
         try:
             stream = audio_streamer.get_stream(0)
             for audio_chunk in stream:
-                if torch.is_tensor(audio_chunk):
-                    audio_chunk = audio_chunk.detach().cpu().to(torch.float32).numpy()
-                else:
-                    audio_chunk = np.asarray(audio_chunk, dtype=np.float32)
-
-                if audio_chunk.ndim > 1:
-                    audio_chunk = audio_chunk.reshape(-1)
-
-                peak = np.max(np.abs(audio_chunk)) if audio_chunk.size else 0.0
-                if peak > 1.0:
-                    audio_chunk = audio_chunk / peak
-
+                audio_chunk = self._to_numpy_chunk(audio_chunk)
                 generated_samples += int(audio_chunk.size)
                 emit(
                     "model_progress",
                     generated_sec=generated_samples / self.sample_rate,
                     chunk_sec=audio_chunk.size / self.sample_rate,
                 )
-
-                chunk_to_yield = audio_chunk.astype(np.float32, copy=False)
-
-                yield chunk_to_yield
+                yield audio_chunk
         finally:
             stop_signal.set()
             audio_streamer.end()
@@ -326,6 +343,49 @@ class StreamingTTSService:
                 emit("generation_error", message=str(errors[0]))
                 raise errors[0]
 
+    def _stream_batched(
+        self,
+        text: str,
+        cfg_scale: float,
+        prefilled_outputs,
+        emit: Callable[..., None],
+        stop_event: Optional[threading.Event],
+    ) -> Iterator[np.ndarray]:
+        session = self.scheduler.submit(text.strip(), prefilled_outputs, cfg_scale=cfg_scale, max_new_tokens=None)
+        generated_samples = 0
+        try:
+            for audio_chunk in session:
+                if stop_event is not None and stop_event.is_set():
+                    break
+                audio_chunk = self._to_numpy_chunk(audio_chunk)
+                generated_samples += int(audio_chunk.size)
+                emit(
+                    "model_progress",
+                    generated_sec=generated_samples / self.sample_rate,
+                    chunk_sec=audio_chunk.size / self.sample_rate,
+                )
+                yield audio_chunk
+        finally:
+            session.stop()
+            if session.error is not None:
+                emit("generation_error", message=str(session.error))
+                raise session.error
+
+    def _to_numpy_chunk(self, audio_chunk) -> np.ndarray:
+        if torch.is_tensor(audio_chunk):
+            audio_chunk = audio_chunk.detach().cpu().to(torch.float32).numpy()
+        else:
+            audio_chunk = np.asarray(audio_chunk, dtype=np.float32)
+
+        if audio_chunk.ndim > 1:
+            audio_chunk = audio_chunk.reshape(-1)
+
+        peak = np.max(np.abs(audio_chunk)) if audio_chunk.size else 0.0
+        if peak > 1.0:
+            audio_chunk = audio_chunk / peak
+
+        return audio_chunk.astype(np.float32, copy=False)
+
     def chunk_to_pcm16(self, chunk: np.ndarray) -> bytes:
         chunk = np.clip(chunk, -1.0, 1.0)
         pcm = (chunk * 32767.0).astype(np.int16)
@@ -342,17 +402,20 @@ async def _startup() -> None:
         raise RuntimeError("MODEL_PATH not set in environment")
 
     device = os.environ.get("MODEL_DEVICE", "cuda")
+    max_concurrent_streams = int(os.environ.get("MAX_CONCURRENT_STREAMS", "1"))
     
     service = StreamingTTSService(
         model_path=model_path,
-        device=device
+        device=device,
+        max_concurrent_streams=max_concurrent_streams,
     )
     service.load()
 
     app.state.tts_service = service
     app.state.model_path = model_path
     app.state.device = device
-    app.state.websocket_lock = asyncio.Lock()
+    # Allows `MAX_CONCURRENT_STREAMS` websockets at once (one by default)
+    app.state.websocket_lock = asyncio.Semaphore(service.max_concurrent_streams)
     print("[startup] Model ready.")
 
 
@@ -367,6 +430,9 @@ async def websocket_stream(ws: WebSocket) -> None:
     print(f"Client connected, text={text!r}")
     cfg_param = ws.query_params.get("cfg")
     steps_param = ws.query_params.get("steps")
+    cfg_steps_param = ws.query_params.get("cfg_steps")
+    solver_param = ws.query_params.get("solver")
+    fast_start_param = ws.query_params.get("fast_start")
     voice_param = ws.query_params.get("voice")
 
     try:
@@ -381,9 +447,20 @@ async def websocket_stream(ws: WebSocket) -> None:
             inference_steps = None
     except ValueError:
         inference_steps = None
+    try:
+        # Apply CFG on the first `cfg_steps` diffusion steps only (all steps when unset)
+        cfg_steps = int(cfg_steps_param) if cfg_steps_param is not None else None
+        if cfg_steps is not None and cfg_steps < 0:
+            cfg_steps = None
+    except ValueError:
+        cfg_steps = None
+    # Diffusion solver from `vibevoice.schedule.solvers`; unknown names keep the default scheduler
+    solver = solver_param if solver_param in available_solvers() else None
+    # Latency-oriented first window and first latents (time to first audio)
+    first_chunk = FirstChunkPolicy() if fast_start_param in ("1", "true") else None
 
     service: StreamingTTSService = app.state.tts_service
-    lock: asyncio.Lock = app.state.websocket_lock
+    lock: asyncio.Semaphore = app.state.websocket_lock
 
     if lock.locked():
         busy_message = {
@@ -432,6 +509,9 @@ async def websocket_stream(ws: WebSocket) -> None:
             text_length=len(text or ""),
             cfg_scale=cfg_scale,
             inference_steps=inference_steps,
+            cfg_steps=cfg_steps,
+            solver=solver,
+            fast_start=first_chunk is not None,
             voice=voice_param,
         )
 
@@ -441,6 +521,9 @@ async def websocket_stream(ws: WebSocket) -> None:
             text,
             cfg_scale=cfg_scale,
             inference_steps=inference_steps,
+            cfg_steps=cfg_steps,
+            solver=solver,
+            first_chunk=first_chunk,
             voice_key=voice_param,
             log_callback=enqueue_log,
             stop_event=stop_signal,
@@ -1,14 +1,25 @@
 # vibevoice/modular/__init__.py
-from .modeling_vibevoice_streaming_inference import VibeVoiceStreamingForConditionalGenerationInference
+from .modeling_vibevoice_streaming_inference import (
+    AdaptiveWindowController,
+    FirstChunkPolicy,
+    VibeVoiceStreamingForConditionalGenerationInference,
+)
 from .configuration_vibevoice_streaming import VibeVoiceStreamingConfig
 from .modeling_vibevoice_streaming import VibeVoiceStreamingModel, VibeVoiceStreamingPreTrainedModel
-from .streamer import AudioStreamer, AsyncAudioStreamer
+from .streamer import AudioStreamer, AsyncAudioStreamer, TextInputStream, TextStreamingSession
+from .streaming_scheduler import StreamingSession, StreamingSessionScheduler
 
 __all__ = [
+    "AdaptiveWindowController",
+    "FirstChunkPolicy",
     "VibeVoiceStreamingForConditionalGenerationInference",
     "VibeVoiceStreamingConfig",
     "VibeVoiceStreamingModel",
     "VibeVoiceStreamingPreTrainedModel",
     "AudioStreamer",
     "AsyncAudioStreamer",
+    "TextInputStream",
+    "TextStreamingSession",
+    "StreamingSession",
+    "StreamingSessionScheduler",
 ]
\ No newline at end of file
@@ -1,11 +1,17 @@
+import copy
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
 from dataclasses import dataclass
-from typing import Any, Dict, List, Optional, Tuple, Union, Callable
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Union, Callable
 from tqdm import tqdm
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 
 from transformers.models.auto import AutoModel, AutoModelForCausalLM
 
+from transformers.cache_utils import DynamicCache
 from transformers.generation import GenerationMixin, GenerationConfig, LogitsProcessor, LogitsProcessorList, StoppingCriteriaList
 from transformers.modeling_outputs import BaseModelOutputWithPast, ModelOutput
 from transformers import modeling_utils
@@ -14,12 +20,14 @@ from transformers.modeling_flash_attention_utils import FlashAttentionKwargs
 from transformers.utils import logging
 
 from .modular_vibevoice_tokenizer import VibeVoiceTokenizerStreamingCache
-from .modular_vibevoice_diffusion_head import VibeVoiceDiffusionHead
+from .modular_vibevoice_diffusion_head import VibeVoiceDiffusionHead, VibeVoiceFusedDiffusionHead
 from vibevoice.schedule.dpm_solver import DPMSolverMultistepScheduler
+from vibevoice.schedule.sampling_plan import DPMSolverBatchPlan, DPMSolverSamplingPlan
+from vibevoice.schedule.solvers import build_solver
 from .configuration_vibevoice_streaming import VibeVoiceStreamingConfig
 from .modular_vibevoice_text_tokenizer import VibeVoiceTextTokenizer, VibeVoiceTextTokenizerFast
 from .modeling_vibevoice_streaming import VibeVoiceStreamingPreTrainedModel, VibeVoiceStreamingModel, BinaryClassifier
-from .streamer import AudioStreamer, AsyncAudioStreamer
+from .streamer import AudioStreamer, AsyncAudioStreamer, TextInputStream
 
 logger = logging.get_logger(__name__)
 
@@ -30,31 +38,575 @@ TTS_TEXT_WINDOW_SIZE = 5
 TTS_SPEECH_WINDOW_SIZE = 6
 
 
-def _update_model_kwargs_for_generation(
-    outputs: ModelOutput,
-    model_kwargs: Dict[str, Any],
-    num_new_tokens: int = 1,
-) -> Dict[str, Any]:
+@dataclass
+class FirstChunkPolicy:
     """
-    Update model_kwargs after adding new tokens.
+    Latency settings for the start of an utterance (time to first audio), steady state is unchanged.
 
-    Mainly for the case num_new_tokens > 1 (e.g. a whole text window):
-      - past_key_values: take from current outputs
-      - attention_mask: append num_new_tokens ones
-      - cache_position: advance by creating a range for all new positions
+    Args:
+        text_window_size: text tokens of the first window.
+        speech_window_size: speech tokens of the first window; None keeps the steady-state ratio of speech
+            to text tokens.
+        num_latents: number of leading speech latents sampled with `diffusion_steps` and `use_cfg`.
+        diffusion_steps: diffusion steps of those latents; None keeps the regular step count.
+        use_cfg: whether those latents apply classifier-free guidance.
     """
 
-    # update past_key_values keeping its naming used in model code
-    model_kwargs["past_key_values"] = getattr(outputs, "past_key_values")
+    text_window_size: int = 2
+    speech_window_size: Optional[int] = None
+    num_latents: int = 3
+    diffusion_steps: Optional[int] = 3
+    use_cfg: bool = False
 
-    attention_mask = model_kwargs["attention_mask"]
-    model_kwargs["attention_mask"] = torch.cat(
-        [attention_mask, attention_mask.new_ones((attention_mask.shape[0], num_new_tokens))], dim=-1
-    )
+    def __post_init__(self):
+        if self.text_window_size < 1:
+            raise ValueError(f"text_window_size must be positive, got {self.text_window_size}")
+        if self.speech_window_size is None:
+            self.speech_window_size = max(1, round(self.text_window_size * TTS_SPEECH_WINDOW_SIZE / TTS_TEXT_WINDOW_SIZE))
 
-    model_kwargs["cache_position"] = torch.arange(model_kwargs["cache_position"][-1] + 1, model_kwargs["cache_position"][-1] + num_new_tokens + 1).to(model_kwargs["cache_position"].device)
-    
-    return model_kwargs
+
+class AdaptiveWindowController:
+    """
+    Chooses the text / speech window sizes of every `generate` window from the realtime margin of the stream.
+
+    The margin is the audio generated so far minus the wall-clock time since `start`. While it exceeds
+    `widen_margin` seconds the text window doubles (up to `max_text_window`), so the LM and TTS LM calls are
+    amortized over more tokens; once it drops below `narrow_margin` it halves (down to `min_text_window`),
+    so the next audio is emitted sooner. The speech window follows at the text-to-speech ratio of
+    `TTS_TEXT_WINDOW_SIZE` / `TTS_SPEECH_WINDOW_SIZE`.
+
+    Args:
+        min_text_window, max_text_window: bounds of the text window.
+        widen_margin, narrow_margin: realtime margins (seconds) that widen / narrow the windows.
+        sample_rate: sample rate of the generated audio.
+        clock: time source, in seconds.
+    """
+
+    def __init__(
+        self,
+        min_text_window: int = 2,
+        max_text_window: int = 40,
+        widen_margin: float = 2.0,
+        narrow_margin: float = 0.5,
+        sample_rate: int = 24000,
+        clock: Callable[[], float] = time.perf_counter,
+    ):
+        if not 1 <= min_text_window <= max_text_window:
+            raise ValueError(f"Expected 1 <= min_text_window <= max_text_window, got {min_text_window}, {max_text_window}")
+        if narrow_margin > widen_margin:
+            raise ValueError(f"narrow_margin ({narrow_margin}) must not exceed widen_margin ({widen_margin})")
+        self.min_text_window = min_text_window
+        self.max_text_window = max_text_window
+        self.widen_margin = widen_margin
+        self.narrow_margin = narrow_margin
+        self.sample_rate = sample_rate
+        self.clock = clock
+        self.start()
+
+    def start(self):
+        """Restart the clock and the window at `TTS_TEXT_WINDOW_SIZE`; `generate` calls this on entry."""
+        self._start_time = self.clock()
+        self.text_window_size = min(max(TTS_TEXT_WINDOW_SIZE, self.min_text_window), self.max_text_window)
+
+    def next_windows(self, generated_samples: int) -> Tuple[int, int]:
+        """Text and speech window sizes of the next window, after `generated_samples` audio samples per stream."""
+        margin = generated_samples / self.sample_rate - (self.clock() - self._start_time)
+        if margin > self.widen_margin:
+            self.text_window_size = min(2 * self.text_window_size, self.max_text_window)
+        elif margin < self.narrow_margin:
+            self.text_window_size = max(self.text_window_size // 2, self.min_text_window)
+        speech_window_size = max(1, round(self.text_window_size * TTS_SPEECH_WINDOW_SIZE / TTS_TEXT_WINDOW_SIZE))
+        return self.text_window_size, speech_window_size
+
+
+def _merge_prefilled_outputs(
+    prefilled_outputs: List[Dict[str, BaseModelOutputWithPast]],
+) -> Tuple[Dict[str, BaseModelOutputWithPast], Dict[str, torch.Tensor]]:
+    """
+    Merge per-sample cached prompt outputs into one left-padded batch.
+
+    Each entry of `prefilled_outputs` holds the `lm`, `tts_lm`, `neg_lm` and `neg_tts_lm` outputs
+    of a single voice prompt (batch size 1). Key/value states and last hidden states are padded
+    on the left with zeros up to the longest prompt, so the most recent position is always at -1.
+
+    Returns:
+        merged: dict with the same keys, each a BaseModelOutputWithPast with a `DynamicCache`.
+        attention_masks: dict of (B, L) long masks, 0 on the padded positions.
+    """
+    merged, attention_masks = {}, {}
+    for key in prefilled_outputs[0].keys():
+        outputs = [prefilled[key] for prefilled in prefilled_outputs]
+        caches = [output.past_key_values for output in outputs]
+        lengths = [output.last_hidden_state.shape[1] for output in outputs]
+        max_length = max(lengths)
+
+        legacy_cache = []
+        for layer_idx in range(len(caches[0])):
+            layer_keys, layer_values = [], []
+            for cache, length in zip(caches, lengths):
+                layer_key, layer_value = cache[layer_idx]
+                layer_keys.append(F.pad(layer_key, (0, 0, max_length - length, 0)))
+                layer_values.append(F.pad(layer_value, (0, 0, max_length - length, 0)))
+            legacy_cache.append((torch.cat(layer_keys, dim=0), torch.cat(layer_values, dim=0)))
+
+        last_hidden_state = torch.cat(
+            [F.pad(output.last_hidden_state, (0, 0, max_length - length, 0)) for output, length in zip(outputs, lengths)],
+            dim=0,
+        )
+        attention_mask = torch.zeros(len(outputs), max_length, dtype=torch.long, device=last_hidden_state.device)
+        for i, length in enumerate(lengths):
+            attention_mask[i, max_length - length:] = 1
+
+        merged[key] = BaseModelOutputWithPast(
+            last_hidden_state=last_hidden_state,
+            past_key_values=DynamicCache.from_legacy_cache(tuple(legacy_cache)),
+        )
+        attention_masks[key] = attention_mask
+    return merged, attention_masks
+
+
+def _cat_model_kwargs(states: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Stack decoding states (`past_key_values` + cached `attention_mask`) along the batch dimension,
+    left-padding the shorter ones. Other keys are dropped.
+    """
+    max_length = max(state["attention_mask"].shape[1] for state in states)
+    legacy_caches = [state["past_key_values"].to_legacy_cache() for state in states]
+    pads = [max_length - state["attention_mask"].shape[1] for state in states]
+
+    legacy_cache = []
+    for layer_idx in range(len(legacy_caches[0])):
+        keys = [F.pad(cache[layer_idx][0], (0, 0, pad, 0)) for cache, pad in zip(legacy_caches, pads)]
+        values = [F.pad(cache[layer_idx][1], (0, 0, pad, 0)) for cache, pad in zip(legacy_caches, pads)]
+        legacy_cache.append((torch.cat(keys, dim=0), torch.cat(values, dim=0)))
+    return {
+        "past_key_values": DynamicCache.from_legacy_cache(tuple(legacy_cache)),
+        "attention_mask": torch.cat(
+            [F.pad(state["attention_mask"], (pad, 0)) for state, pad in zip(states, pads)], dim=0
+        ),
+    }
+
+
+class _ColumnBuffer:
+    """
+    A (B, L) tensor that grows along its last dimension inside a preallocated buffer.
+
+    `append` writes the new columns in place and returns the (B, L + n) view, so a sequence that grows by
+    one token per step costs O(n) per step instead of a full `torch.cat` copy. The buffer doubles when
+    `capacity` is exceeded.
+    """
+
+    def __init__(self, values: torch.Tensor, capacity: int = 0):
+        self.length = values.shape[1]
+        self.data = values.new_empty(values.shape[0], max(capacity, self.length))
+        self.data[:, :self.length] = values
+        self.view = self.data[:, :self.length]
+
+    def append(self, columns: torch.Tensor) -> torch.Tensor:
+        return self._write(columns, columns.shape[1])
+
+    def append_value(self, value, num_columns: int = 1) -> torch.Tensor:
+        """Appends `num_columns` columns filled with `value` (no column tensor is allocated)."""
+        return self._write(value, num_columns)
+
+    def _write(self, columns, num_columns: int) -> torch.Tensor:
+        end = self.length + num_columns
+        if end > self.data.shape[1]:
+            data = self.data.new_empty(self.data.shape[0], 2 * end)
+            data[:, :self.length] = self.view
+            self.data = data
+        self.data[:, self.length:end] = columns
+        self.length = end
+        self.view = self.data[:, :end]
+        return self.view
+
+
+def _reserve_attention_mask(model_kwargs: Dict[str, Any], capacity: int):
+    """Move the cached `attention_mask` of a decoding state into a `_ColumnBuffer` with room for `capacity` columns."""
+    buffer = _ColumnBuffer(model_kwargs["attention_mask"], capacity)
+    model_kwargs["attention_mask_buffer"] = buffer
+    model_kwargs["attention_mask"] = buffer.view
+    model_kwargs["num_tokens"] = buffer.view.sum(dim=-1)
+    # Whether the cached mask has padding columns; None until `_tts_lm_step` needs to know
+    model_kwargs["has_padding"] = None
+
+
+def _left_padded_windows(token_ids, cursors, lengths, pad_id):
+    """
+    Windows of `lengths[b]` tokens starting at `cursors[b]` of every row of `token_ids`, left-padded with
+    `pad_id` so that position -1 is a real token. Returns the (B, W) ids, their mask and the source positions.
+    """
+    window_size = int(lengths.max().item())
+    offsets = torch.arange(window_size, device=token_ids.device) - (window_size - lengths)[:, None]
+    mask = (offsets >= 0).long()
+    positions = (cursors[:, None] + offsets).clamp(0, token_ids.shape[1] - 1)
+    window_ids = torch.gather(token_ids, 1, positions).masked_fill(mask == 0, pad_id)
+    return window_ids, mask, positions
+
+
+def _stream_text_windows(text_streams, cursors, window_size, finished, pad_id, device):
+    """
+    Next text window of every unfinished sample from its `TextInputStream`, waiting until the window is
+    complete or the stream is closed. Returns the right-padded (B, W) ids and the window lengths.
+    """
+    windows = []
+    for stream, cursor, done in zip(text_streams, cursors, finished):
+        if done:
+            windows.append([])
+            continue
+        available = stream.wait_for_tokens(cursor + window_size)
+        windows.append(stream.token_ids[cursor:min(available, cursor + window_size)])
+    width = max(max(len(window) for window in windows), 1)
+    token_ids = torch.tensor([window + [pad_id] * (width - len(window)) for window in windows], dtype=torch.long, device=device)
+    lengths = torch.tensor([len(window) for window in windows], dtype=torch.long, device=device)
+    return token_ids, lengths
+
+
+class _DeferredEndOfSpeech:
+    """
+    EOS decisions and audio chunks of the speech tokens generated since the last poll.
+
+    The EOS classifier output stays on the device: every token only folds it into the per-row index of the first
+    token that predicted EOS. `poll` reads that back once for all pending tokens, drops the audio that rows
+    generated after their EOS and hands the rest to `audio_chunks` and the streamer.
+    """
+
+    NO_EOS = torch.iinfo(torch.long).max
+
+    def __init__(self, batch_size, device, audio_chunks, audio_streamer=None):
+        # Audio samples per stream delivered so far, the realtime margin of `AdaptiveWindowController`
+        self.generated_samples = 0
+        self.eos_steps = torch.full((batch_size,), self.NO_EOS, dtype=torch.long, device=device)
+        self.audio_chunks = audio_chunks
+        self.audio_streamer = audio_streamer
+        # (rows, audio chunk of those rows or its `_AcousticDecoder` future) per pending token
+        self.pending: List[Tuple[List[int], torch.Tensor]] = []
+
+    def __len__(self):
+        return len(self.pending)
+
+    def add_audio(self, rows: List[int], audio_chunk: Union[torch.Tensor, Future]):
+        self.pending.append((rows, audio_chunk))
+
+    def add_eos(self, row_indices: torch.LongTensor, eos: torch.BoolTensor):
+        """Records the EOS decisions of `row_indices` for the last added audio chunk."""
+        step = torch.where(eos, len(self.pending) - 1, self.NO_EOS)
+        self.eos_steps[row_indices] = torch.minimum(self.eos_steps[row_indices], step)
+
+    def poll(self) -> List[int]:
+        """Delivers the audio of the pending tokens and returns the rows that predicted EOS."""
+        if not self.pending:
+            return []
+        eos_steps = self.eos_steps.tolist()
+        for step, (rows, audio_chunk) in enumerate(self.pending):
+            if isinstance(audio_chunk, Future):
+                audio_chunk = audio_chunk.result()
+            self.generated_samples += audio_chunk.shape[-1]
+            kept = [i for i, row in enumerate(rows) if step <= eos_steps[row]]
+            for i in kept:
+                self.audio_chunks[rows[i]].append(audio_chunk[i])
+            if self.audio_streamer is not None and kept:
+                if len(kept) < len(rows):
+                    audio_chunk = audio_chunk[torch.tensor(kept, device=audio_chunk.device)]
+                self.audio_streamer.put(audio_chunk, [rows[i] for i in kept])
+        self.pending = []
+        ended = [row for row, step in enumerate(eos_steps) if step != self.NO_EOS]
+        if ended:
+            self.eos_steps.fill_(self.NO_EOS)
+            if self.audio_streamer is not None:
+                self.audio_streamer.end(ended)
+        return ended
+
+
+class _AcousticDecoder:
+    """
+    Streaming acoustic decoding of the speech latents of a `generate` call, with its own streaming cache.
+
+    The TTS LM only needs the latents, not the waveform. With `background`, the latents are decoded on a
+    worker thread, in submission order, while the caller runs the next TTS LM step; `submit` then returns a
+    `Future` of the audio chunk.
+    """
+
+    def __init__(self, model, background=False):
+        self.model = model
+        self.cache = VibeVoiceTokenizerStreamingCache()
+        self._executor = ThreadPoolExecutor(max_workers=1) if background else None
+
+    def _decode(self, speech_latent, sample_indices):
+        # Gradient mode is thread local
+        with torch.no_grad():
+            scaled_latent = speech_latent / self.model.speech_scaling_factor.to(speech_latent.device) - self.model.speech_bias_factor.to(speech_latent.device)
+            tokenizer = self.model.acoustic_tokenizer
+            return tokenizer.decode(
+                scaled_latent.to(tokenizer.device),
+                cache=self.cache,
+                sample_indices=sample_indices.to(tokenizer.device),
+                use_cache=True,
+                debug=False,
+            )
+
+    def submit(self, speech_latent: torch.Tensor, sample_indices: torch.LongTensor) -> Union[torch.Tensor, Future]:
+        """Audio chunk (N, 1, T) of `speech_latent` (N, 1, D), or its future when decoding in the background."""
+        if self._executor is None:
+            return self._decode(speech_latent, sample_indices)
+        return self._executor.submit(self._decode, speech_latent, sample_indices)
+
+    def close(self, cancel=False):
+        """Stop the worker; with `cancel`, queued decodes that have not started are dropped."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=cancel)
+
+
+class _TextPrefill:
+    """
+    Ahead-of-time `forward_lm` over the whole text of a `generate` call.
+
+    The lower LM only reads text, so its hidden states do not depend on the generated speech. They are
+    computed in windows of `chunk_size` tokens (all at once when it covers the text) into a (B, T, H) buffer,
+    either right away or in a background thread, and the TTS loop takes its window slices with `window`,
+    which waits for the positions it needs.
+    """
+
+    def __init__(self, model, model_kwargs, tts_text_ids, tts_text_lengths, pad_id, chunk_size, background=False):
+        self.model = model
+        self.model_kwargs = model_kwargs
+        self.tts_text_ids = tts_text_ids
+        self.tts_text_lengths = tts_text_lengths
+        self.pad_id = pad_id
+        self.chunk_size = chunk_size
+        self.hidden_states = None
+        # Text positions [0, ready) hold final hidden states for every row
+        self.ready = 0
+        self.error: Optional[BaseException] = None
+        self._condition = threading.Condition()
+        self._stop = threading.Event()
+        self._thread = None
+        if background:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        else:
+            self._run()
+            if self.error is not None:
+                raise self.error
+
+    def _run(self):
+        total = self.tts_text_ids.shape[1]
+        try:
+            # Gradient mode is thread local
+            with torch.no_grad():
+                for start in range(0, total, self.chunk_size):
+                    if self._stop.is_set():
+                        return
+                    lengths = (self.tts_text_lengths - start).clamp(0, self.chunk_size)
+                    cursors = torch.full_like(lengths, start)
+                    window_ids, window_mask, _ = _left_padded_windows(self.tts_text_ids, cursors, lengths, self.pad_id)
+                    hidden = self.model._forward_window(
+                        self.model.forward_lm, self.model_kwargs, window_ids, window_mask,
+                        rows=lengths.nonzero(as_tuple=True)[0],
+                    ).last_hidden_state
+                    if self.hidden_states is None:
+                        self.hidden_states = hidden.new_zeros(hidden.shape[0], total, hidden.shape[-1])
+                    for row, length in enumerate(lengths.tolist()):
+                        if length > 0:
+                            self.hidden_states[row, start:start + length] = hidden[row, hidden.shape[1] - length:]
+                    with self._condition:
+                        self.ready = min(start + self.chunk_size, total)
+                        self._condition.notify_all()
+        except BaseException as e:
+            with self._condition:
+                self.error = e
+                self.ready = total
+                self._condition.notify_all()
+
+    def window(self, positions: torch.LongTensor, needed: int) -> torch.Tensor:
+        """LM hidden states (B, W, H) at text `positions` (B, W), once the first `needed` positions are done."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.ready >= needed)
+        if self.error is not None:
+            raise self.error
+        return torch.gather(self.hidden_states, 1, positions[..., None].expand(-1, -1, self.hidden_states.shape[-1]))
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+
+
+def _guided_prediction(head, guided, condition, speech, t_emb, cfg_scale):
+    """
+    Head output for the (B, D) `speech`, guided when `guided` is set. `condition` is the prepared condition,
+    with the negative rows appended after the B positive ones whenever CFG is in use.
+    """
+    batch_size = speech.shape[0]
+    if guided:
+        eps = head.step(torch.cat([speech, speech], dim=0), condition, t_emb)
+        cond_eps, uncond_eps = torch.split(eps, batch_size, dim=0)
+        return uncond_eps + cfg_scale * (cond_eps - uncond_eps)
+    return head.step(speech, condition[:batch_size], t_emb)
+
+
+def _sample_with_plan(head, plan, guided_steps, condition, neg_condition, sample, cfg_scale):
+    """
+    Plan-based diffusion loop for one speech latent per row, free of scheduler state.
+
+    `head` is a `VibeVoiceFusedDiffusionHead`, `plan` a `DPMSolverSamplingPlan` and `guided_steps` a
+    per-step tuple of CFG flags (ignored when `neg_condition` is None). `sample` is the (B, D) latent at
+    `plan.begin_index` (pure noise unless warm-started). Everything but the tensors is a constant, so
+    the function can be compiled as one graph.
+    """
+    if neg_condition is not None:
+        condition = torch.cat([condition, neg_condition], dim=0)
+    # The projected condition is constant across the diffusion steps of this token
+    condition = head.prepare_condition(condition)
+    speech = sample
+    x0_history = []
+    for step_index in range(plan.begin_index, plan.num_inference_steps):
+        # (H,) embedding broadcasts over the batch inside the head
+        t_emb = plan.timestep_embeddings[step_index]
+        guided = neg_condition is not None and guided_steps[step_index]
+        eps = _guided_prediction(head, guided, condition, speech, t_emb, cfg_scale)
+        speech = plan.step(step_index, eps, speech, x0_history)
+    return speech
+
+
+def _sample_with_batch_plan(head, batch_plan, plan_indices, guided_steps, condition, neg_condition, sample, cfg_scale):
+    """
+    `_sample_with_plan` for rows that follow different plans: row b follows plan `plan_indices[b]` of the
+    `DPMSolverBatchPlan`, whose `guided_steps[g]` are the per-step CFG flags of plan g. Iterations where no
+    row is guided evaluate the head on the conditional half only; otherwise unguided rows take the
+    conditional prediction.
+    """
+    batch_size = sample.shape[0]
+    guidance = neg_condition is not None
+    if guidance:
+        condition = torch.cat([condition, neg_condition], dim=0)
+        guided_table = torch.tensor(
+            [flag for flags in guided_steps for flag in flags], dtype=torch.bool, device=sample.device
+        )
+    condition = head.prepare_condition(condition)
+    speech = sample
+    x0_history = batch_plan.new_x0_history(batch_size, sample.shape[-1], sample.device)
+    for iteration in range(batch_plan.max_steps):
+        step_indices, active = batch_plan.step_indices(plan_indices, iteration)
+        t_emb = batch_plan.timestep_embeddings[step_indices]
+        guided = guidance and any(
+            iteration < num_steps and flags[plan.begin_index + iteration]
+            for plan, num_steps, flags in zip(batch_plan.plans, batch_plan.num_steps, guided_steps)
+        )
+        if guided:
+            eps = head.step(torch.cat([speech, speech], dim=0), condition, torch.cat([t_emb, t_emb], dim=0))
+            cond_eps, uncond_eps = torch.split(eps, batch_size, dim=0)
+            guided_eps = uncond_eps + cfg_scale * (cond_eps - uncond_eps)
+            eps = torch.where(guided_table[step_indices][:, None], guided_eps, cond_eps)
+        else:
+            eps = head.step(speech, condition[:batch_size], t_emb)
+        speech, x0_history = batch_plan.batch_step(step_indices, eps, speech, x0_history, active)
+    return speech
+
+
+def _sample_with_plan_early_stop(head, plan, guided_steps, condition, neg_condition, sample, cfg_scale, x0_tolerance):
+    """
+    `_sample_with_plan` with early stopping: a row is done once its x0 prediction changes by at most
+    `x0_tolerance` (RMS over the latent dimension) between two steps, and its latest x0 prediction is
+    returned. Done rows leave the batch, and the loop ends when every row is done.
+
+    Returns:
+        The (B, D) latents and the number of diffusion steps run.
+    """
+    batch_size = sample.shape[0]
+    guidance = neg_condition is not None
+    condition = head.prepare_condition(condition)
+    if guidance:
+        neg_condition = head.prepare_condition(neg_condition)
+    per_row_scale = torch.is_tensor(cfg_scale) and cfg_scale.dim() > 0
+    result = sample.to(torch.float32).clone()
+    active = torch.arange(batch_size, device=sample.device)
+    speech, x0_history, previous_x0 = sample, [], None
+    num_steps = 0
+    for step_index in range(plan.begin_index, plan.num_inference_steps):
+        t_emb = plan.timestep_embeddings[step_index]
+        guided = guidance and guided_steps[step_index]
+        step_condition = torch.cat([condition, neg_condition], dim=0) if guidance else condition
+        eps = _guided_prediction(head, guided, step_condition, speech, t_emb, cfg_scale)
+        speech = plan.step(step_index, eps, speech, x0_history)
+        num_steps += 1
+        x0 = x0_history[-1]
+        if previous_x0 is not None:
+            done = (x0 - previous_x0).pow(2).mean(dim=-1) <= x0_tolerance**2
+            if done.any():
+                result[active[done]] = x0[done]
+                keep = ~done
+                if not keep.any():
+                    return result.to(sample.dtype), num_steps
+                active, speech, x0 = active[keep], speech[keep], x0[keep]
+                x0_history = [history[keep] for history in x0_history]
+                condition = condition[keep]
+                if guidance:
+                    neg_condition = neg_condition[keep]
+                if per_row_scale:
+                    cfg_scale = cfg_scale[keep]
+        previous_x0 = x0
+    result[active] = speech.to(torch.float32)
+    return result.to(sample.dtype), num_steps
+
+
+def _sample_with_picard(head, plan, guided_steps, condition, neg_condition, sample, cfg_scale, tolerance, max_iterations):
+    """
+    Parallel-in-time (Picard) variant of `_sample_with_plan`.
+
+    Starting from a constant trajectory, every iteration evaluates the head on all remaining steps in one
+    batched call, then rebuilds the whole trajectory from the new x0 predictions with `plan.rollout`. The
+    state at the front of the window is exact, so each iteration fixes one more step and the result equals
+    the sequential loop after at most K = num_inference_steps - begin_index iterations. Iteration stops
+    early once no latent of the trajectory moves by more than `tolerance` (RMS over the latent dimension).
+    Stochastic plans draw the noise of every step upfront.
+
+    Returns:
+        The (B, D) latents and the number of iterations used.
+    """
+    batch_size, dim = sample.shape
+    begin, end = plan.begin_index, plan.num_inference_steps
+    num_steps = end - begin
+    condition = head.prepare_condition(condition)
+    guided = [k for k in range(num_steps) if neg_condition is not None and guided_steps[begin + k]]
+    if guided:
+        neg_condition = head.prepare_condition(neg_condition)
+    t_emb = plan.timestep_embeddings[begin:end]
+    convert = plan.convert_coeff_table[begin:end].view(num_steps, 2, 1, 1)
+    noise = None
+    if plan.stochastic:
+        noise = torch.randn(num_steps, batch_size, dim, device=sample.device, dtype=torch.float32)
+
+    states = sample.to(torch.float32).expand(num_steps + 1, batch_size, dim).clone()
+    x0 = torch.zeros(num_steps, batch_size, dim, dtype=torch.float32, device=sample.device)
+    # Steps before `frozen` start from exact latents, their x0 predictions are final
+    frozen = 0
+    for iteration in range(1, max_iterations + 1):
+        window = num_steps - frozen
+        latents = states[frozen:num_steps]
+        inputs = latents.reshape(window * batch_size, dim)
+        conditions = condition.repeat(window, 1)
+        embeddings = t_emb[frozen:].repeat_interleave(batch_size, dim=0)
+        window_guided = [k - frozen for k in guided if k >= frozen]
+        if window_guided:
+            guided_index = torch.tensor(window_guided, device=sample.device)
+            inputs = torch.cat([inputs, latents[guided_index].reshape(-1, dim)], dim=0)
+            conditions = torch.cat([conditions, neg_condition.repeat(len(window_guided), 1)], dim=0)
+            embeddings = torch.cat([embeddings, t_emb[frozen + guided_index].repeat_interleave(batch_size, dim=0)], dim=0)
+        eps = head.step(inputs.to(sample.dtype), conditions, embeddings).to(torch.float32)
+        cond_eps = eps[: window * batch_size].view(window, batch_size, dim)
+        if window_guided:
+            uncond_eps = eps[window * batch_size:].view(len(window_guided), batch_size, dim)
+            cond_eps[guided_index] = uncond_eps + cfg_scale * (cond_eps[guided_index] - uncond_eps)
+        x0[frozen:] = latents * convert[frozen:, 0] + cond_eps * convert[frozen:, 1]
+
+        new_states = plan.rollout(sample, x0, noise)
+        change = (new_states[frozen + 1:] - states[frozen + 1:]).pow(2).mean(dim=-1).max()
+        states = new_states
+        frozen += 1
+        if frozen == num_steps or change.item() <= tolerance**2:
+            break
+    return states[-1].to(sample.dtype), iteration
 
 
 @dataclass
@@ -91,6 +643,22 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
         
         # inference configuration
         self.ddpm_inference_steps = config.diffusion_head_config.ddpm_num_inference_steps
+        # Solver schedulers, sampling plans and samplers derived from `_base_noise_scheduler`, dropped
+        # together when `noise_scheduler` is replaced
+        self._base_noise_scheduler = None
+        self._solver_schedulers = {}
+        self._sampling_plans = {}
+        self._batch_plans = {}
+        # Scheduler copies with timesteps set, per (scheduler, steps), for `_sample_speech_tokens_with_scheduler`
+        self._stepping_schedulers = {}
+        # Fused inference view of the prediction head, keyed by (device, dtype); kept out of the module tree
+        self._fused_prediction_head = {}
+        # Token samplers per (plan, fused head, guided steps), compiled when `compile_speech_sampler` is set
+        self.compile_speech_sampler = False
+        self._speech_samplers = {}
+        # Picard (parallel-in-time) sampling settings, see `set_parallel_sampling`
+        self.parallel_sampling = None
+        self.last_sampling_iterations = None
 
         # Initialize weights and apply final processing
         self.post_init()
@@ -157,6 +725,33 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
     def set_ddpm_inference_steps(self, num_steps=None):
         self.ddpm_inference_steps = num_steps or self.config.diffusion_head_config.ddpm_num_inference_steps
 
+    def set_speech_sampler_compile(self, enabled=True):
+        """
+        Compile the whole per-token diffusion loop with `torch.compile` (one graph per step count and guidance
+        pattern; the batch dimension is dynamic, as rows join and finish during batched generation). Falls back
+        to the eager loop when compilation is unavailable.
+        """
+        self.compile_speech_sampler = enabled
+        self._speech_samplers = {}
+
+    def set_parallel_sampling(self, enabled=True, tolerance=1e-3, max_iterations=None):
+        """
+        Sample speech latents with Picard iterations over the whole diffusion trajectory instead of the
+        sequential step loop: every iteration evaluates the head on all steps in one batched call, trading
+        extra FLOPs for fewer sequential rounds (lower latency on many-core CPUs and underused GPUs).
+
+        Args:
+            tolerance: stop once no latent of the trajectory changes by more than this (RMS) in an iteration.
+                0 iterates to the exact sequential result.
+            max_iterations: cap on the iterations per token; None allows the step count, which is exact.
+
+        The iterations of the last call are reported in `last_sampling_iterations`. Only solvers with a
+        sampling plan (DPM-Solver++) are parallelized, the others keep the sequential loop.
+        """
+        if max_iterations is not None and max_iterations < 1:
+            raise ValueError(f"max_iterations must be positive, got {max_iterations}")
+        self.parallel_sampling = dict(tolerance=tolerance, max_iterations=max_iterations) if enabled else None
+
     # @can_return_tuple
     def forward_lm(
         self,
@@ -318,6 +913,163 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
             "Unified forward is disabled. Use `forward_lm`, `forward_tts_lm`, or `generate` instead."
         )
 
+    def _forward_window(self, forward_fn, model_kwargs, input_ids, attention_mask, rows=None, **kwargs):
+        """
+        Run `forward_fn` (`forward_lm` / `forward_tts_lm`) on a window of new tokens for a left-padded batch.
+
+        - Extends `model_kwargs["attention_mask"]` with the window mask when the window is consumed, in place
+          when it is the view of `model_kwargs["attention_mask_buffer"]` (see `_reserve_attention_mask`).
+        - Derives `position_ids` from the mask, so padded samples keep their own RoPE positions. The count of
+          real tokens per sample is kept in `model_kwargs["num_tokens"]` instead of summing the mask every call.
+        - If `rows` is given and flash attention is used, only those rows are run (flash attention
+          rejects a padded last column) and the cache of the other rows is padded to the same length.
+
+        Args:
+            model_kwargs: dict with `past_key_values` and the cached `attention_mask` (B, L), updated in place.
+            input_ids: (B, S) window token ids.
+            attention_mask: (B, S) window mask (1 for real tokens, 0 for padding).
+            rows: optional (N,) indices of the samples that have real tokens in the window.
+            kwargs: extra full-batch inputs for `forward_fn` (e.g. `lm_last_hidden_state`, `tts_text_masks`).
+
+        Returns:
+            The `forward_fn` outputs with full-batch `last_hidden_state` (and `logits`).
+        """
+        batch_size, num_new_tokens = input_ids.shape
+        past_attention_mask = model_kwargs["attention_mask"]
+        past_key_values = model_kwargs["past_key_values"]
+        past_length = past_attention_mask.shape[1]
+        mask_buffer = model_kwargs.get("attention_mask_buffer")
+        if mask_buffer is None or mask_buffer.view is not past_attention_mask:
+            # First call on this state, or its mask was replaced (e.g. by the session scheduler)
+            _reserve_attention_mask(model_kwargs, 0)
+            mask_buffer = model_kwargs["attention_mask_buffer"]
+        past_num_tokens = model_kwargs["num_tokens"]
+        full_attention_mask = mask_buffer.append(attention_mask)
+        num_tokens = past_num_tokens + attention_mask.sum(dim=-1)
+
+        if rows is None or rows.numel() == batch_size or self.config._attn_implementation != "flash_attention_2":
+            rows = None
+            step_attention_mask, step_num_tokens = full_attention_mask, past_num_tokens
+        else:
+            step_attention_mask, step_num_tokens = full_attention_mask[rows], past_num_tokens[rows]
+            input_ids, attention_mask = input_ids[rows], attention_mask[rows]
+            kwargs = {k: v[rows] if torch.is_tensor(v) else v for k, v in kwargs.items()}
+            past_key_values = DynamicCache.from_legacy_cache(
+                tuple((key[rows], value[rows]) for key, value in past_key_values.to_legacy_cache())
+            )
+
+        position_ids = (step_num_tokens[:, None] + attention_mask.cumsum(-1) - 1).clamp(min=0)
+        outputs = forward_fn(
+            input_ids=input_ids,
+            attention_mask=step_attention_mask,
+            position_ids=position_ids,
+            past_key_values=past_key_values,
+            cache_position=torch.arange(past_length, past_length + num_new_tokens, device=input_ids.device),
+            use_cache=True,
+            return_dict=True,
+            output_attentions=False,
+            output_hidden_states=False,
+            **kwargs,
+        )
+
+        if rows is not None:
+            full_cache = model_kwargs["past_key_values"]
+            for layer_idx in range(len(full_cache)):
+                for states, row_states in ((full_cache.key_cache, outputs.past_key_values.key_cache),
+                                           (full_cache.value_cache, outputs.past_key_values.value_cache)):
+                    padded = F.pad(states[layer_idx], (0, 0, 0, num_new_tokens))
+                    padded[rows] = row_states[layer_idx]
+                    states[layer_idx] = padded
+            full_cache._seen_tokens += num_new_tokens
+            outputs.past_key_values = full_cache
+            last_hidden_state = outputs.last_hidden_state.new_zeros(batch_size, *outputs.last_hidden_state.shape[1:])
+            last_hidden_state[rows] = outputs.last_hidden_state
+            outputs.last_hidden_state = last_hidden_state
+            if getattr(outputs, "logits", None) is not None:
+                logits = outputs.logits.new_zeros(batch_size, *outputs.logits.shape[1:])
+                logits[rows] = outputs.logits
+                outputs.logits = logits
+
+        model_kwargs["past_key_values"] = outputs.past_key_values
+        model_kwargs["attention_mask"] = full_attention_mask
+        model_kwargs["num_tokens"] = num_tokens
+        # The window may have added padding columns
+        model_kwargs["has_padding"] = model_kwargs["has_padding"] or None
+        return outputs
+
+    @staticmethod
+    def _finish_rows(ended: List[int], active_rows: List[int], diffusion_indices: torch.LongTensor, finished_tags: torch.BoolTensor):
+        """Marks `ended` rows finished; returns the remaining active rows and their device indices."""
+        if not ended:
+            return active_rows, diffusion_indices
+        finished_tags[ended] = True
+        active_rows = [row for row in active_rows if row not in ended]
+        return active_rows, torch.tensor(active_rows, dtype=torch.long, device=finished_tags.device)
+
+    def _tts_lm_step(self, model_kwargs: Dict[str, Any], acoustic_embed: torch.Tensor) -> torch.Tensor:
+        """
+        Run one speech position through the TTS LM, the lean equivalent of a single-token
+        `_forward_window(forward_tts_lm, ...)` with a speech embedding.
+
+        Skips the generic per-call work: no id embedding to overwrite, no EOS logits (callers compute them for
+        the rows they need), no 4D mask while the cache is unpadded, and position ids come from the running
+        `model_kwargs["num_tokens"]`. The decoder layers of `tts_language_model` are called directly.
+
+        Args:
+            model_kwargs: decoding state with `past_key_values` and the cached `attention_mask`, updated in place.
+            acoustic_embed: (B, 1, H) connector embeddings of the speech latents.
+
+        Returns:
+            (B, H) last hidden state of the new position.
+        """
+        language_model = self.model.tts_language_model
+        past_attention_mask = model_kwargs["attention_mask"]
+        mask_buffer = model_kwargs.get("attention_mask_buffer")
+        if mask_buffer is None or mask_buffer.view is not past_attention_mask:
+            _reserve_attention_mask(model_kwargs, 0)
+            mask_buffer = model_kwargs["attention_mask_buffer"]
+        if model_kwargs["has_padding"] is None:
+            model_kwargs["has_padding"] = not bool(past_attention_mask.all())
+        past_length = past_attention_mask.shape[1]
+        num_tokens = model_kwargs["num_tokens"]
+        attention_mask = mask_buffer.append_value(1)
+
+        type_embedding = self.model.tts_input_types.weight[:1]
+        hidden_states = acoustic_embed.to(type_embedding.dtype) + type_embedding
+        # Same masking as `Qwen2Model._update_causal_mask` for one query position, including its cut-off of keys
+        # beyond `config.sliding_window` for the non-flash implementations
+        sliding_window = language_model.config.sliding_window
+        if self.config._attn_implementation == "flash_attention_2":
+            step_mask = attention_mask if model_kwargs["has_padding"] else None
+        elif model_kwargs["has_padding"] or (sliding_window is not None and past_length >= sliding_window):
+            min_value = torch.finfo(hidden_states.dtype).min
+            step_mask = hidden_states.new_zeros(attention_mask.shape[0], 1, 1, past_length + 1)
+            step_mask.masked_fill_(attention_mask[:, None, None, :] == 0, min_value)
+            if sliding_window is not None and past_length >= sliding_window:
+                step_mask[..., :past_length + 1 - sliding_window] = min_value
+        else:
+            step_mask = None
+
+        position_ids = num_tokens[:, None]
+        cache_position = torch.arange(past_length, past_length + 1, device=hidden_states.device)
+        position_embeddings = language_model.rotary_emb(hidden_states, position_ids)
+        past_key_values = model_kwargs["past_key_values"]
+        for decoder_layer in language_model.layers[:language_model.config.num_hidden_layers]:
+            hidden_states = decoder_layer(
+                hidden_states,
+                attention_mask=step_mask,
+                position_ids=position_ids,
+                past_key_value=past_key_values,
+                use_cache=True,
+                cache_position=cache_position,
+                position_embeddings=position_embeddings,
+            )[0]
+        hidden_states = language_model.norm(hidden_states)
+
+        model_kwargs["attention_mask"] = attention_mask
+        model_kwargs["num_tokens"] = num_tokens + 1
+        return hidden_states[:, -1, :]
+
     def _build_generate_config_model_kwargs(self, generation_config, inputs, tokenizer, return_processors=False, **kwargs):
         if generation_config is None:
             generation_config = GenerationConfig(
@@ -407,14 +1159,31 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
         speech_masks: Optional[torch.BoolTensor] = None,
         speech_input_mask: Optional[torch.BoolTensor] = None,
         tts_text_ids: Optional[torch.LongTensor] = None,
+        text_stream: Optional[Union[TextInputStream, Sequence[TextInputStream]]] = None,
         return_speech: bool = True,
         cfg_scale: float = 1.0,
+        fuse_cfg: bool = False,
+        guidance: Optional[str] = None,
+        guidance_interval: Optional[Union[int, Tuple[float, float]]] = None,
+        solver: Optional[str] = None,
+        warm_start_sigma: Optional[float] = None,
+        diffusion_steps_schedule: Optional[Sequence[int]] = None,
+        x0_tolerance: Optional[float] = None,
+        first_chunk: Optional[FirstChunkPolicy] = None,
+        text_window_size: int = TTS_TEXT_WINDOW_SIZE,
+        speech_window_size: int = TTS_SPEECH_WINDOW_SIZE,
+        window_controller: Optional[AdaptiveWindowController] = None,
+        text_prefill: Optional[str] = None,
+        eos_check_interval: int = 1,
+        background_decode: bool = False,
         stop_check_fn: Optional[Callable[[], bool]] = None,
         **kwargs,
     ) -> Union[torch.LongTensor, VibeVoiceGenerationOutput]:
         """
         Text is fed in small windows (dynamic slicing of `tts_text_ids`), which enables streaming text input: you don’t need the full text upfront. After each text window, a loop samples several speech latents (diffusion). The interleaved text encoding + speech generation enables streaming text input and realtime speech output.
-        The function only supports batch size = 1 currently.
+        Batched generation is supported: pass one cached prompt per sample (`all_prefilled_outputs` as a list) and the
+        matching left-padded inputs from `VibeVoiceStreamingProcessor.process_input_with_cached_prompt`. Each sample keeps
+        its own text-window cursor, finished flag and acoustic cache slot.
 
         - Windowed text prefill → incremental LM + TTS LM updates.
         - Interleave speech token diffusion sampling (`sample_speech_tokens`).
@@ -422,9 +1191,46 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
         - Returns final token `sequences` and (optionally) concatenated speech audio.
 
         Args (selected):
-            tts_text_ids: Full text tokens to stream in windows.
+            tts_text_ids: Full text tokens to stream in windows (right-padded for batches).
+            tts_text_attention_mask: (B, T) mask of the valid `tts_text_ids` (passed through kwargs).
+            text_stream: Text that is still being written instead of `tts_text_ids`: a `TextInputStream` (one per
+                sample for batches). Each window waits until its text has been fed or the stream is closed, so
+                speech starts on the first window and only stalls when it catches up with the text (see
+                `TextStreamingSession` for a threaded wrapper).
+            all_prefilled_outputs: Cached voice prompt outputs, a dict or one dict per sample (passed through kwargs).
             audio_streamer: If provided, emits audio chunks during generation.
             cfg_scale: Classifier-free guidance scale for speech diffusion.
+            fuse_cfg: If True, the positive and negative TTS LM branches share one left-padded KV cache and
+                run as a single batched forward per speech token (instead of two calls).
+            guidance: "cfg" or "none". With "none" the negative branch is skipped entirely (no negative KV cache
+                updates, no doubled diffusion batch). Defaults to "none" when `cfg_scale == 1.0`, else "cfg".
+            guidance_interval: Diffusion steps that apply CFG (see `sample_speech_tokens`). None guides every step.
+            solver: Registered diffusion solver for this call (see `vibevoice.schedule.solvers`); None uses `noise_scheduler`.
+            warm_start_sigma: If set, every speech latent after a sample's first one starts from its previous latent
+                noised to this sigma and only runs the remaining diffusion steps (see `sample_speech_tokens`).
+            diffusion_steps_schedule: Diffusion steps per speech latent position of a sample: entry i is used for
+                its i-th latent and the last entry for all later ones (e.g. `[10, 10, 5]` spends more steps on the
+                onset of the utterance). None uses `ddpm_inference_steps` throughout.
+            x0_tolerance: Early stop of the diffusion loop once successive x0 predictions change by at most this
+                much (see `sample_speech_tokens`).
+            first_chunk: Latency settings for the first text window and the first speech latents (see
+                `FirstChunkPolicy`); None treats the start of the utterance like steady state.
+            text_window_size: Text tokens fed per window. Larger windows mean fewer LM calls (e.g. for offline
+                synthesis), smaller ones less text to wait for in live streams.
+            speech_window_size: Speech latents generated per window. Keeping the default 5:6 text-to-speech ratio
+                keeps the text ahead of the speech as in training.
+            window_controller: Picks the sizes of every window after the first from the realtime margin instead
+                (see `AdaptiveWindowController`); the first window follows `first_chunk` or the sizes above.
+            text_prefill: Run the lower LM over the whole text ahead of the TTS loop instead of window by window:
+                "full" in one `forward_lm` call before generation, "background" in windows on a worker thread
+                that runs ahead of the TTS loop. None interleaves it with speech generation.
+            eos_check_interval: Speech tokens between reads of the EOS decisions (and deliveries of audio). The
+                per-token loop keeps the EOS classifier output on the device and does no other device-to-host
+                reads, so with a larger interval the backend can queue work ahead. Rows that predicted EOS in
+                between have their surplus audio dropped, so the output is the same; streamed audio arrives in
+                bursts of up to this many tokens. Every speech window ends with a read.
+            background_decode: Decode the speech latents to audio on a worker thread, overlapping the acoustic
+                decoder with the next TTS LM step. The audio is the same.
             return_speech: If False, skips audio decode concatenation.
             stop_check_fn: External early-stop hook (returns True to halt).
 
@@ -440,9 +1246,30 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
         
         tts_lm_input_ids = kwargs.pop("tts_lm_input_ids", None)
         tts_lm_attention_mask = kwargs.pop("tts_lm_attention_mask", None)
+        tts_text_attention_mask = kwargs.pop("tts_text_attention_mask", None)
         # all_prefilled_outputs: cached prefilled prompt outputs for lm, tts_lm, neg_lm, neg_tts_lm
+        # (a single dict, or one dict per sample for batched generation)
         all_prefilled_outputs = kwargs.pop("all_prefilled_outputs", None)
-        tts_text_ids = tts_text_ids.to(self.device)
+        if text_stream is None:
+            tts_text_ids = tts_text_ids.to(self.device)
+        elif isinstance(text_stream, TextInputStream):
+            text_stream = [text_stream]
+
+        if guidance is None:
+            # cfg_scale == 1.0 collapses the guided prediction to the conditional one
+            guidance = "none" if cfg_scale == 1.0 else "cfg"
+        if guidance not in ("cfg", "none"):
+            raise ValueError(f"Unsupported guidance {guidance!r}, expected 'cfg' or 'none'.")
+        use_cfg = guidance == "cfg"
+        fuse_cfg = fuse_cfg and use_cfg
+
+        if isinstance(all_prefilled_outputs, (list, tuple)):
+            all_prefilled_outputs, prefilled_attention_masks = _merge_prefilled_outputs(all_prefilled_outputs)
+        else:
+            prefilled_attention_masks = {
+                key: torch.ones(output.last_hidden_state.shape[:2], dtype=torch.long, device=self.device)
+                for key, output in all_prefilled_outputs.items()
+            }
 
         if kwargs.get('max_new_tokens', None) is None:
             kwargs['max_new_tokens'] = self.config.decoder_config.max_position_embeddings - tts_lm_input_ids.shape[-1]
@@ -450,15 +1277,6 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
         generation_config, model_kwargs, input_ids, logits_processor, stopping_criteria = self._build_generate_config_model_kwargs(
             generation_config, inputs, tokenizer, return_processors=True, **kwargs
         )
-        
-        negative_kwargs = {
-            'input_ids': torch.full((kwargs['input_ids'].shape[0], 1), neg_text_input_id, dtype=torch.long, device=kwargs['input_ids'].device),
-            'attention_mask':  torch.ones((kwargs['input_ids'].shape[0], 1), dtype=torch.long, device=kwargs['input_ids'].device),
-            'max_new_tokens': kwargs.get('max_new_tokens', 100) 
-        }
-        negative_generation_config, negative_model_kwargs, negative_input_ids = self._build_generate_config_model_kwargs(
-            None, None, tokenizer, return_processors=False, **negative_kwargs
-        )
 
         tts_lm_kwargs = {
             'input_ids': tts_lm_input_ids,
@@ -469,216 +1287,269 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
             None, None, tokenizer, return_processors=False, **tts_lm_kwargs
         )
 
-        tts_lm_negative_kwargs = {
-            'input_ids': torch.full((kwargs['input_ids'].shape[0], 1), neg_text_input_id, dtype=torch.long, device=kwargs['input_ids'].device),
-            'attention_mask':  torch.ones((kwargs['input_ids'].shape[0], 1), dtype=torch.long, device=kwargs['input_ids'].device),
-            'max_new_tokens': kwargs.get('max_new_tokens', 100) 
-        }
-        tts_lm_negative_generation_config, tts_lm_negative_model_kwargs, tts_lm_negative_input_ids = self._build_generate_config_model_kwargs(
-            None, None, tokenizer, return_processors=False, **tts_lm_negative_kwargs
-        )
+        if use_cfg:
+            neg_tts_lm_attention_mask = prefilled_attention_masks["neg_tts_lm"].to(self.device)
+            tts_lm_negative_kwargs = {
+                'input_ids': torch.full(neg_tts_lm_attention_mask.shape, neg_text_input_id, dtype=torch.long, device=self.device),
+                'attention_mask': neg_tts_lm_attention_mask,
+                'max_new_tokens': kwargs.get('max_new_tokens', 100) 
+            }
+            tts_lm_negative_generation_config, tts_lm_negative_model_kwargs, tts_lm_negative_input_ids = self._build_generate_config_model_kwargs(
+                None, None, tokenizer, return_processors=False, **tts_lm_negative_kwargs
+            )
 
-        acoustic_cache = VibeVoiceTokenizerStreamingCache()
         batch_size = input_ids.shape[0]
-        assert batch_size == 1, "Currently only supports batch size == 1"
         device = input_ids.device
         finished_tags = torch.zeros(batch_size, dtype=torch.bool, device=device)
         verbose = kwargs.get("verbose", False)
 
+        # Per-sample text lengths and text-window cursors (tts_text_ids is right-padded for batches)
+        if text_stream is not None:
+            if len(text_stream) != batch_size:
+                raise ValueError(f"Got {len(text_stream)} text streams for a batch of {batch_size}; pass one stream per sample.")
+            if text_prefill is not None:
+                raise ValueError("text_prefill needs the whole text up front and cannot be combined with text_stream.")
+            tts_text_lengths = None
+        elif tts_text_attention_mask is None:
+            tts_text_lengths = torch.full((batch_size,), tts_text_ids.shape[1], dtype=torch.long, device=device)
+        else:
+            tts_text_lengths = tts_text_attention_mask.to(device).sum(dim=-1).long()
+        tts_text_cursors = torch.zeros(batch_size, dtype=torch.long, device=device)
+        # Last speech latent of each sample, the starting point of warm-started diffusion
+        previous_speech_latents = torch.zeros(batch_size, self.config.acoustic_vae_dim, device=device)
+        has_previous_latent = [False] * batch_size
+        # Host copy of `~finished_tags`: the per-token loop never reads the device flags
+        active_rows = list(range(batch_size))
+        diffusion_indices = torch.arange(batch_size, device=device)
+        if eos_check_interval < 1:
+            raise ValueError(f"eos_check_interval must be positive, got {eos_check_interval}")
+        # Speech latents generated so far per sample, the position in `diffusion_steps_schedule` / `first_chunk`
+        num_speech_latents = [0] * batch_size
+        # All samples start together, so every window, the first one included, is shared
+        if text_window_size < 1 or speech_window_size < 1:
+            raise ValueError(f"Window sizes must be positive, got {text_window_size} and {speech_window_size}")
+        steady_window_sizes = (text_window_size, speech_window_size)
+        if window_controller is not None:
+            window_controller.start()
+        if first_chunk is not None:
+            text_window_size, speech_window_size = first_chunk.text_window_size, first_chunk.speech_window_size
+        if text_prefill not in (None, "full", "background"):
+            raise ValueError(f"Unsupported text_prefill {text_prefill!r}, expected None, 'full' or 'background'.")
+
         # Initialize audio chunks storage for each sample
         audio_chunks = [[] for _ in range(batch_size)]
-        tts_text_window_index = 0
         reach_max_step_sample = torch.zeros(batch_size, dtype=torch.bool, device=device)
-        first_text_window_size = TTS_TEXT_WINDOW_SIZE if tts_text_ids.shape[1] >= TTS_TEXT_WINDOW_SIZE else tts_text_ids.shape[1]
-
-        outputs = all_prefilled_outputs["lm"]
-        tts_lm_outputs = all_prefilled_outputs["tts_lm"]
-        negative_outputs = all_prefilled_outputs["neg_lm"]
-        tts_lm_negative_outputs = all_prefilled_outputs["neg_tts_lm"]
+        deferred_eos = _DeferredEndOfSpeech(batch_size, device, audio_chunks, audio_streamer)
+
+        model_kwargs["past_key_values"] = all_prefilled_outputs["lm"].past_key_values
+        tts_lm_model_kwargs["past_key_values"] = all_prefilled_outputs["tts_lm"].past_key_values
+        # Conditions for the next speech token: last TTS LM hidden state of each sample
+        tts_lm_last_hidden_state = all_prefilled_outputs["tts_lm"].last_hidden_state[:, -1, :]
+        tts_lm_negative_last_hidden_state = None
+        if use_cfg:
+            tts_lm_negative_model_kwargs["past_key_values"] = all_prefilled_outputs["neg_tts_lm"].past_key_values
+            tts_lm_negative_last_hidden_state = all_prefilled_outputs["neg_tts_lm"].last_hidden_state[:, -1, :]
+        # Token ids and cached attention masks grow in preallocated buffers (sized for the whole generation)
+        buffer_capacity = tts_lm_generation_config.max_length + steady_window_sizes[0]
+        tts_lm_sequence = _ColumnBuffer(tts_lm_input_ids, buffer_capacity)
+        tts_lm_input_ids = tts_lm_sequence.view
+        _reserve_attention_mask(model_kwargs, buffer_capacity)
+        if not fuse_cfg:
+            _reserve_attention_mask(tts_lm_model_kwargs, buffer_capacity)
+        if use_cfg and not fuse_cfg:
+            _reserve_attention_mask(tts_lm_negative_model_kwargs, buffer_capacity)
+        if fuse_cfg:
+            # Rows [0, B) are the positive branch, rows [B, 2B) the negative branch
+            cfg_model_kwargs = _cat_model_kwargs([tts_lm_model_kwargs, tts_lm_negative_model_kwargs])
+            _reserve_attention_mask(cfg_model_kwargs, buffer_capacity)
+        # Worker threads (text prefill, background decoding) are stopped however the loop exits
+        acoustic_decoder = _AcousticDecoder(self.model, background=background_decode)
+        completed = False
+        try:
+            if text_prefill is not None:
+                # One window over the whole text, or the steady-state windows on a worker thread
+                chunk_size = tts_text_ids.shape[1] if text_prefill == "full" else steady_window_sizes[0]
+                text_prefill = _TextPrefill(
+                    self, model_kwargs, tts_text_ids, tts_text_lengths, neg_text_input_id, max(chunk_size, 1),
+                    background=text_prefill == "background",
+                )
 
-        model_kwargs = _update_model_kwargs_for_generation(
-            outputs, model_kwargs, num_new_tokens=first_text_window_size,
-        )
-        tts_lm_model_kwargs = _update_model_kwargs_for_generation(
-            tts_lm_outputs, tts_lm_model_kwargs, num_new_tokens=first_text_window_size,
-        )
-        negative_model_kwargs = self._update_model_kwargs_for_generation(
-            negative_outputs, negative_model_kwargs, is_encoder_decoder=False,
-        )
-        tts_lm_negative_model_kwargs = self._update_model_kwargs_for_generation(
-            tts_lm_negative_outputs, tts_lm_negative_model_kwargs, is_encoder_decoder=False,
-        )
+            step = tts_lm_input_ids.shape[1]
+            total_generated_speech_tokens = 0
+            total_prefilled_text_tokens = 0
+            if kwargs.get("show_progress_bar", True):
+                progress_bar = tqdm(
+                    total=tts_lm_generation_config.max_length,
+                    desc=f"Prefilled {step} tokens, current step ({step} / {tts_lm_generation_config.max_length})",
+                    initial=step,
+                    leave=False
+                )
+            else:
+                progress_bar = None
 
-        step = tts_lm_input_ids.shape[1]
-        total_generated_speech_tokens = 0
-        total_prefilled_text_tokens = 0
-        if kwargs.get("show_progress_bar", True):
-            progress_bar = tqdm(
-                total=tts_lm_generation_config.max_length,
-                desc=f"Prefilled {step} tokens, current step ({step} / {tts_lm_generation_config.max_length})",
-                initial=step,
-                leave=False
-            )
-        else:
-            progress_bar = None
-
-        while True:
-            # Check for external stop signal
-            if stop_check_fn is not None and stop_check_fn():
-                if verbose:
-                    print(f"Generation stopped externally at step {step + 1}")
-                # End the audio streamer if it exists
-                if audio_streamer is not None:
-                    audio_streamer.end()
-                break
-            
-            # # Check if audio_streamer has been ended (stopped externally)
-            # if audio_streamer is not None and hasattr(audio_streamer, 'finished_flags'):
-            #     if any(audio_streamer.finished_flags):
-            #         if verbose:
-            #             print(f"Audio generation stopped externally at step {step + 1}")
-            #         break
+            while True:
+                # Check for external stop signal
+                if stop_check_fn is not None and stop_check_fn():
+                    if verbose:
+                        print(f"Generation stopped externally at step {step + 1}")
+                    # End the audio streamer if it exists
+                    if audio_streamer is not None:
+                        audio_streamer.end()
+                    break
             
-            if finished_tags.all():
-                if hasattr(progress_bar, 'set_description'):
-                    progress_bar.set_description("Generation complete")
-                break
-
-            cur_input_tts_text_ids = tts_text_ids[:, tts_text_window_index*TTS_TEXT_WINDOW_SIZE:(tts_text_window_index+1)*TTS_TEXT_WINDOW_SIZE]
-            next_text_window_size = tts_text_ids[:, (tts_text_window_index+1)*TTS_TEXT_WINDOW_SIZE:(tts_text_window_index+2)*TTS_TEXT_WINDOW_SIZE].shape[1]
-            tts_text_window_index += 1
+                if not active_rows:
+                    if hasattr(progress_bar, 'set_description'):
+                        progress_bar.set_description("Generation complete")
+                    break
 
-            if cur_input_tts_text_ids.shape[1] > 0:
-                input_ids = torch.cat([input_ids, cur_input_tts_text_ids], dim=-1)
-                tts_lm_input_ids = torch.cat([tts_lm_input_ids, cur_input_tts_text_ids], dim=-1)
+                # Next text window of every unfinished sample, left-padded so that position -1 is a real token
+                if text_stream is not None:
+                    window_text_ids, cur_window_lengths = _stream_text_windows(
+                        text_stream, tts_text_cursors.tolist(), text_window_size,
+                        [row not in active_rows for row in range(batch_size)], neg_text_input_id, device,
+                    )
+                    window_cursors = torch.zeros_like(tts_text_cursors)
+                else:
+                    window_text_ids, window_cursors = tts_text_ids, tts_text_cursors
+                    cur_window_lengths = (tts_text_lengths - tts_text_cursors).clamp(0, text_window_size).masked_fill(finished_tags, 0)
+                cur_window_size = int(cur_window_lengths.max().item())
 
-                if tts_lm_input_ids.shape[1] > tts_lm_generation_config.max_length:
-                    if verbose:
-                        print(f"Reached maximum generation length {generation_config.max_length}, stopped it.")
-                    reached_samples = torch.arange(batch_size, device=device)[~finished_tags]
-                    if reached_samples.numel() > 0:
-                        reach_max_step_sample[reached_samples] = True
-                    break
+                if cur_window_size > 0:
+                    cur_input_tts_text_ids, cur_window_mask, cur_text_positions = _left_padded_windows(
+                        window_text_ids, window_cursors, cur_window_lengths, neg_text_input_id
+                    )
+                    text_rows = cur_window_lengths.nonzero(as_tuple=True)[0]
+                    tts_text_cursors = tts_text_cursors + cur_window_lengths
+
+                    tts_lm_input_ids = tts_lm_sequence.append(cur_input_tts_text_ids)
+
+                    if tts_lm_input_ids.shape[1] > tts_lm_generation_config.max_length:
+                        if verbose:
+                            print(f"Reached maximum generation length {generation_config.max_length}, stopped it.")
+                        reached_samples = torch.arange(batch_size, device=device)[~finished_tags]
+                        if reached_samples.numel() > 0:
+                            reach_max_step_sample[reached_samples] = True
+                        break
                 
-                step += cur_input_tts_text_ids.shape[1]
-                total_prefilled_text_tokens += cur_input_tts_text_ids.shape[1]
-                if progress_bar is not None:
-                    progress_bar.update(cur_input_tts_text_ids.shape[1])
-                    progress_bar.set_description(f"Prefilled {total_prefilled_text_tokens} text tokens, generated {total_generated_speech_tokens} speech tokens, current step ({step} / {tts_lm_generation_config.max_length})")
-
-                model_inputs = self.prepare_inputs_for_generation(input_ids, **model_kwargs)
-                # Forward pass through the model
-                outputs = self.forward_lm(
-                    **model_inputs, return_dict=True, output_attentions=False, output_hidden_states=False,
-                )
-                model_kwargs = _update_model_kwargs_for_generation(
-                    outputs, model_kwargs, num_new_tokens=next_text_window_size,
-                )
+                    step += cur_window_size
+                    total_prefilled_text_tokens += cur_window_size
+                    if progress_bar is not None:
+                        progress_bar.update(cur_window_size)
+                        progress_bar.set_description(f"Prefilled {total_prefilled_text_tokens} text tokens, generated {total_generated_speech_tokens} speech tokens, current step ({step} / {tts_lm_generation_config.max_length})")
+
+                    # Forward pass through the model
+                    if text_prefill is None:
+                        lm_last_hidden_state = self._forward_window(
+                            self.forward_lm, model_kwargs, cur_input_tts_text_ids, cur_window_mask, rows=text_rows,
+                        ).last_hidden_state
+                    else:
+                        lm_last_hidden_state = text_prefill.window(cur_text_positions, int(tts_text_cursors.max().item()))
+                    # Forward pass through the model
+                    if fuse_cfg:
+                        # Text only goes to the positive rows, the negative rows get a masked padding window
+                        tts_lm_outputs = self._forward_window(
+                            self.forward_tts_lm, cfg_model_kwargs, cur_input_tts_text_ids.repeat(2, 1),
+                            torch.cat([cur_window_mask, torch.zeros_like(cur_window_mask)]), rows=text_rows,
+                            tts_text_masks=torch.ones_like(cur_input_tts_text_ids[:, -1:]).repeat(2, 1),
+                            lm_last_hidden_state=lm_last_hidden_state.repeat(2, 1, 1),
+                        )
+                    else:
+                        tts_lm_outputs = self._forward_window(
+                            self.forward_tts_lm, tts_lm_model_kwargs, cur_input_tts_text_ids, cur_window_mask, rows=text_rows,
+                            tts_text_masks=torch.ones_like(cur_input_tts_text_ids[:, -1:]),
+                            lm_last_hidden_state=lm_last_hidden_state,
+                        )
+                    tts_lm_last_hidden_state = torch.where(
+                        (cur_window_lengths > 0)[:, None], tts_lm_outputs.last_hidden_state[:batch_size, -1, :], tts_lm_last_hidden_state
+                    )
 
-                tts_lm_model_inputs = self.prepare_inputs_for_generation(tts_lm_input_ids, **tts_lm_model_kwargs)
-                tts_lm_additional_inputs = {
-                    "tts_text_masks": torch.ones_like(tts_lm_input_ids[:, -1:]),
-                    "lm_last_hidden_state": outputs.last_hidden_state,
-                }
-                # Forward pass through the model
-                tts_lm_outputs = self.forward_tts_lm(
-                    **tts_lm_model_inputs, **tts_lm_additional_inputs, return_dict=True, output_attentions=False, output_hidden_states=False,
-                )
-                tts_lm_model_kwargs = self._update_model_kwargs_for_generation(
-                    tts_lm_outputs, tts_lm_model_kwargs, is_encoder_decoder=False,
-                )
+                for cur_speech_index in range(speech_window_size):
+                    if not active_rows:
+                        break
+                    positive_condition = tts_lm_last_hidden_state[diffusion_indices]
+                    negative_condition = tts_lm_negative_last_hidden_state[diffusion_indices] if use_cfg else None
+                    positions = [num_speech_latents[i] for i in active_rows]
+                    for i in active_rows:
+                        num_speech_latents[i] += 1
+                    num_steps = None
+                    if diffusion_steps_schedule is not None:
+                        num_steps = [diffusion_steps_schedule[min(p, len(diffusion_steps_schedule) - 1)] for p in positions]
+                    negative_condition, diffusion_cfg_scale, num_steps = self._apply_first_chunk_policy(
+                        first_chunk, positions, negative_condition, cfg_scale, num_steps
+                    )
 
-            diffusion_indices = torch.LongTensor([0])
-            for cur_speech_index in range(TTS_SPEECH_WINDOW_SIZE):
-                positive_condition = tts_lm_outputs.last_hidden_state[diffusion_indices, -1, :]
-                negative_condition = tts_lm_negative_outputs.last_hidden_state[diffusion_indices, -1, :]
-                
-                speech_latent = self.sample_speech_tokens(
-                    positive_condition,
-                    negative_condition,
-                    cfg_scale=cfg_scale,
-                ).unsqueeze(1)
+                    speech_latent = self.sample_speech_tokens(
+                        positive_condition,
+                        negative_condition,
+                        cfg_scale=diffusion_cfg_scale,
+                        guidance_interval=guidance_interval,
+                        solver=solver,
+                        warm_start_latents=previous_speech_latents[diffusion_indices],
+                        warm_start_sigma=warm_start_sigma,
+                        warm_start_mask=[has_previous_latent[i] for i in active_rows],
+                        num_steps=num_steps,
+                        x0_tolerance=x0_tolerance,
+                    ).unsqueeze(1)
+                    if warm_start_sigma is not None:
+                        previous_speech_latents[diffusion_indices] = speech_latent[:, 0].to(previous_speech_latents)
+                        for i in active_rows:
+                            has_previous_latent[i] = True
                                 
-                # Decode acoustic latent to audio using acoustic streaming cache
-                scaled_latent = speech_latent / self.model.speech_scaling_factor.to(speech_latent.device) - self.model.speech_bias_factor.to(speech_latent.device)
-                audio_chunk = self.model.acoustic_tokenizer.decode(
-                    scaled_latent.to(self.model.acoustic_tokenizer.device),
-                    cache=acoustic_cache,  # Use acoustic-specific cache
-                    sample_indices=diffusion_indices.to(self.model.acoustic_tokenizer.device),
-                    use_cache=True,
-                    debug=False
-                )
-                
-                # Store audio chunks for each sample
-                for i, sample_idx in enumerate(diffusion_indices):
-                    idx = sample_idx.item()
-                    # Only append audio chunk if the sample is not finished
-                    if not finished_tags[idx]:
-                        audio_chunks[idx].append(audio_chunk[i])
-
-                 # Add streaming support here
-                if audio_streamer is not None:
-                    # Stream the audio chunks immediately
-                    audio_streamer.put(audio_chunk, diffusion_indices)
+                    # Decode acoustic latent to audio using acoustic streaming cache
+                    deferred_eos.add_audio(active_rows, acoustic_decoder.submit(speech_latent, diffusion_indices))
 
-                acoustic_embed = self.model.acoustic_connector(speech_latent)
-                tts_lm_input_ids = torch.cat([tts_lm_input_ids, torch.ones_like(tts_lm_input_ids[:, -1:])], dim=-1)
+                    # Finished samples keep stepping with a zero embedding; their outputs are ignored
+                    diffusion_acoustic_embed = self.model.acoustic_connector(speech_latent)
+                    acoustic_embed = diffusion_acoustic_embed.new_zeros(batch_size, *diffusion_acoustic_embed.shape[1:])
+                    acoustic_embed[diffusion_indices] = diffusion_acoustic_embed
+                    tts_lm_input_ids = tts_lm_sequence.append_value(1)
 
-                if tts_lm_input_ids.shape[1] > tts_lm_generation_config.max_length:
-                    break
+                    if tts_lm_input_ids.shape[1] > tts_lm_generation_config.max_length:
+                        break
                 
-                step += 1
-                total_generated_speech_tokens += 1
-                if progress_bar is not None:
-                    progress_bar.update(1)
-                    progress_bar.set_description(f"Prefilled {total_prefilled_text_tokens} text tokens, generated {total_generated_speech_tokens} speech tokens, current step ({step} / {tts_lm_generation_config.max_length})")
-
-                tts_lm_model_inputs = self.prepare_inputs_for_generation(tts_lm_input_ids, **tts_lm_model_kwargs)
-                tts_lm_additional_inputs = {
-                    "tts_text_masks": torch.zeros_like(tts_lm_input_ids[:, -1:]),
-                    "lm_last_hidden_state": acoustic_embed,
-                }
-                # Forward pass through the model
-                tts_lm_outputs = self.forward_tts_lm(
-                    **tts_lm_model_inputs, **tts_lm_additional_inputs, return_dict=True, output_attentions=False, output_hidden_states=False,
-                )
-                if cur_speech_index == TTS_SPEECH_WINDOW_SIZE - 1 and next_text_window_size > 0:
-                    tts_lm_model_kwargs = _update_model_kwargs_for_generation(
-                        tts_lm_outputs, tts_lm_model_kwargs, num_new_tokens=next_text_window_size,
-                    )
+                    step += 1
+                    total_generated_speech_tokens += 1
+                    if progress_bar is not None:
+                        progress_bar.update(1)
+                        progress_bar.set_description(f"Prefilled {total_prefilled_text_tokens} text tokens, generated {total_generated_speech_tokens} speech tokens, current step ({step} / {tts_lm_generation_config.max_length})")
+
+                    if fuse_cfg:
+                        # Positive and negative branches in one batch
+                        tts_lm_last_hidden_state, tts_lm_negative_last_hidden_state = self._tts_lm_step(
+                            cfg_model_kwargs, acoustic_embed.repeat(2, 1, 1)
+                        ).chunk(2)
+                    else:
+                        tts_lm_last_hidden_state = self._tts_lm_step(tts_lm_model_kwargs, acoustic_embed)
+                        if use_cfg:
+                            tts_lm_negative_last_hidden_state = self._tts_lm_step(tts_lm_negative_model_kwargs, acoustic_embed)
+
+                    # Audio is stored and streamed when the EOS decisions are read (`_DeferredEndOfSpeech.poll`)
+                    tts_eos_logits = torch.sigmoid(self.tts_eos_classifier(tts_lm_last_hidden_state[diffusion_indices]))
+                    deferred_eos.add_eos(diffusion_indices, tts_eos_logits[:, 0] > 0.5)
+                    if len(deferred_eos) >= eos_check_interval:
+                        active_rows, diffusion_indices = self._finish_rows(deferred_eos.poll(), active_rows, diffusion_indices, finished_tags)
+
+                active_rows, diffusion_indices = self._finish_rows(deferred_eos.poll(), active_rows, diffusion_indices, finished_tags)
+
+                # Windows after the first run at the steady-state (or controller) sizes
+                if window_controller is not None:
+                    text_window_size, speech_window_size = window_controller.next_windows(deferred_eos.generated_samples)
                 else:
-                    tts_lm_model_kwargs = self._update_model_kwargs_for_generation(
-                        tts_lm_outputs, tts_lm_model_kwargs, is_encoder_decoder=False,
-                    )
-
-                tts_lm_negative_input_ids = torch.cat([tts_lm_negative_input_ids, torch.ones_like(tts_lm_input_ids[:, -1:])], dim=-1)
-                tts_lm_negative_model_inputs = self.prepare_inputs_for_generation(tts_lm_negative_input_ids, **tts_lm_negative_model_kwargs)
-                # Forward negative pass through the model
-                tts_lm_negative_additional_inputs = {
-                    "tts_text_masks": torch.zeros_like(tts_lm_negative_input_ids[:, -1:]),
-                    "lm_last_hidden_state": acoustic_embed,
-                }
-                tts_lm_negative_outputs = self.forward_tts_lm(
-                    **tts_lm_negative_model_inputs, **tts_lm_negative_additional_inputs, return_dict=True, output_attentions=False, output_hidden_states=False,
-                )
-                tts_lm_negative_model_kwargs = self._update_model_kwargs_for_generation(
-                    tts_lm_negative_outputs, tts_lm_negative_model_kwargs, is_encoder_decoder=False,
-                )
-
-                tts_eos_logits = torch.sigmoid(self.tts_eos_classifier(tts_lm_outputs.last_hidden_state[diffusion_indices, -1, :]))
-                if tts_eos_logits[0].item() > 0.5:
-                    # If EOS token is predicted, we can stop generation for this sample
-                    finished_tags[diffusion_indices] = True
-                    if audio_streamer is not None:
-                        audio_streamer.end(diffusion_indices)
+                    text_window_size, speech_window_size = steady_window_sizes
 
-            if tts_lm_input_ids.shape[1] > tts_lm_generation_config.max_length:
-                if verbose:
-                    print(f"Reached maximum generation length {tts_lm_generation_config.max_length}, stopped it.")
-                reached_samples = torch.arange(batch_size, device=device)[~finished_tags]
-                if reached_samples.numel() > 0:
-                    reach_max_step_sample[reached_samples] = True
-                break
+                if tts_lm_input_ids.shape[1] > tts_lm_generation_config.max_length:
+                    if verbose:
+                        print(f"Reached maximum generation length {tts_lm_generation_config.max_length}, stopped it.")
+                    reached_samples = torch.arange(batch_size, device=device)[~finished_tags]
+                    if reached_samples.numel() > 0:
+                        reach_max_step_sample[reached_samples] = True
+                    break
+            completed = True
+        finally:
+            if isinstance(text_prefill, _TextPrefill):
+                text_prefill.close()
+            # Decodes still queued after an error are dropped
+            acoustic_decoder.close(cancel=not completed)
 
         if audio_streamer is not None:
             audio_streamer.end()
@@ -698,29 +1569,424 @@ class VibeVoiceStreamingForConditionalGenerationInference(VibeVoiceStreamingPreT
             print(f"Reached maximum generation length {tts_lm_generation_config.max_length}, stopped it.")
 
         return VibeVoiceGenerationOutput(
-            sequences=tts_lm_input_ids,
+            sequences=tts_lm_input_ids.clone(),
             speech_outputs=final_audio_outputs if return_speech else None,
             reach_max_step_sample=reach_max_step_sample,
         )
 
+    def _guidance_step_mask(self, sigmas: List[float], guidance_interval=None) -> List[bool]:
+        """
+        Flags, per diffusion step with the given scheduler `sigmas`, whether CFG is applied.
+
+        - None: every step.
+        - int k: the first k steps (the high-noise part of the trajectory).
+        - (sigma_min, sigma_max): the steps whose scheduler sigma lies in the closed interval.
+        """
+        num_steps = len(sigmas)
+        if guidance_interval is None:
+            return [True] * num_steps
+        if isinstance(guidance_interval, int):
+            return [i < guidance_interval for i in range(num_steps)]
+        sigma_min, sigma_max = guidance_interval
+        return [sigma_min <= sigma <= sigma_max for sigma in sigmas]
+
+    def _apply_first_chunk_policy(self, first_chunk, positions, neg_condition, cfg_scale, num_steps):
+        """
+        Diffusion settings of rows at the speech latent `positions` under `first_chunk`.
+
+        Rows among the first `first_chunk.num_latents` latents get `first_chunk.diffusion_steps` and, without
+        `use_cfg`, a guidance scale of 1 (the conditional prediction). The negative condition is dropped when
+        no row needs it. Returns the `neg_condition`, `cfg_scale` and `num_steps` for `sample_speech_tokens`.
+        """
+        if first_chunk is None:
+            return neg_condition, cfg_scale, num_steps
+        fast = [position < first_chunk.num_latents for position in positions]
+        if not any(fast):
+            return neg_condition, cfg_scale, num_steps
+        if first_chunk.diffusion_steps is not None:
+            if num_steps is None or isinstance(num_steps, int):
+                num_steps = [num_steps or self.ddpm_inference_steps] * len(positions)
+            num_steps = [first_chunk.diffusion_steps if is_fast else steps for is_fast, steps in zip(fast, num_steps)]
+        if neg_condition is not None and not first_chunk.use_cfg:
+            if all(fast):
+                neg_condition = None
+            else:
+                if not torch.is_tensor(cfg_scale) or cfg_scale.dim() == 0:
+                    cfg_scale = torch.full((len(positions), 1), float(cfg_scale), dtype=neg_condition.dtype, device=neg_condition.device)
+                fast_rows = torch.tensor(fast, device=cfg_scale.device)[:, None]
+                cfg_scale = torch.where(fast_rows, torch.ones_like(cfg_scale), cfg_scale)
+        return neg_condition, cfg_scale, num_steps
+
+    def _get_solver_scheduler(self, solver: Optional[str] = None):
+        """
+        Scheduler for the registered `solver` (see `vibevoice.schedule.solvers`), built on the noise schedule
+        of `noise_scheduler`. None selects `noise_scheduler` itself.
+        """
+        base = self.model.noise_scheduler
+        if self._base_noise_scheduler is not base:
+            # The scheduler was replaced (e.g. `from_config` with another algorithm), drop everything derived from it
+            self._solver_schedulers = {}
+            self._sampling_plans = {}
+            self._batch_plans = {}
+            self._stepping_schedulers = {}
+            self._speech_samplers = {}
+            self._base_noise_scheduler = base
+        if solver is None:
+            return base
+        if solver not in self._solver_schedulers:
+            self._solver_schedulers[solver] = build_solver(solver, base)
+        return self._solver_schedulers[solver]
+
+    def _get_sampling_plan(
+        self, scheduler, begin_index: int = 0, num_steps: Optional[int] = None
+    ) -> Optional[DPMSolverSamplingPlan]:
+        """
+        Cached `DPMSolverSamplingPlan` of `scheduler` for `num_steps` (default `ddpm_inference_steps`), starting
+        at `begin_index`, on the prediction head's device and dtype, or None when the scheduler is not covered
+        by sampling plans.
+        """
+        head = self.model.prediction_head
+        num_steps = num_steps or self.ddpm_inference_steps
+        key = (scheduler, num_steps, begin_index, head.device, head.dtype)
+        if key not in self._sampling_plans:
+            plan = None
+            if isinstance(scheduler, DPMSolverMultistepScheduler):
+                try:
+                    plan = DPMSolverSamplingPlan(
+                        scheduler,
+                        num_steps,
+                        t_embedder=head.t_embedder,
+                        device=head.device,
+                        dtype=head.dtype,
+                        begin_index=begin_index,
+                    )
+                except ValueError as e:
+                    logger.warning_once(f"Falling back to per-step noise scheduler calls: {e}")
+            self._sampling_plans[key] = plan
+        return self._sampling_plans[key]
+
+    def _warm_start_index(self, scheduler, warm_start_sigma: float, num_steps: Optional[int] = None) -> int:
+        """First diffusion step whose sigma is at most `warm_start_sigma` (the last step if there is none)."""
+        plan = self._get_sampling_plan(scheduler, num_steps=num_steps)
+        if plan is not None:
+            sigmas = plan.sigmas[: plan.num_inference_steps]
+        else:
+            scheduler = self._get_stepping_scheduler(scheduler, num_steps or self.ddpm_inference_steps)
+            sigmas = scheduler.sigmas[: len(scheduler.timesteps)].tolist()
+        return next((i for i, sigma in enumerate(sigmas) if sigma <= warm_start_sigma), len(sigmas) - 1)
+
+    def _get_fused_prediction_head(self) -> VibeVoiceFusedDiffusionHead:
+        """Fused view of `prediction_head`, built from its weights on first use and after device/dtype changes."""
+        head = self.model.prediction_head
+        key = (head.device, head.dtype)
+        if key not in self._fused_prediction_head:
+            self._fused_prediction_head = {key: head.fuse_for_inference()}
+        return self._fused_prediction_head[key]
+
     @torch.no_grad()
-    def sample_speech_tokens(self, condition, neg_condition, cfg_scale=3.0):
-        self.model.noise_scheduler.set_timesteps(self.ddpm_inference_steps)
-        condition = torch.cat([condition, neg_condition], dim=0).to(self.model.prediction_head.device)
-        speech = torch.randn(condition.shape[0], self.config.acoustic_vae_dim).to(condition)
-        for t in self.model.noise_scheduler.timesteps:
-            half = speech[: len(speech) // 2]
-            combined = torch.cat([half, half], dim=0)
-            eps = self.model.prediction_head(combined, t.repeat(combined.shape[0]).to(combined), condition=condition)
-            cond_eps, uncond_eps = torch.split(eps, len(eps) // 2, dim=0)
-            half_eps = uncond_eps + cfg_scale * (cond_eps - uncond_eps)
-            eps = torch.cat([half_eps, half_eps], dim=0)
-            speech = self.model.noise_scheduler.step(eps, t, speech).prev_sample
-        return speech[: len(speech) // 2]
+    def sample_speech_tokens(
+        self,
+        condition,
+        neg_condition=None,
+        cfg_scale=3.0,
+        guidance_interval=None,
+        solver=None,
+        warm_start_latents=None,
+        warm_start_sigma=None,
+        warm_start_mask=None,
+        num_steps=None,
+        x0_tolerance=None,
+    ):
+        """
+        Sample one speech latent per condition row with the diffusion head.
+
+        Args:
+            condition: (B, H) TTS LM hidden states.
+            neg_condition: (B, H) negative hidden states for classifier-free guidance, or None to skip CFG.
+            cfg_scale: guidance scale (float, or a (B, 1) tensor for per-row scales).
+            guidance_interval: restricts CFG to some diffusion steps, see `_guidance_step_mask`. Steps
+                without guidance evaluate the prediction head on the conditional half only.
+            solver: name of a registered solver (`vibevoice.schedule.solvers.available_solvers()`), or None
+                for `noise_scheduler`.
+            warm_start_latents: (B, D) previous speech latents. With `warm_start_sigma`, each trajectory starts
+                from its previous latent noised to the first schedule step with sigma <= `warm_start_sigma`
+                (SDEdit) and only runs the remaining steps.
+            warm_start_sigma: starting noise level of warm-started rows; None disables warm starts.
+            warm_start_mask: (B,) bool tensor or list, rows that have a previous latent; the others run the full
+                schedule.
+            num_steps: diffusion steps, an int or one count per row (e.g. from a per-position schedule); None
+                uses `ddpm_inference_steps`.
+            x0_tolerance: stop a row early once its x0 prediction changes by at most this much (RMS) between two
+                steps, returning that prediction; None always runs the full schedule. Ignored by parallel sampling.
+
+        The diffusion steps actually run (or Picard iterations) are reported in `last_sampling_iterations`.
+        """
+        if warm_start_latents is None or warm_start_sigma is None:
+            warm_start_latents, warm_start_mask = None, None
+        if num_steps is None:
+            num_steps = self.ddpm_inference_steps
+        if not isinstance(num_steps, int) or warm_start_mask is not None:
+            # Rows with another step count or warm-start state follow another schedule
+            row_steps = [num_steps] * condition.shape[0] if isinstance(num_steps, int) else [int(n) for n in num_steps]
+            row_warm = [warm_start_latents is not None] * condition.shape[0]
+            if warm_start_mask is not None:
+                row_warm = warm_start_mask.tolist() if torch.is_tensor(warm_start_mask) else list(warm_start_mask)
+            groups = {}
+            for row, key in enumerate(zip(row_steps, row_warm)):
+                groups.setdefault(key, []).append(row)
+            if len(groups) > 1:
+                return self._sample_speech_tokens_by_rows(
+                    groups, condition, neg_condition, cfg_scale, guidance_interval, solver,
+                    warm_start_latents, warm_start_sigma, x0_tolerance,
+                )
+            ((num_steps, warm),) = groups
+            if not warm:
+                warm_start_latents = None
+
+        scheduler = self._get_solver_scheduler(solver)
+        begin_index = 0
+        if warm_start_latents is not None:
+            begin_index = self._warm_start_index(scheduler, warm_start_sigma, num_steps)
+        plan = self._get_sampling_plan(scheduler, begin_index, num_steps)
+        if plan is None:
+            if self.parallel_sampling is not None:
+                logger.warning_once("Parallel sampling needs a DPM-Solver++ sampling plan, using the sequential loop")
+            return self._sample_speech_tokens_with_scheduler(
+                scheduler, condition, neg_condition, cfg_scale, guidance_interval, warm_start_latents, begin_index,
+                num_steps, x0_tolerance,
+            )
+
+        head = self._get_fused_prediction_head()
+        if neg_condition is None:
+            guided_steps = (False,) * plan.num_inference_steps
+        else:
+            guided_steps = tuple(self._guidance_step_mask(plan.sigmas[: plan.num_inference_steps], guidance_interval))
+            neg_condition = neg_condition.to(self.model.prediction_head.device)
+        condition = condition.to(self.model.prediction_head.device)
+        sample = torch.randn(condition.shape[0], self.config.acoustic_vae_dim).to(condition)
+        if begin_index > 0:
+            alpha_t, sigma_t = plan.alpha_sigma(begin_index)
+            sample = alpha_t * warm_start_latents.to(sample) + sigma_t * sample
+        if self.parallel_sampling is not None:
+            num_steps = plan.num_inference_steps - plan.begin_index
+            max_iterations = min(self.parallel_sampling["max_iterations"] or num_steps, num_steps)
+            speech, self.last_sampling_iterations = _sample_with_picard(
+                head, plan, guided_steps, condition, neg_condition, sample, cfg_scale,
+                self.parallel_sampling["tolerance"], max_iterations,
+            )
+            return speech
+        if x0_tolerance is not None:
+            # Data-dependent exit, run eagerly
+            speech, self.last_sampling_iterations = _sample_with_plan_early_stop(
+                head, plan, guided_steps, condition, neg_condition, sample, cfg_scale, x0_tolerance
+            )
+            return speech
+        self.last_sampling_iterations = plan.num_inference_steps - plan.begin_index
+        sampler = self._get_speech_sampler(plan, head, guided_steps)
+        return sampler(condition, neg_condition, sample, cfg_scale)
+
+    def _sample_speech_tokens_by_rows(
+        self, groups, condition, neg_condition, cfg_scale, guidance_interval, solver, warm_start_latents, warm_start_sigma, x0_tolerance
+    ):
+        """
+        `sample_speech_tokens` for a batch whose rows follow different schedules. `groups` maps
+        (num_steps, warm-started) to the rows of that schedule. With DPM-Solver++ sampling plans all rows run
+        in one batched loop (`_sample_with_batch_plan`); otherwise each group is sampled separately.
+        """
+        if self.parallel_sampling is None and x0_tolerance is None:
+            speech = self._sample_speech_tokens_with_batch_plan(
+                groups, condition, neg_condition, cfg_scale, guidance_interval, solver, warm_start_latents, warm_start_sigma
+            )
+            if speech is not None:
+                return speech
+        speech, iterations = None, 0
+        for (num_steps, warm), rows in groups.items():
+            rows = torch.tensor(rows, device=condition.device)
+            row_cfg_scale = cfg_scale[rows.to(cfg_scale.device)] if torch.is_tensor(cfg_scale) and cfg_scale.dim() > 0 else cfg_scale
+            row_speech = self.sample_speech_tokens(
+                condition[rows],
+                None if neg_condition is None else neg_condition[rows.to(neg_condition.device)],
+                cfg_scale=row_cfg_scale,
+                guidance_interval=guidance_interval,
+                solver=solver,
+                warm_start_latents=warm_start_latents[rows.to(warm_start_latents.device)] if warm else None,
+                warm_start_sigma=warm_start_sigma,
+                num_steps=num_steps,
+                x0_tolerance=x0_tolerance,
+            )
+            if speech is None:
+                speech = row_speech.new_empty(condition.shape[0], row_speech.shape[-1])
+            speech[rows.to(speech.device)] = row_speech
+            iterations = max(iterations, self.last_sampling_iterations)
+        self.last_sampling_iterations = iterations
+        return speech
+
+    def _sample_speech_tokens_with_batch_plan(
+        self, groups, condition, neg_condition, cfg_scale, guidance_interval, solver, warm_start_latents, warm_start_sigma
+    ):
+        """Batched `_sample_speech_tokens_by_rows`, or None when some group has no sampling plan."""
+        scheduler = self._get_solver_scheduler(solver)
+        plans, row_plans = [], [0] * condition.shape[0]
+        for g, ((num_steps, warm), rows) in enumerate(groups.items()):
+            begin_index = self._warm_start_index(scheduler, warm_start_sigma, num_steps) if warm else 0
+            plan = self._get_sampling_plan(scheduler, begin_index, num_steps)
+            if plan is None:
+                return None
+            plans.append(plan)
+            for row in rows:
+                row_plans[row] = g
+        key = tuple(plans)
+        if key not in self._batch_plans:
+            self._batch_plans[key] = DPMSolverBatchPlan(plans)
+        batch_plan = self._batch_plans[key]
+
+        head = self._get_fused_prediction_head()
+        device = self.model.prediction_head.device
+        guided_steps = None
+        if neg_condition is not None:
+            guided_steps = [self._guidance_step_mask(plan.sigmas[: plan.num_inference_steps], guidance_interval) for plan in plans]
+            neg_condition = neg_condition.to(device)
+        condition = condition.to(device)
+        sample = torch.randn(condition.shape[0], self.config.acoustic_vae_dim).to(condition)
+        if any(plan.begin_index > 0 for plan in plans):
+            # Warm-started rows start from their previous latent, noised to their plan's first step
+            scales = torch.tensor(
+                [plan.alpha_sigma(plan.begin_index) if plan.begin_index > 0 else (0.0, 1.0) for plan in plans],
+                dtype=sample.dtype, device=device,
+            )[torch.tensor(row_plans, device=device)]
+            previous = torch.zeros_like(sample)
+            warm_rows = [row for (_, warm), rows in groups.items() if warm for row in rows]
+            previous[warm_rows] = warm_start_latents[warm_rows].to(sample)
+            sample = scales[:, :1] * previous + scales[:, 1:] * sample
+        self.last_sampling_iterations = batch_plan.max_steps
+        return _sample_with_batch_plan(
+            head, batch_plan, torch.tensor(row_plans, device=device), guided_steps, condition, neg_condition, sample, cfg_scale
+        )
+
+    def _get_speech_sampler(self, plan, head, guided_steps) -> Callable:
+        """
+        Cached `(condition, neg_condition, sample, cfg_scale) -> latent` callable running `_sample_with_plan`,
+        through `torch.compile` when `compile_speech_sampler` is set.
+        """
+        key = (plan, head, guided_steps)
+        if key in self._speech_samplers:
+            return self._speech_samplers[key]
+
+        def eager_sampler(condition, neg_condition, sample, cfg_scale):
+            return _sample_with_plan(head, plan, guided_steps, condition, neg_condition, sample, cfg_scale)
+
+        sampler = eager_sampler
+        if self.compile_speech_sampler and hasattr(torch, "compile"):
+            compiled = torch.compile(eager_sampler, dynamic=None, fullgraph=False)
+
+            def sampler(condition, neg_condition, sample, cfg_scale):
+                # Python floats would be baked into the graph, one recompilation per value
+                if not torch.is_tensor(cfg_scale):
+                    cfg_scale = torch.tensor(cfg_scale, dtype=sample.dtype, device=sample.device)
+                # The active row count changes whenever a row finishes or joins; a static batch dimension would
+                # recompile for every new count and soon hit dynamo's recompile limit (then run eagerly)
+                for tensor in (condition, neg_condition, sample, cfg_scale):
+                    if tensor is not None and tensor.dim() > 0 and tensor.shape[0] == sample.shape[0]:
+                        torch._dynamo.maybe_mark_dynamic(tensor, 0)
+                try:
+                    return compiled(condition, neg_condition, sample, cfg_scale)
+                except Exception as e:
+                    logger.warning_once(f"torch.compile failed for the speech sampler, running eagerly: {e}")
+                    self._speech_samplers[key] = eager_sampler
+                    return eager_sampler(condition, neg_condition, sample, cfg_scale)
+
+        self._speech_samplers[key] = sampler
+        return sampler
+
+    def _get_stepping_scheduler(self, scheduler, num_steps: int):
+        """
+        Private copy of `scheduler` with the timesteps of `num_steps`, for one trajectory. The scheduler keeps
+        per-trajectory solver state, so every call gets its own copy: a shallow copy, with fresh lists, of a
+        template prepared once per (scheduler, steps).
+        """
+        key = (scheduler, num_steps)
+        if key not in self._stepping_schedulers:
+            template = copy.deepcopy(scheduler)
+            template.set_timesteps(num_steps)
+            self._stepping_schedulers[key] = template
+        template = self._stepping_schedulers[key]
+        stepping = copy.copy(template)
+        # `step` updates the solver history lists in place and reassigns everything else
+        for name, value in vars(template).items():
+            if isinstance(value, list):
+                setattr(stepping, name, list(value))
+        return stepping
+
+    def _sample_speech_tokens_with_scheduler(
+        self, scheduler, condition, neg_condition=None, cfg_scale=3.0, guidance_interval=None, warm_start_latents=None,
+        begin_index=0, num_steps=None, x0_tolerance=None,
+    ):
+        """`sample_speech_tokens` through `scheduler.step`, for schedulers without a sampling plan."""
+        scheduler = self._get_stepping_scheduler(scheduler, num_steps or self.ddpm_inference_steps)
+        scheduler.set_begin_index(begin_index)
+        num_steps = len(scheduler.timesteps)
+        timesteps = scheduler.timesteps[begin_index:]
+        condition = condition.to(self.model.prediction_head.device)
+        batch_size = condition.shape[0]
+        speech = torch.randn(batch_size, self.config.acoustic_vae_dim).to(condition)
+        if begin_index > 0:
+            sigma = scheduler.sigmas[begin_index].item()
+            alpha_t = 1.0 / (sigma**2 + 1.0) ** 0.5
+            speech = alpha_t * warm_start_latents.to(speech) + sigma * alpha_t * speech
+        guided_steps = [False] * len(timesteps)
+        if neg_condition is not None:
+            guided_steps = self._guidance_step_mask(scheduler.sigmas[:num_steps].tolist(), guidance_interval)[begin_index:]
+            condition = torch.cat([condition, neg_condition.to(condition.device)], dim=0)
+            speech = torch.cat([speech, speech], dim=0)
+        # The x0 prediction for early stopping comes from the model output and the sigma of the step. Scheduler
+        # state such as `model_outputs` can hold other parametrizations (epsilon for DEIS).
+        early_stop = x0_tolerance is not None
+        if early_stop:
+            prediction_type = scheduler.config.prediction_type
+            if prediction_type not in ("epsilon", "v_prediction", "sample"):
+                raise ValueError(f"x0_tolerance does not support prediction_type {prediction_type!r}")
+            sigmas = scheduler.sigmas[begin_index:num_steps].tolist()
+        result, converged, previous_x0 = speech[:batch_size].clone(), None, None
+        self.last_sampling_iterations = 0
+        for i, (t, guided) in enumerate(zip(timesteps, guided_steps)):
+            half = speech[:batch_size]
+            if guided:
+                combined = torch.cat([half, half], dim=0)
+                eps = self.model.prediction_head(combined, t.repeat(combined.shape[0]).to(combined), condition=condition)
+                cond_eps, uncond_eps = torch.split(eps, batch_size, dim=0)
+                half_eps = uncond_eps + cfg_scale * (cond_eps - uncond_eps)
+            else:
+                half_eps = self.model.prediction_head(half, t.repeat(batch_size).to(half), condition=condition[:batch_size])
+            eps = half_eps if neg_condition is None else torch.cat([half_eps, half_eps], dim=0)
+            if early_stop:
+                alpha_t = 1.0 / (sigmas[i]**2 + 1.0) ** 0.5
+                sigma_t = sigmas[i] * alpha_t
+                if prediction_type == "epsilon":
+                    x0 = (half - sigma_t * half_eps) / alpha_t
+                elif prediction_type == "v_prediction":
+                    x0 = alpha_t * half - sigma_t * half_eps
+                else:
+                    x0 = half_eps
+            speech = scheduler.step(eps, t, speech).prev_sample
+            self.last_sampling_iterations += 1
+            if early_stop:
+                if previous_x0 is not None:
+                    done = (x0 - previous_x0).float().pow(2).mean(dim=-1) <= x0_tolerance**2
+                    newly_done = done if converged is None else done & ~converged
+                    result[newly_done] = x0[newly_done].to(result)
+                    converged = done if converged is None else converged | done
+                    if converged.all():
+                        return result
+                previous_x0 = x0
+        if converged is None:
+            return speech[:batch_size]
+        return torch.where(converged[:, None], result, speech[:batch_size])
     
 
 AutoModelForCausalLM.register(VibeVoiceStreamingConfig, VibeVoiceStreamingForConditionalGenerationInference)
 
 __all__ = [
+    "AdaptiveWindowController",
+    "FirstChunkPolicy",
     "VibeVoiceStreamingForConditionalGenerationInference",
 ]
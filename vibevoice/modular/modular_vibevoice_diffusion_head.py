@@ -279,9 +279,91 @@ class VibeVoiceDiffusionHead(PreTrainedModel):
         x = self.final_layer(x, c)
         return x
 
+    def fuse_for_inference(self):
+        """Build a `VibeVoiceFusedDiffusionHead` from the current weights."""
+        return VibeVoiceFusedDiffusionHead(self)
+
+
+class VibeVoiceFusedDiffusionHead(nn.Module):
+    """
+    Inference-only view of a `VibeVoiceDiffusionHead` with fused projections.
+
+    Built from the weights of a loaded head (see `VibeVoiceDiffusionHead.fuse_for_inference`):
+
+    - the adaLN modulation linears of every `HeadLayer` and the `FinalLayer` run on the same `c`,
+      so their weights are concatenated into a single GEMM per step;
+    - `gate_proj` and `up_proj` of each `FeedForwardNetwork` are concatenated into one GEMM;
+    - `cond_proj(condition)` is constant over the diffusion steps of one token and is computed once
+      with `prepare_condition`, then reused by every `step`.
+
+    Norms, `noisy_images_proj`, `down_proj` and the final `linear` are shared with the source head.
+    The fused weights are copies, so rebuild the view after changing the head's weights.
+
+    Args:
+        head (`VibeVoiceDiffusionHead`): The head to fuse.
+    """
+    def __init__(self, head):
+        super().__init__()
+        self.noisy_images_proj = head.noisy_images_proj
+        self.cond_proj = head.cond_proj
+        self.t_embedder = head.t_embedder
+        self.norms = nn.ModuleList([layer.norm for layer in head.layers])
+        self.down_projs = nn.ModuleList([layer.ffn.down_proj for layer in head.layers])
+        self.norm_final = head.final_layer.norm_final
+        self.linear = head.final_layer.linear
+        self.ffn_dim = head.layers[0].ffn_dim
+
+        with torch.no_grad():
+            adaln_weights = [layer.adaLN_modulation[-1].weight for layer in head.layers]
+            adaln_weights.append(head.final_layer.adaLN_modulation[-1].weight)
+            self.register_buffer("adaln_weight", torch.cat(adaln_weights, dim=0).contiguous(), persistent=False)
+            self.adaln_split_sizes = [w.shape[0] for w in adaln_weights]
+            self.register_buffer(
+                "gate_up_weights",
+                torch.stack([
+                    torch.cat([layer.ffn.gate_proj.weight, layer.ffn.up_proj.weight], dim=0)
+                    for layer in head.layers
+                ]),
+                persistent=False,
+            )
+
+    def prepare_condition(self, condition):
+        """Project the conditioning hidden states once per token (`cond_proj`)."""
+        return self.cond_proj(condition)
+
+    def step(self, noisy_images, condition, timestep_embedding):
+        """
+        One prediction-head evaluation.
+
+        Args:
+            noisy_images (`torch.Tensor`): (N, latent_size) noisy latents
+            condition (`torch.Tensor`): (N, hidden_size) output of `prepare_condition`
+            timestep_embedding (`torch.Tensor`): `t_embedder` output, (N, hidden_size) or broadcastable (hidden_size,)
+
+        Returns:
+            `torch.Tensor`: The predicted noise/velocity
+        """
+        x = self.noisy_images_proj(noisy_images)
+        c = F.silu(condition + timestep_embedding)
+        modulations = F.linear(c, self.adaln_weight).split(self.adaln_split_sizes, dim=-1)
+
+        for i, (norm, down_proj) in enumerate(zip(self.norms, self.down_projs)):
+            shift, scale, gate = modulations[i].chunk(3, dim=-1)
+            gate_up = F.linear(modulate(norm(x), shift, scale), self.gate_up_weights[i])
+            ffn_gate, ffn_up = gate_up.split(self.ffn_dim, dim=-1)
+            x = x + gate * down_proj(F.silu(ffn_gate) * ffn_up)
+
+        shift, scale = modulations[-1].chunk(2, dim=-1)
+        return self.linear(modulate(self.norm_final(x), shift, scale))
+
+    def forward(self, noisy_images, timesteps, condition):
+        """Same signature and result as `VibeVoiceDiffusionHead.forward`."""
+        return self.step(noisy_images, self.prepare_condition(condition), self.t_embedder(timesteps))
+
 
 AutoModel.register(VibeVoiceDiffusionHeadConfig, VibeVoiceDiffusionHead)
 
 __all__ = [
     "VibeVoiceDiffusionHead",
+    "VibeVoiceFusedDiffusionHead",
 ]
\ No newline at end of file
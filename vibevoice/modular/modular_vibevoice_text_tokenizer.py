@@ -1,5 +1,6 @@
 """Tokenization classes for vibevoice."""
 
+import unicodedata
 from typing import List, Optional, Union
 
 from transformers.utils import logging
@@ -208,7 +209,64 @@ class VibeVoiceTextTokenizerFast(Qwen2TokenizerFast):
         return self._pad_id
 
 
+class VibeVoiceIncrementalTextTokenizer:
+    """
+    Incremental tokenization of text that arrives in pieces (e.g. the deltas of an LLM reply).
+
+    Qwen2 BPE merges never cross pre-tokenizer splits, so the ids of the text before a split that no later
+    text can move are final. Such stable splits are a letter, digit or punctuation mark followed by a space
+    (but not a newline, which a punctuation mark absorbs), and a letter or digit followed by a punctuation
+    mark. A split before spaces only becomes stable once a non-space character follows them: until then
+    `flush(rstrip=True)` may still drop the spaces and let a punctuation mark absorb the suffix newline.
+    `push` commits the ids of the text up to the last stable split and keeps the rest as an uncommitted
+    tail, so every character is encoded once and the committed ids equal those of encoding the whole text
+    at once.
+
+    Args:
+        tokenizer (`VibeVoiceTextTokenizer` or `VibeVoiceTextTokenizerFast`):
+            The tokenizer used to encode the committed text.
+    """
+
+    def __init__(self, tokenizer):
+        self.tokenizer = tokenizer
+        self.tail = ""
+
+    @staticmethod
+    def _is_stable_split(previous: str, char: str) -> bool:
+        if previous.isspace():
+            return False
+        if char.isspace():
+            return char not in "\r\n"
+        return previous.isalnum() and unicodedata.category(char)[0] in "PS"
+
+    def push(self, text: str) -> List[int]:
+        """Appends `text` and returns the ids it made stable (possibly none)."""
+        # Only splits inside the new text (and at its first character) can be new, or the one before the
+        # trailing spaces of the tail, which the new text can follow with a non-space
+        start = min(len(self.tail), len(self.tail.rstrip()))
+        self.tail += text
+        split = 0
+        followed = False  # a non-space character comes after position i
+        for i in range(len(self.tail) - 1, max(start, 1) - 1, -1):
+            char = self.tail[i]
+            if self._is_stable_split(self.tail[i - 1], char) and (followed or not char.isspace()):
+                split = i
+                break
+            followed = followed or not char.isspace()
+        if split == 0:
+            return []
+        committed, self.tail = self.tail[:split], self.tail[split:]
+        return self.tokenizer.encode(committed, add_special_tokens=False)
+
+    def flush(self, suffix: str = "", rstrip: bool = False) -> List[int]:
+        """Commits the tail (without trailing whitespace if `rstrip`) followed by `suffix`, and returns its ids."""
+        text = (self.tail.rstrip() if rstrip else self.tail) + suffix
+        self.tail = ""
+        return self.tokenizer.encode(text, add_special_tokens=False) if text else []
+
+
 __all__ = [
     "VibeVoiceTextTokenizer", 
     "VibeVoiceTextTokenizerFast", 
+    "VibeVoiceIncrementalTextTokenizer",
 ]
\ No newline at end of file
@@ -191,69 +191,159 @@ class NormConvTranspose1d(nn.Module):
 
 
 class VibeVoiceTokenizerStreamingCache:
-    """Cache for streaming convolution, similar to KV cache in attention"""
+    """
+    Cache for streaming convolution, similar to KV cache in attention.
+
+    Every layer keeps its states in one preallocated (slots, C, context) buffer. Sample indices are mapped to
+    slots (freed again by `clear`), `get` gathers the rows of a batch with one index op and `set` writes them
+    back in place. States shorter than the buffer are left-padded with zeros, the history before the first chunk.
+
+    `snapshot` copies the states of some samples into plain tensors keyed by layer id (`torch.save`-able), and
+    `restore` loads them into any cache, under the same or other sample indices; `fork` combines both.
+    """
     def __init__(self):
-        self.cache = {}  # Dict mapping (layer_id, sample_idx) to state tensor
-        
-    def get(self, layer_id: str, sample_indices: torch.Tensor) -> Optional[torch.Tensor]:
-        """Get cached states for given layer and sample indices"""
-        states = []
-        max_length = 0
-        
-        # First pass: collect states and find max length
-        for idx in sample_indices.tolist():
-            key = (layer_id, idx)
-            if key not in self.cache:
-                return None  # If any sample is missing, return None
-            state = self.cache[key]
-            states.append(state)
-            max_length = max(max_length, state.shape[-1])
-        
-        # Second pass: pad states to max length if needed
-        if len(states) > 0 and states[0].dim() >= 2:
-            padded_states = []
-            for state in states:
-                if state.shape[-1] < max_length:
-                    # Pad on the time dimension (last dimension)
-                    pad_size = max_length - state.shape[-1]
-                    # Pad with zeros on the LEFT to align the most recent samples
-                    padded_state = F.pad(state, (pad_size, 0), mode='constant', value=0)
-                    padded_states.append(padded_state)
+        self.buffers: Dict[str, torch.Tensor] = {}  # layer_id -> (slots, C, context) states
+        self.slots: Dict[int, int] = {}  # sample index -> buffer row
+        self._free_slots: List[int] = []
+        self._num_slots = 0
+        # (sample index values, slot tensor, slots are 0..n-1) of the last lookup, shared by all layers of a decode call
+        self._last_lookup = None
+
+    def _lookup(self, sample_indices: torch.Tensor, device) -> Tuple[torch.Tensor, bool]:
+        indices = tuple(sample_indices.tolist())
+        last = self._last_lookup
+        if last is not None and last[0] == indices and last[1].device == device:
+            return last[1], last[2]
+        slots = []
+        for idx in indices:
+            if idx not in self.slots:
+                if self._free_slots:
+                    self.slots[idx] = self._free_slots.pop()
                 else:
-                    padded_states.append(state)
-            return torch.stack(padded_states, dim=0)
-        else:
-            return torch.stack(states, dim=0)
-    
+                    self.slots[idx] = self._num_slots
+                    self._num_slots += 1
+            slots.append(self.slots[idx])
+        prefix = slots == list(range(len(slots)))
+        slot_tensor = torch.tensor(slots, dtype=torch.long, device=device)
+        self._last_lookup = (indices, slot_tensor, prefix)
+        return slot_tensor, prefix
+
+    def _zero_rows(self, sample_indices: torch.Tensor, layer_ids):
+        for layer_id in layer_ids:
+            buffer = self.buffers[layer_id]
+            rows = [self.slots[idx] for idx in sample_indices.tolist() if idx in self.slots and self.slots[idx] < buffer.shape[0]]
+            if rows:
+                buffer[torch.tensor(rows, dtype=torch.long, device=buffer.device)] = 0
+
+    def get(self, layer_id: str, sample_indices: torch.Tensor) -> Optional[torch.Tensor]:
+        """
+        Get cached states for given layer and sample indices, None before the layer's first `set`.
+
+        Samples without states get zeros. The result can be a view of the cache, valid until the next `set`.
+        """
+        buffer = self.buffers.get(layer_id)
+        if buffer is None:
+            return None
+        slots, prefix = self._lookup(sample_indices, buffer.device)
+        if self._num_slots > buffer.shape[0]:
+            buffer = self._resize(layer_id, self._num_slots, buffer.shape[-1])
+        if prefix:
+            return buffer[:len(slots)]
+        return buffer.index_select(0, slots)
+
+    def _resize(self, layer_id: str, num_slots: int, length: int) -> torch.Tensor:
+        buffer = self.buffers[layer_id]
+        # Grow geometrically, as slots are added one session at a time
+        num_slots = buffer.shape[0] if num_slots <= buffer.shape[0] else max(num_slots, 2 * buffer.shape[0])
+        resized = buffer.new_zeros(num_slots, buffer.shape[1], length)
+        resized[:buffer.shape[0], :, length - buffer.shape[-1]:] = buffer
+        self.buffers[layer_id] = resized
+        return resized
+
     def set(self, layer_id: str, sample_indices: torch.Tensor, states: torch.Tensor):
         """Set cached states for given layer and sample indices"""
-        for i, idx in enumerate(sample_indices.tolist()):
-            key = (layer_id, idx)
-            self.cache[key] = states[i].detach()
+        states = states.detach()
+        buffer = self.buffers.get(layer_id)
+        slots, prefix = self._lookup(sample_indices, states.device)
+        if buffer is None:
+            buffer = self.buffers[layer_id] = states.new_zeros(self._num_slots, *states.shape[1:])
+        elif self._num_slots > buffer.shape[0] or states.shape[-1] > buffer.shape[-1]:
+            buffer = self._resize(layer_id, self._num_slots, max(states.shape[-1], buffer.shape[-1]))
+        if states.shape[-1] < buffer.shape[-1]:
+            states = F.pad(states, (buffer.shape[-1] - states.shape[-1], 0))
+        if prefix:
+            buffer[:len(slots)].copy_(states)
+        else:
+            buffer.index_copy_(0, slots, states)
+
+    def snapshot(self, sample_indices: Optional[torch.Tensor] = None, device: Optional[Union[str, torch.device]] = "cpu") -> Dict[str, tp.Any]:
+        """
+        Copy of the states of `sample_indices` (all samples by default) as {"sample_indices": [...],
+        "states": {layer_id: (N, C, context) tensor}}, on `device` (None keeps the cache's device).
+        """
+        indices = sorted(self.slots) if sample_indices is None else [int(idx) for idx in sample_indices]
+        missing = [idx for idx in indices if idx not in self.slots]
+        if missing:
+            raise ValueError(f"No cached states for samples {missing}")
+        states = {}
+        for layer_id in list(self.buffers):
+            buffer = self.buffers[layer_id]
+            if self._num_slots > buffer.shape[0]:
+                buffer = self._resize(layer_id, self._num_slots, buffer.shape[-1])
+            rows = buffer[torch.tensor([self.slots[idx] for idx in indices], dtype=torch.long, device=buffer.device)]
+            states[layer_id] = rows if device is None else rows.to(device)
+        return {"sample_indices": indices, "states": states}
+
+    def restore(self, snapshot: Dict[str, tp.Any], sample_indices: Optional[torch.Tensor] = None,
+                device: Optional[Union[str, torch.device]] = None):
+        """
+        Load the states of a `snapshot` for its samples, or under `sample_indices` instead. States go to `device`,
+        by default the device of this cache's buffers (or of the snapshot for an empty cache).
+        """
+        indices = snapshot["sample_indices"] if sample_indices is None else [int(idx) for idx in sample_indices]
+        if len(indices) != len(snapshot["sample_indices"]):
+            raise ValueError(f"The snapshot holds {len(snapshot['sample_indices'])} samples, got {len(indices)} sample indices")
+        if not indices:
+            return
+        if device is None and self.buffers:
+            device = next(iter(self.buffers.values())).device
+        sample_indices = torch.tensor(indices, dtype=torch.long)
+        # Layers missing from the snapshot restart from an empty history
+        self.set_to_zero(sample_indices)
+        for layer_id, states in snapshot["states"].items():
+            self.set(layer_id, sample_indices, states if device is None else states.to(device))
+
+    def fork(self, sample_indices: Optional[torch.Tensor] = None) -> "VibeVoiceTokenizerStreamingCache":
+        """Independent cache with a copy of the states of `sample_indices` (all samples by default)."""
+        cache = VibeVoiceTokenizerStreamingCache()
+        cache.restore(self.snapshot(sample_indices, device=None))
+        return cache
 
     def set_to_zero(self, sample_indices: torch.Tensor):
         """Set all cached states to zero for given sample indices"""
-        for key in list(self.cache.keys()):
-            layer_id, sample_idx = key
-            if sample_idx in sample_indices.tolist():
-                # Create zero tensor with same shape and dtype as cached tensor
-                cached_tensor = self.cache[key]
-                self.cache[key] = torch.zeros_like(cached_tensor)
-                
+        self._zero_rows(sample_indices, list(self.buffers))
+
     def clear(self, layer_id: Optional[str] = None, sample_indices: Optional[torch.Tensor] = None):
         """Clear cache for specific layer/samples or everything"""
         if layer_id is None and sample_indices is None:
-            self.cache.clear()
+            self.buffers.clear()
+            self.slots.clear()
+            self._free_slots = []
+            self._num_slots = 0
         elif layer_id is not None and sample_indices is None:
             # Clear all samples for a specific layer
-            keys_to_remove = [k for k in self.cache.keys() if k[0] == layer_id]
-            for k in keys_to_remove:
-                del self.cache[k]
+            self.buffers.pop(layer_id, None)
+        elif layer_id is None and sample_indices is not None:
+            # Clear specific samples for all layers and free their slots
+            self._zero_rows(sample_indices, list(self.buffers))
+            for idx in sample_indices.tolist():
+                if idx in self.slots:
+                    self._free_slots.append(self.slots.pop(idx))
         elif layer_id is not None and sample_indices is not None:
             # Clear specific samples for a specific layer
-            for idx in sample_indices.tolist():
-                key = (layer_id, idx)
-                self.cache.pop(key, None)
+            if layer_id in self.buffers:
+                self._zero_rows(sample_indices, [layer_id])
+        self._last_lookup = None
 
 class SConv1d(nn.Module):
     """Conv1d with built-in handling of asymmetric or causal padding and normalization."""
@@ -284,7 +374,7 @@ class SConv1d(nn.Module):
         # For non-streaming mode, calculate padding
         self.padding_total = (kernel_size - 1) * dilation - (stride - 1)
         
-        # Create a unique layer ID for cache management
+        # Unique layer ID for cache management; tokenizer models set it to the module path
         self._layer_id = None
                   
     @property
@@ -446,7 +536,7 @@ class SConvTranspose1d(nn.Module):
         # Transposed conv needs to see multiple input samples to produce correct output
         self.context_size = kernel_size - 1
         
-        # Create a unique layer ID for cache management
+        # Unique layer ID for cache management; tokenizer models set it to the module path
         self._layer_id = None
 
     @property
@@ -480,6 +570,21 @@ class SConvTranspose1d(nn.Module):
                           sample_indices: torch.Tensor,
                           debug: bool = False) -> torch.Tensor:
         """Streaming forward pass with cache operations kept separate from compiled code"""
+        # Weight / spectral norm recompute the weight in a forward pre-hook, which overlap-add does not run
+        if self.convtr.norm_type == 'none' and self.kernel_size >= self.stride:
+            return self._forward_overlap_add(x, cache, sample_indices, debug)
+        return self._forward_rerun(x, cache, sample_indices, debug)
+
+    def _forward_rerun(self, x: torch.Tensor,
+                       cache: VibeVoiceTokenizerStreamingCache,
+                       sample_indices: torch.Tensor,
+                       debug: bool = False) -> torch.Tensor:
+        """
+        Streaming forward pass that reruns the transposed convolution over the cached input and the new frames.
+
+        Layers with a normalization take this path: a norm after the transposed conv needs the full output, and
+        weight / spectral norm recompute the weight on every call of the conv module.
+        """
         B, C, T = x.shape
         
         # Cache operations (not compiled)
@@ -548,6 +653,42 @@ class SConvTranspose1d(nn.Module):
         
         return output
     
+    def _forward_overlap_add(self, x: torch.Tensor,
+                             cache: VibeVoiceTokenizerStreamingCache,
+                             sample_indices: torch.Tensor,
+                             debug: bool = False) -> torch.Tensor:
+        """
+        Streaming forward pass by overlap-add: only the new frames go through the transposed convolution.
+
+        The cache holds the last `kernel_size - stride` samples of the output so far without bias, the part that
+        earlier frames add to samples not produced yet.
+        """
+        B, C, T = x.shape
+        conv = self.convtr.convtr
+        tail_size = self.kernel_size - self.stride
+
+        output = F.conv_transpose1d(x, conv.weight, None, stride=self.stride, groups=conv.groups)
+        tail = cache.get(self.layer_id, sample_indices)
+        if tail is not None and tail_size > 0:
+            output[:, :, :tail_size] += tail
+
+        if debug:
+            print(f"[DEBUG] Input shape: {x.shape}, Tail shape: {None if tail is None else tail.shape}, Output shape: {output.shape}")
+
+        if tail_size > 0:
+            cache.set(self.layer_id, sample_indices, output[:, :, T * self.stride:])
+
+        # Same samples as the unpadded full output: the right padding is the tail
+        if self.causal:
+            padding_right = math.ceil(self.padding_total * self.trim_right_ratio)
+        else:
+            padding_right = self.padding_total // 2
+        padding_left = self.padding_total - padding_right
+        output = output[:, :, padding_left:padding_left + T * self.stride]
+        if conv.bias is not None:
+            output = output + conv.bias[:, None]
+        return output
+
     def _forward_non_streaming(self, x: torch.Tensor, debug: bool = False) -> torch.Tensor:
         """Standard forward pass without streaming"""
         if debug:
@@ -866,6 +1007,11 @@ class VibeVoiceAcousticTokenizerModel(PreTrainedModel):
         decoder_config.disable_last_norm = config.disable_last_norm
         
         self.decoder = TokenizerDecoder(decoder_config)
+
+        # Module paths as streaming cache layer ids, so cache states stay valid across processes and reloads
+        for name, module in self.named_modules():
+            if isinstance(module, (SConv1d, SConvTranspose1d)):
+                module._layer_id = name
         
         # Initialize weights
         self.apply(self._init_weights)
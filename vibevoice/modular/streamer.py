@@ -3,12 +3,23 @@ from __future__ import annotations
 import torch
 
 import asyncio
+import copy
+import threading
 from queue import Queue
-from typing import TYPE_CHECKING, Optional
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
 
 
 from transformers.generation import BaseStreamer
 
+from .modular_vibevoice_text_tokenizer import VibeVoiceIncrementalTextTokenizer
+
+
+def _index_list(sample_indices) -> List[int]:
+    """Sample indices as a list of ints; a tensor is read back once rather than per element."""
+    if torch.is_tensor(sample_indices):
+        return sample_indices.tolist()
+    return [int(idx) for idx in sample_indices]
+
 
 class AudioStreamer(BaseStreamer):
     """
@@ -45,14 +56,13 @@ class AudioStreamer(BaseStreamer):
         
         Args:
             audio_chunks: Tensor of shape (num_samples, ...) containing audio chunks
-            sample_indices: Tensor indicating which samples these chunks belong to
+            sample_indices: Tensor or list indicating which samples these chunks belong to
         """
-        for i, sample_idx in enumerate(sample_indices):
-            idx = sample_idx.item()
+        # One device-to-host copy for the whole batch
+        audio_chunks = audio_chunks.detach().cpu()
+        for i, idx in enumerate(_index_list(sample_indices)):
             if idx < self.batch_size and not self.finished_flags[idx]:
-                # Convert to numpy or keep as tensor based on preference
-                audio_chunk = audio_chunks[i].detach().cpu()
-                self.audio_queues[idx].put(audio_chunk, timeout=self.timeout)
+                self.audio_queues[idx].put(audio_chunks[i], timeout=self.timeout)
     
     def end(self, sample_indices: Optional[torch.Tensor] = None):
         """
@@ -69,8 +79,7 @@ class AudioStreamer(BaseStreamer):
                     self.finished_flags[idx] = True
         else:
             # End specific samples
-            for sample_idx in sample_indices:
-                idx = sample_idx.item() if torch.is_tensor(sample_idx) else sample_idx
+            for idx in _index_list(sample_indices):
                 if idx < self.batch_size and not self.finished_flags[idx]:
                     self.audio_queues[idx].put(self.stop_signal, timeout=self.timeout)
                     self.finished_flags[idx] = True
@@ -165,12 +174,11 @@ class AsyncAudioStreamer(AudioStreamer):
         
     def put(self, audio_chunks: torch.Tensor, sample_indices: torch.Tensor):
         """Put audio chunks in the appropriate async queues."""
-        for i, sample_idx in enumerate(sample_indices):
-            idx = sample_idx.item()
+        audio_chunks = audio_chunks.detach().cpu()
+        for i, idx in enumerate(_index_list(sample_indices)):
             if idx < self.batch_size and not self.finished_flags[idx]:
-                audio_chunk = audio_chunks[i].detach().cpu()
                 self.loop.call_soon_threadsafe(
-                    self.audio_queues[idx].put_nowait, audio_chunk
+                    self.audio_queues[idx].put_nowait, audio_chunks[i]
                 )
     
     def end(self, sample_indices: Optional[torch.Tensor] = None):
@@ -178,7 +186,7 @@ class AsyncAudioStreamer(AudioStreamer):
         if sample_indices is None:
             indices_to_end = range(self.batch_size)
         else:
-            indices_to_end = [s.item() if torch.is_tensor(s) else s for s in sample_indices]
+            indices_to_end = _index_list(sample_indices)
             
         for idx in indices_to_end:
             if idx < self.batch_size and not self.finished_flags[idx]:
@@ -261,4 +269,142 @@ class AsyncAudioBatchIterator:
     
     async def _get_chunk(self, idx):
         """Helper to get a chunk from a specific queue."""
-        return await self.streamer.audio_queues[idx].get()
\ No newline at end of file
+        return await self.streamer.audio_queues[idx].get()
+
+
+class TextInputStream:
+    """
+    Text input that arrives while speech is generated, e.g. the reply of an upstream LLM.
+
+    Text is tokenized as it is fed (see `VibeVoiceIncrementalTextTokenizer`): ids are committed up to the last
+    stable word or punctuation boundary, the tail waits for more text or `close_text`. The ids match those of
+    `VibeVoiceStreamingProcessor`, which tokenizes `text.strip() + "\\n"` in one go. `generate(text_stream=...)`
+    reads them window by window and only blocks when it has caught up with the text.
+
+    Parameters:
+        tokenizer:
+            The text tokenizer (`processor.tokenizer`).
+        timeout (`float`, *optional*):
+            Seconds `generate` waits for a full text window before going on with the text it has. If `None`,
+            it waits until the window is complete or the stream is closed.
+    """
+
+    def __init__(self, tokenizer, timeout: Optional[float] = None):
+        self.tokenizer = tokenizer
+        self.timeout = timeout
+        self.token_ids: List[int] = []
+        self.closed = False
+        self._incremental_tokenizer = VibeVoiceIncrementalTextTokenizer(tokenizer)
+        self._started = False
+        self._condition = threading.Condition()
+
+    def feed_text(self, text: str):
+        """Appends text and commits the ids that it made stable."""
+        with self._condition:
+            if self.closed:
+                raise RuntimeError("Cannot feed text to a closed TextInputStream")
+            if not self._started:
+                # The processor strips leading whitespace off the text
+                text = text.lstrip()
+                self._started = bool(text)
+            token_ids = self._incremental_tokenizer.push(text)
+            if token_ids:
+                self.token_ids.extend(token_ids)
+                self._condition.notify_all()
+
+    def close_text(self):
+        """Marks the end of the text; commits the remaining text and the closing newline."""
+        with self._condition:
+            if self.closed:
+                return
+            self.token_ids.extend(self._incremental_tokenizer.flush(suffix="\n", rstrip=True))
+            self.closed = True
+            self._condition.notify_all()
+
+    def wait_for_tokens(self, num_tokens: int) -> int:
+        """Blocks until `num_tokens` tokens are committed, the stream is closed or `timeout` expires; returns the committed count."""
+        with self._condition:
+            self._condition.wait_for(lambda: self.closed or len(self.token_ids) >= num_tokens, timeout=self.timeout)
+            return len(self.token_ids)
+
+    def __len__(self):
+        return len(self.token_ids)
+
+
+class TextStreamingSession:
+    """
+    Single-voice speech synthesis of text that is still being written.
+
+    Runs `model.generate` with a `TextInputStream` on a worker thread: feed text with `feed_text`, end it with
+    `close_text` and iterate over the session for the audio chunks. Synthesis starts on the first complete
+    text window instead of the whole text.
+
+        session = TextStreamingSession(model, processor, cached_prompt, cfg_scale=1.5)
+        for delta in llm_reply:
+            session.feed_text(delta)
+        session.close_text()
+        audio = torch.cat(list(session), dim=-1)
+
+    In practice the text is fed from another thread (or between chunks) while the audio is consumed.
+
+    Parameters:
+        model (`VibeVoiceStreamingForConditionalGenerationInference`):
+            The streaming model.
+        processor (`VibeVoiceStreamingProcessor`):
+            Processor providing the tokenizer and the prompt inputs.
+        cached_prompt (`dict`):
+            Cached voice prompt outputs; the session works on a copy.
+        timeout (`float`, *optional*):
+            Timeout of the text stream (see `TextInputStream`).
+        **generate_kwargs:
+            Forwarded to `generate` (e.g. `cfg_scale`, `solver`, `first_chunk`).
+    """
+
+    def __init__(self, model, processor, cached_prompt: Dict[str, Any], timeout: Optional[float] = None, **generate_kwargs):
+        self.text_stream = TextInputStream(processor.tokenizer, timeout=timeout)
+        self.audio_streamer = AudioStreamer(batch_size=1)
+        self.errors: List[Exception] = []
+        self._stop_event = threading.Event()
+
+        inputs = processor.process_input_with_cached_prompt(text="", cached_prompt=cached_prompt, return_tensors="pt")
+        inputs = {
+            key: value.to(model.device) if hasattr(value, "to") else value
+            for key, value in inputs.items()
+            if key not in ("tts_text_ids", "tts_text_attention_mask")
+        }
+        generate_kwargs = {"max_new_tokens": None, "show_progress_bar": False, **generate_kwargs, **inputs}
+        generate_kwargs.update(
+            tokenizer=processor.tokenizer,
+            all_prefilled_outputs=copy.deepcopy(cached_prompt),
+            text_stream=self.text_stream,
+            audio_streamer=self.audio_streamer,
+            stop_check_fn=self._stop_event.is_set,
+        )
+        self._thread = threading.Thread(target=self._run, args=(model, generate_kwargs), daemon=True)
+        self._thread.start()
+
+    def _run(self, model, generate_kwargs):
+        try:
+            self.outputs = model.generate(**generate_kwargs)
+        except Exception as exc:
+            self.errors.append(exc)
+            self.audio_streamer.end()
+
+    def feed_text(self, text: str):
+        self.text_stream.feed_text(text)
+
+    def close_text(self):
+        self.text_stream.close_text()
+
+    def __iter__(self):
+        """Yields the audio chunks as they are generated; re-raises a generation error at the end."""
+        yield from self.audio_streamer.get_stream(0)
+        self._thread.join()
+        if self.errors:
+            raise self.errors[0]
+
+    def stop(self):
+        """Stops generation early (the text stream is closed so that a waiting `generate` returns)."""
+        self._stop_event.set()
+        self.text_stream.close_text()
+        self._thread.join()
@@ -0,0 +1,475 @@
+import itertools
+import threading
+import traceback
+from queue import Empty, Queue
+from typing import Any, Dict, List, Optional
+
+import torch
+import torch.nn.functional as F
+
+from transformers.cache_utils import DynamicCache
+from transformers.utils import logging
+
+from .modular_vibevoice_tokenizer import VibeVoiceTokenizerStreamingCache
+from .modeling_vibevoice_streaming_inference import (
+    TTS_SPEECH_WINDOW_SIZE,
+    TTS_TEXT_WINDOW_SIZE,
+    FirstChunkPolicy,
+    _cat_model_kwargs,
+)
+from .streamer import AudioStreamer
+
+logger = logging.get_logger(__name__)
+
+
+def _init_state(prefilled_output, device) -> Dict[str, Any]:
+    """Build a (batch size 1) decoding state from one cached prompt output (`lm`, `tts_lm`, ...)."""
+    cache = prefilled_output.past_key_values
+    return {
+        "past_key_values": DynamicCache.from_legacy_cache(
+            tuple((key.to(device), value.to(device)) for key, value in cache.to_legacy_cache())
+        ),
+        "attention_mask": torch.ones(
+            1, prefilled_output.last_hidden_state.shape[1], dtype=torch.long, device=device
+        ),
+    }
+
+
+def _compact_state(state: Dict[str, Any], rows: Optional[torch.Tensor] = None) -> Dict[str, Any]:
+    """
+    Keep the batch `rows` of a decoding state and squeeze out padding.
+
+    Valid cache columns of every row are moved to the right (keeping their order), so the
+    sequence length shrinks to the longest row. Keys are already rotated, and position ids are
+    derived from the mask, so moving columns does not change the attention result.
+    """
+    attention_mask = state["attention_mask"]
+    legacy_cache = state["past_key_values"].to_legacy_cache()
+    if rows is not None:
+        attention_mask = attention_mask[rows]
+        legacy_cache = tuple((key[rows], value[rows]) for key, value in legacy_cache)
+
+    new_length = int(attention_mask.sum(dim=-1).max().item()) if attention_mask.shape[0] > 0 else 0
+    order = torch.argsort(attention_mask, dim=-1, stable=True)[:, attention_mask.shape[1] - new_length:]
+    compacted = []
+    for key, value in legacy_cache:
+        index = order[:, None, :, None].expand(-1, key.shape[1], -1, key.shape[3])
+        compacted.append((torch.gather(key, 2, index), torch.gather(value, 2, index)))
+    return {
+        "past_key_values": DynamicCache.from_legacy_cache(tuple(compacted)),
+        "attention_mask": torch.gather(attention_mask, 1, order),
+    }
+
+
+class StreamingSession:
+    """
+    One text-to-speech stream served by a `StreamingSessionScheduler`.
+
+    Audio chunks are delivered through `audio_streamer`; iterate the session (or `get_stream()`)
+    to consume them. Call `stop()` to leave the batch early (e.g. on client disconnect).
+    """
+
+    def __init__(
+        self,
+        session_id: int,
+        tts_text_ids: torch.LongTensor,
+        prefilled_outputs: Dict[str, Any],
+        cfg_scale: float,
+        max_length: int,
+    ):
+        self.session_id = session_id
+        self.tts_text_ids = tts_text_ids
+        self.prefilled_outputs = prefilled_outputs
+        self.cfg_scale = cfg_scale
+        self.max_length = max_length
+        self.num_tokens = prefilled_outputs["tts_lm"].last_hidden_state.shape[1]
+
+        self.text_cursor = 0
+        self.window_speech_tokens = 0
+        self.speech_window_size = TTS_SPEECH_WINDOW_SIZE
+        self.num_speech_latents = 0
+        # Last speech latent, the warm start of the next token's diffusion
+        self.previous_latent: Optional[torch.Tensor] = None
+        self.finished = False
+        self.reach_max_step = False
+        self.error: Optional[BaseException] = None
+        self.audio_streamer = AudioStreamer(batch_size=1, stop_signal=None, timeout=None)
+        self._stop_event = threading.Event()
+
+    @property
+    def needs_text(self) -> bool:
+        """Whether the next step of this session is a text window."""
+        return self.window_speech_tokens == 0 and self.text_cursor < self.tts_text_ids.shape[0]
+
+    @property
+    def stopped(self) -> bool:
+        return self._stop_event.is_set()
+
+    def stop(self):
+        """Request the session to leave the batch; its stream ends at the next scheduler step."""
+        self._stop_event.set()
+
+    def get_stream(self):
+        return self.audio_streamer.get_stream(0)
+
+    def __iter__(self):
+        return iter(self.get_stream())
+
+
+class StreamingSessionScheduler:
+    """
+    Iteration-level (continuous) batching for streaming TTS.
+
+    Sessions are submitted at any time and join the running batch at the next step; finished or
+    stopped sessions leave it at speech-token granularity. Each step runs:
+
+      1. One batched text window (`forward_lm` + `forward_tts_lm`) for the sessions whose next
+         step is a text window (just joined, or done with the speech tokens of their window).
+      2. One speech token for every session: batched diffusion (`sample_speech_tokens`, with a
+         per-session cfg scale), acoustic decoding (one shared streaming cache, one slot per
+         session), and the positive / negative `forward_tts_lm` passes plus the EOS check. The negative
+         condition and pass are skipped while no session uses guidance (cfg scale 1.0).
+
+    The KV caches of the running sessions are kept in left-padded batched caches. Joining sessions
+    are padded in, leaving sessions are dropped, and padding is squeezed out when it exceeds
+    `max_padding_ratio` of the cache.
+
+    Args:
+        model: A `VibeVoiceStreamingForConditionalGenerationInference` model.
+        processor: The matching `VibeVoiceStreamingProcessor`.
+        max_batch_size: Maximum number of sessions decoded together; extra sessions wait.
+        max_padding_ratio: Fraction of padded cache entries that triggers a compaction.
+        guidance_interval: Diffusion steps that apply CFG, shared by all sessions (see `sample_speech_tokens`).
+        solver: Registered diffusion solver shared by all sessions, None for the model's `noise_scheduler`.
+        warm_start_sigma: Warm-start diffusion from each session's previous latent at this sigma (see
+            `sample_speech_tokens`); None samples every token from noise.
+        diffusion_steps_schedule: Diffusion steps per speech latent position of a session, the last entry
+            repeating (see `generate`); None uses the model's `ddpm_inference_steps`.
+        x0_tolerance: Early stop of the diffusion loop on converged x0 predictions (see `sample_speech_tokens`).
+        first_chunk: Latency settings for the first window and latents of every session (see `FirstChunkPolicy`).
+        text_window_size, speech_window_size: Steady-state text tokens and speech latents per window of a session.
+    """
+
+    def __init__(
+        self,
+        model,
+        processor,
+        max_batch_size: int = 8,
+        max_padding_ratio: float = 0.5,
+        guidance_interval=None,
+        solver: Optional[str] = None,
+        warm_start_sigma: Optional[float] = None,
+        diffusion_steps_schedule: Optional[List[int]] = None,
+        x0_tolerance: Optional[float] = None,
+        first_chunk: Optional[FirstChunkPolicy] = None,
+        text_window_size: int = TTS_TEXT_WINDOW_SIZE,
+        speech_window_size: int = TTS_SPEECH_WINDOW_SIZE,
+    ):
+        self.model = model
+        self.processor = processor
+        self.max_batch_size = max_batch_size
+        self.max_padding_ratio = max_padding_ratio
+        self.guidance_interval = guidance_interval
+        self.solver = solver
+        self.warm_start_sigma = warm_start_sigma
+        self.diffusion_steps_schedule = diffusion_steps_schedule
+        self.x0_tolerance = x0_tolerance
+        self.first_chunk = first_chunk
+        self.text_window_size = text_window_size
+        self.speech_window_size = speech_window_size
+        self.neg_text_input_id = processor.tokenizer.convert_tokens_to_ids("<|image_pad|>")
+
+        self.sessions: List[StreamingSession] = []
+        self.lm_state: Optional[Dict[str, Any]] = None
+        self.tts_lm_state: Optional[Dict[str, Any]] = None
+        self.tts_lm_negative_state: Optional[Dict[str, Any]] = None
+        self.tts_lm_last_hidden_state: Optional[torch.Tensor] = None
+        self.tts_lm_negative_last_hidden_state: Optional[torch.Tensor] = None
+        self.acoustic_cache = VibeVoiceTokenizerStreamingCache()
+
+        self._pending: "Queue[StreamingSession]" = Queue()
+        self._session_ids = itertools.count()
+        self._wakeup = threading.Event()
+        self._shutdown = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def device(self):
+        return self.model.device
+
+    def submit(
+        self,
+        text: str,
+        cached_prompt: Dict[str, Any],
+        cfg_scale: float = 1.5,
+        max_new_tokens: Optional[int] = None,
+    ) -> StreamingSession:
+        """
+        Queue a new session; it joins the running batch at the next step.
+
+        `max_new_tokens` bounds the text and speech tokens the session adds after the cached prompt, as in
+        `generate`; None allows up to `max_position_embeddings` tokens in total. A session over its budget ends
+        with `reach_max_step` set.
+        """
+        inputs = self.processor.process_input_with_cached_prompt(
+            text=text, cached_prompt=cached_prompt, return_tensors="pt", return_attention_mask=True,
+        )
+        prompt_length = cached_prompt["tts_lm"].last_hidden_state.shape[1]
+        if max_new_tokens is None:
+            max_new_tokens = self.model.config.decoder_config.max_position_embeddings - prompt_length
+        max_length = prompt_length + max_new_tokens
+        session = StreamingSession(
+            session_id=next(self._session_ids),
+            tts_text_ids=inputs["tts_text_ids"][0].to(self.device),
+            prefilled_outputs=cached_prompt,
+            cfg_scale=cfg_scale,
+            max_length=max_length,
+        )
+        self._pending.put(session)
+        self._wakeup.set()
+        return session
+
+    def start(self):
+        """Run the scheduler loop in a background thread."""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._shutdown.clear()
+        self._thread = threading.Thread(target=self.run_forever, daemon=True)
+        self._thread.start()
+
+    def shutdown(self, timeout: Optional[float] = None):
+        self._shutdown.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+
+    def run_forever(self):
+        while not self._shutdown.is_set():
+            if not self.sessions and self._pending.empty():
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            try:
+                self.step()
+            except Exception as exc:  # pragma: no cover - diagnostic logging
+                traceback.print_exc()
+                self._fail_all(exc)
+
+        self._fail_all(None)
+
+    @torch.no_grad()
+    def step(self) -> bool:
+        """Run one scheduler iteration. Returns False if there was nothing to do."""
+        self._evict([session for session in self.sessions if session.stopped])
+        self._admit()
+        if not self.sessions:
+            return False
+
+        if any(session.needs_text for session in self.sessions):
+            self._text_step()
+            # Sessions whose text window overran their token budget stop before sampling speech
+            self._evict([session for session in self.sessions if session.finished])
+            if not self.sessions:
+                return True
+        self._speech_step()
+
+        self._evict([session for session in self.sessions if session.finished or session.stopped])
+        self._maybe_compact()
+        return True
+
+    def _admit(self):
+        new_sessions = []
+        while len(self.sessions) + len(new_sessions) < self.max_batch_size:
+            try:
+                session = self._pending.get_nowait()
+            except Empty:
+                break
+            if session.stopped:
+                session.audio_streamer.end()
+                continue
+            new_sessions.append(session)
+        if not new_sessions:
+            return
+
+        prefilled = [session.prefilled_outputs for session in new_sessions]
+        lm_states = [_init_state(outputs["lm"], self.device) for outputs in prefilled]
+        tts_lm_states = [_init_state(outputs["tts_lm"], self.device) for outputs in prefilled]
+        tts_lm_negative_states = [_init_state(outputs["neg_tts_lm"], self.device) for outputs in prefilled]
+        last_hidden = torch.cat([outputs["tts_lm"].last_hidden_state[:, -1, :] for outputs in prefilled]).to(self.device)
+        negative_last_hidden = torch.cat([outputs["neg_tts_lm"].last_hidden_state[:, -1, :] for outputs in prefilled]).to(self.device)
+
+        if self.sessions:
+            lm_states.insert(0, self.lm_state)
+            tts_lm_states.insert(0, self.tts_lm_state)
+            tts_lm_negative_states.insert(0, self.tts_lm_negative_state)
+            last_hidden = torch.cat([self.tts_lm_last_hidden_state, last_hidden])
+            negative_last_hidden = torch.cat([self.tts_lm_negative_last_hidden_state, negative_last_hidden])
+
+        self.lm_state = _cat_model_kwargs(lm_states)
+        self.tts_lm_state = _cat_model_kwargs(tts_lm_states)
+        self.tts_lm_negative_state = _cat_model_kwargs(tts_lm_negative_states)
+        self.tts_lm_last_hidden_state = last_hidden
+        self.tts_lm_negative_last_hidden_state = negative_last_hidden
+        self.sessions.extend(new_sessions)
+
+    def _evict(self, sessions: List[StreamingSession]):
+        if not sessions:
+            return
+        leaving = set(id(session) for session in sessions)
+        keep = [i for i, session in enumerate(self.sessions) if id(session) not in leaving]
+        slots = torch.tensor([session.session_id for session in sessions], dtype=torch.long)
+        self.acoustic_cache.clear(sample_indices=slots)
+        for session in sessions:
+            session.finished = True
+            session.audio_streamer.end()
+
+        self.sessions = [self.sessions[i] for i in keep]
+        if not self.sessions:
+            self.lm_state = self.tts_lm_state = self.tts_lm_negative_state = None
+            self.tts_lm_last_hidden_state = self.tts_lm_negative_last_hidden_state = None
+            return
+        rows = torch.tensor(keep, dtype=torch.long, device=self.device)
+        self.lm_state = _compact_state(self.lm_state, rows)
+        self.tts_lm_state = _compact_state(self.tts_lm_state, rows)
+        self.tts_lm_negative_state = _compact_state(self.tts_lm_negative_state, rows)
+        self.tts_lm_last_hidden_state = self.tts_lm_last_hidden_state[rows]
+        self.tts_lm_negative_last_hidden_state = self.tts_lm_negative_last_hidden_state[rows]
+
+    def _maybe_compact(self):
+        for name in ("lm_state", "tts_lm_state", "tts_lm_negative_state"):
+            state = getattr(self, name)
+            if state is None:
+                continue
+            attention_mask = state["attention_mask"]
+            if 1.0 - attention_mask.float().mean().item() > self.max_padding_ratio:
+                setattr(self, name, _compact_state(state))
+
+    def _text_step(self):
+        window_lengths = []
+        for session in self.sessions:
+            if not session.needs_text:
+                window_lengths.append(0)
+                continue
+            text_window_size, session.speech_window_size = self.text_window_size, self.speech_window_size
+            if self.first_chunk is not None and session.text_cursor == 0:
+                text_window_size = self.first_chunk.text_window_size
+                session.speech_window_size = self.first_chunk.speech_window_size
+            window_lengths.append(min(session.tts_text_ids.shape[0] - session.text_cursor, text_window_size))
+        window_size = max(window_lengths)
+
+        input_ids = torch.full((len(self.sessions), window_size), self.neg_text_input_id, dtype=torch.long, device=self.device)
+        attention_mask = torch.zeros_like(input_ids)
+        for i, (session, length) in enumerate(zip(self.sessions, window_lengths)):
+            if length == 0:
+                continue
+            input_ids[i, window_size - length:] = session.tts_text_ids[session.text_cursor:session.text_cursor + length]
+            attention_mask[i, window_size - length:] = 1
+            session.text_cursor += length
+            session.num_tokens += length
+            if session.num_tokens > session.max_length:
+                session.finished = True
+                session.reach_max_step = True
+        text_rows = torch.tensor([i for i, length in enumerate(window_lengths) if length > 0], dtype=torch.long, device=self.device)
+
+        lm_outputs = self.model._forward_window(
+            self.model.forward_lm, self.lm_state, input_ids, attention_mask, rows=text_rows,
+        )
+        tts_lm_outputs = self.model._forward_window(
+            self.model.forward_tts_lm, self.tts_lm_state, input_ids, attention_mask, rows=text_rows,
+            tts_text_masks=torch.ones_like(input_ids[:, -1:]),
+            lm_last_hidden_state=lm_outputs.last_hidden_state,
+        )
+        self.tts_lm_last_hidden_state = self.tts_lm_last_hidden_state.clone()
+        self.tts_lm_last_hidden_state[text_rows] = tts_lm_outputs.last_hidden_state[text_rows, -1, :]
+
+    def _speech_step(self):
+        batch_size = len(self.sessions)
+        cfg_scale = torch.tensor(
+            [[session.cfg_scale] for session in self.sessions],
+            dtype=self.tts_lm_last_hidden_state.dtype, device=self.model.prediction_head.device,
+        )
+        warm_start_latents = warm_start_mask = None
+        if self.warm_start_sigma is not None:
+            warm_start_mask = torch.tensor([session.previous_latent is not None for session in self.sessions])
+            warm_start_latents = torch.zeros(
+                batch_size, self.model.config.acoustic_vae_dim,
+                dtype=self.tts_lm_last_hidden_state.dtype, device=self.model.prediction_head.device,
+            )
+            for i, session in enumerate(self.sessions):
+                if session.previous_latent is not None:
+                    warm_start_latents[i] = session.previous_latent
+        positions = [session.num_speech_latents for session in self.sessions]
+        for session in self.sessions:
+            session.num_speech_latents += 1
+        num_steps = None
+        if self.diffusion_steps_schedule is not None:
+            schedule = self.diffusion_steps_schedule
+            num_steps = [schedule[min(position, len(schedule) - 1)] for position in positions]
+        # Without a guided session, the negative condition and the negative tts_lm pass are skipped. A session's
+        # cfg scale is fixed, so the negative state of an unguided session is never read, even if it goes stale.
+        guided = any(session.cfg_scale != 1.0 for session in self.sessions)
+        neg_condition, cfg_scale, num_steps = self.model._apply_first_chunk_policy(
+            self.first_chunk, positions, self.tts_lm_negative_last_hidden_state if guided else None, cfg_scale, num_steps
+        )
+        speech_latent = self.model.sample_speech_tokens(
+            self.tts_lm_last_hidden_state,
+            neg_condition,
+            cfg_scale=cfg_scale,
+            guidance_interval=self.guidance_interval,
+            solver=self.solver,
+            warm_start_latents=warm_start_latents,
+            warm_start_sigma=self.warm_start_sigma,
+            warm_start_mask=warm_start_mask,
+            num_steps=num_steps,
+            x0_tolerance=self.x0_tolerance,
+        ).unsqueeze(1)
+        if self.warm_start_sigma is not None:
+            for i, session in enumerate(self.sessions):
+                session.previous_latent = speech_latent[i, 0]
+
+        # Decode with one acoustic cache slot per session; slots of new sessions start from a zero history
+        acoustic_tokenizer = self.model.model.acoustic_tokenizer
+        scaled_latent = speech_latent / self.model.model.speech_scaling_factor.to(speech_latent.device) - self.model.model.speech_bias_factor.to(speech_latent.device)
+        slots = torch.tensor([session.session_id for session in self.sessions], dtype=torch.long, device=acoustic_tokenizer.device)
+        audio_chunk = acoustic_tokenizer.decode(
+            scaled_latent.to(acoustic_tokenizer.device), cache=self.acoustic_cache, sample_indices=slots, use_cache=True, debug=False,
+        )
+        for i, session in enumerate(self.sessions):
+            session.audio_streamer.put(audio_chunk[i:i + 1], torch.tensor([0]))
+
+        acoustic_embed = self.model.model.acoustic_connector(speech_latent)
+        self.tts_lm_last_hidden_state = self.model._tts_lm_step(self.tts_lm_state, acoustic_embed)
+        if guided:
+            self.tts_lm_negative_last_hidden_state = self.model._tts_lm_step(self.tts_lm_negative_state, acoustic_embed)
+
+        tts_eos = torch.sigmoid(self.model.tts_eos_classifier(self.tts_lm_last_hidden_state))[:, 0] > 0.5
+        for session, eos in zip(self.sessions, tts_eos.tolist()):
+            session.num_tokens += 1
+            session.window_speech_tokens = (session.window_speech_tokens + 1) % session.speech_window_size
+            if eos:
+                session.finished = True
+            elif session.num_tokens > session.max_length:
+                session.finished = True
+                session.reach_max_step = True
+
+    def _fail_all(self, error: Optional[BaseException]):
+        sessions = list(self.sessions)
+        while True:
+            try:
+                sessions.append(self._pending.get_nowait())
+            except Empty:
+                break
+        for session in sessions:
+            session.error = error
+            session.finished = True
+            session.audio_streamer.end()
+        self.sessions = []
+        self.lm_state = self.tts_lm_state = self.tts_lm_negative_state = None
+        self.tts_lm_last_hidden_state = self.tts_lm_negative_last_hidden_state = None
+        self.acoustic_cache.clear()
+
+
+__all__ = [
+    "StreamingSession",
+    "StreamingSessionScheduler",
+]
@@ -169,8 +169,8 @@ class VibeVoiceStreamingProcessor:
 
     def process_input_with_cached_prompt(
         self,
-        text: Optional[str] = None,
-        cached_prompt: Optional[Dict[str, Any]] = None,
+        text: Optional[Union[str, List[str]]] = None,
+        cached_prompt: Optional[Union[Dict[str, Any], List[Dict[str, Any]]]] = None,
         padding: Union[bool, str, PaddingStrategy] = True,
         truncation: Union[bool, str, TruncationStrategy] = False,
         max_length: Optional[int] = None,
@@ -179,13 +179,14 @@ class VibeVoiceStreamingProcessor:
         **kwargs,
     ) -> BatchEncoding:
         """
-        Main method to process one text script based on cached prompt. The function currently only supports single examples.
+        Main method to process text scripts based on cached prompts. Accepts a single example or a batch
+        (one cached prompt per text). Batched prompt ids are left-padded and text ids are right-padded.
 
         Args:
-            text (`str`):
-                The input text to process.
-            cached_prompt (`Dict[str, Any]`, *optional*):
-                The cached prompt to use for processing. It contains the kv cache of the voice prompt.
+            text (`str` or `List[str]`):
+                The input text(s) to process.
+            cached_prompt (`Dict[str, Any]` or `List[Dict[str, Any]]`, *optional*):
+                The cached prompt(s) to use for processing. It contains the kv cache of the voice prompt.
             padding (`bool`, `str` or `PaddingStrategy`, defaults to `True`):
                 Whether to pad sequences to the same length
             truncation (`bool`, `str` or `TruncationStrategy`, defaults to `False`):
@@ -204,14 +205,21 @@ class VibeVoiceStreamingProcessor:
                 - **tts_lm_input_ids** -- List of token id sequences or tensor used for TTS LM
                 - **tts_lm_attention_mask** -- List of attention masks or tensor used for TTS LM
                 - **tts_text_ids** -- List of token id sequences or tensor for TTS text input
+                - **tts_text_attention_mask** -- List of attention masks or tensor for TTS text input
                 - **speech_tensors** -- Padded speech inputs (if voice_samples provided)
                 - **speech_masks** -- Speech masks (if voice_samples provided)
                 - **speech_input_mask** -- Boolean masks indicating speech token positions
         """
-        # Only support single example
-        texts = [text]
-        cached_prompts = [cached_prompt]
-        is_batched = False
+        if isinstance(text, str):
+            texts = [text]
+            cached_prompts = [cached_prompt]
+        else:
+            texts = list(text)
+            cached_prompts = list(cached_prompt) if isinstance(cached_prompt, (list, tuple)) else [cached_prompt] * len(texts)
+            if len(cached_prompts) != len(texts):
+                raise ValueError(
+                    f"Got {len(texts)} texts but {len(cached_prompts)} cached prompts; pass one cached prompt per text."
+                )
         
         # Process each input
         all_encodings = []
@@ -262,8 +270,21 @@ class VibeVoiceStreamingProcessor:
         tts_text_ids_list = [enc["tts_text_ids"] for enc in encodings]
         speech_input_masks_list = [enc["speech_input_mask"] for enc in encodings]
         
-        attention_masks = [[1] * len(ids) for ids in input_ids_list] if return_attention_mask else None
-        tts_lm_attention_masks = [[1] * len(ids) for ids in tts_lm_input_ids_list] if return_attention_mask else None
+        # Prompt ids are left-padded (the cached kv states are left-padded the same way in `generate`),
+        # text ids are right-padded since they are consumed window by window from the start.
+        pad_id = self.tokenizer.pad_id
+        max_input_length = max(len(ids) for ids in input_ids_list)
+        max_tts_lm_input_length = max(len(ids) for ids in tts_lm_input_ids_list)
+        max_tts_text_length = max(len(ids) for ids in tts_text_ids_list)
+
+        attention_masks = [[0] * (max_input_length - len(ids)) + [1] * len(ids) for ids in input_ids_list] if return_attention_mask else None
+        tts_lm_attention_masks = [[0] * (max_tts_lm_input_length - len(ids)) + [1] * len(ids) for ids in tts_lm_input_ids_list] if return_attention_mask else None
+        tts_text_attention_masks = [[1] * len(ids) + [0] * (max_tts_text_length - len(ids)) for ids in tts_text_ids_list] if return_attention_mask else None
+
+        input_ids_list = [[pad_id] * (max_input_length - len(ids)) + ids for ids in input_ids_list]
+        tts_lm_input_ids_list = [[pad_id] * (max_tts_lm_input_length - len(ids)) + ids for ids in tts_lm_input_ids_list]
+        tts_text_ids_list = [ids + [pad_id] * (max_tts_text_length - len(ids)) for ids in tts_text_ids_list]
+        speech_input_masks_list = [[False] * (max_tts_lm_input_length - len(mask)) + mask for mask in speech_input_masks_list]
             
         # Process speech inputs
         all_speech_inputs = []
@@ -285,6 +306,7 @@ class VibeVoiceStreamingProcessor:
             if return_attention_mask and attention_masks is not None:
                 batch_encoding["attention_mask"] = torch.tensor(attention_masks, dtype=torch.long)
                 batch_encoding["tts_lm_attention_mask"] = torch.tensor(tts_lm_attention_masks, dtype=torch.long)
+                batch_encoding["tts_text_attention_mask"] = torch.tensor(tts_text_attention_masks, dtype=torch.long)
             
             batch_encoding["speech_input_mask"] = torch.tensor(speech_input_masks_list, dtype=torch.bool)
         else:
@@ -294,6 +316,7 @@ class VibeVoiceStreamingProcessor:
             if return_attention_mask and attention_masks is not None:
                 batch_encoding["attention_mask"] = attention_masks
                 batch_encoding["tts_lm_attention_mask"] = tts_lm_attention_masks
+                batch_encoding["tts_text_attention_mask"] = tts_text_attention_masks
             batch_encoding["speech_input_mask"] = speech_input_masks_list
             
         # Process speech tensors if present
@@ -0,0 +1,326 @@
+import copy
+import math
+from typing import List, Optional, Tuple
+
+import torch
+
+
+class DPMSolverSamplingPlan:
+    """
+    Precomputed sampling schedule of a `DPMSolverMultistepScheduler` for a fixed number of steps.
+
+    Everything the scheduler rebuilds per call (timesteps, sigmas, alpha/sigma/lambda and the
+    multistep update weights) only depends on the scheduler config and the step count, so it is
+    computed once here. Every DPM-Solver++ update is linear in the current sample, the x0
+    predictions of the last `solver_order` steps and (for the SDE variant) fresh noise:
+
+        x0_i     = convert_coeffs[i][0] * x_i + convert_coeffs[i][1] * model_output_i
+        x_{i+1}  = sample_coeffs[i] * x_i + sum_j x0_coeffs[i][j] * x0_{i-j} + noise_coeffs[i] * noise
+
+    so a diffusion step reduces to a handful of scaled adds with python-float weights.
+
+    Args:
+        scheduler: the `DPMSolverMultistepScheduler` to mirror. It is copied, not modified.
+        num_inference_steps: number of diffusion steps.
+        t_embedder: optional `TimestepEmbedder`; when given its outputs for every timestep are cached
+            in `timestep_embeddings` so the head can skip the sinusoidal embedding and its MLP.
+        device, dtype: where the timesteps and embeddings are kept (match the prediction head).
+        begin_index: first step of the trajectory, for samples that start part-way down the schedule
+            (warm start). The solver order restarts at 1 there; earlier steps are never taken.
+    """
+
+    def __init__(
+        self,
+        scheduler,
+        num_inference_steps: int,
+        t_embedder: Optional[torch.nn.Module] = None,
+        device: Optional[torch.device] = None,
+        dtype: Optional[torch.dtype] = None,
+        begin_index: int = 0,
+    ):
+        config = scheduler.config
+        if config.algorithm_type not in ("dpmsolver++", "sde-dpmsolver++"):
+            raise ValueError(f"Sampling plans only support DPM-Solver++, got {config.algorithm_type}")
+        if config.thresholding:
+            raise ValueError("Sampling plans do not support dynamic thresholding")
+        if config.variance_type in ("learned", "learned_range"):
+            raise ValueError("Sampling plans do not support learned variances")
+
+        scheduler = copy.deepcopy(scheduler)
+        scheduler.set_timesteps(num_inference_steps)
+
+        self.num_inference_steps = len(scheduler.timesteps)
+        if not 0 <= begin_index < self.num_inference_steps:
+            raise ValueError(f"begin_index must be in [0, {self.num_inference_steps}), got {begin_index}")
+        self.begin_index = begin_index
+        self.solver_order = config.solver_order
+        self.stochastic = config.algorithm_type == "sde-dpmsolver++"
+        self.sigmas: List[float] = scheduler.sigmas.tolist()
+        self.timesteps = scheduler.timesteps.to(device)
+        self.timestep_embeddings = None
+        if t_embedder is not None:
+            with torch.no_grad():
+                self.timestep_embeddings = t_embedder(self.timesteps.to(device=device, dtype=dtype))
+
+        self.orders: List[int] = []
+        self.convert_coeffs: List[Tuple[float, float]] = []
+        self.sample_coeffs: List[float] = []
+        self.x0_coeffs: List[Tuple[float, ...]] = []
+        self.noise_coeffs: List[float] = []
+        for step_index in range(self.num_inference_steps):
+            # Steps before `begin_index` are filled in for indexing only
+            order = self._step_order(config, step_index) if step_index >= begin_index else 1
+            if self.stochastic and order == 3:
+                raise ValueError("sde-dpmsolver++ has no third-order update")
+            sample_coeff, x0_coeffs, noise_coeff = self._update_coeffs(config, step_index, order)
+            self.orders.append(order)
+            self.convert_coeffs.append(self._convert_coeffs(config, step_index))
+            self.sample_coeffs.append(sample_coeff)
+            self.x0_coeffs.append(x0_coeffs)
+            self.noise_coeffs.append(noise_coeff)
+
+    def _step_order(self, config, step_index: int) -> int:
+        # Same order selection as `DPMSolverMultistepScheduler.step`
+        num_steps = self.num_inference_steps
+        lower_order_final = step_index == num_steps - 1 and (
+            config.euler_at_final
+            or (config.lower_order_final and num_steps < 15)
+            or config.final_sigmas_type == "zero"
+        )
+        lower_order_second = step_index == num_steps - 2 and config.lower_order_final and num_steps < 15
+        lower_order_nums = min(step_index - self.begin_index, config.solver_order)
+        if config.solver_order == 1 or lower_order_nums < 1 or lower_order_final:
+            return 1
+        if config.solver_order == 2 or lower_order_nums < 2 or lower_order_second:
+            return 2
+        return 3
+
+    def _alpha_sigma_lambda(self, index: int) -> Tuple[float, float, float]:
+        sigma = self.sigmas[index]
+        alpha_t = 1.0 / math.sqrt(sigma**2 + 1.0)
+        sigma_t = sigma * alpha_t
+        lambda_t = math.log(alpha_t) - math.log(sigma_t) if sigma_t > 0 else math.inf
+        return alpha_t, sigma_t, lambda_t
+
+    def _convert_coeffs(self, config, step_index: int) -> Tuple[float, float]:
+        alpha_s, sigma_s, _ = self._alpha_sigma_lambda(step_index)
+        if config.prediction_type == "epsilon":
+            return 1.0 / alpha_s, -sigma_s / alpha_s
+        if config.prediction_type == "v_prediction":
+            return alpha_s, -sigma_s
+        if config.prediction_type == "sample":
+            return 0.0, 1.0
+        raise ValueError(f"Unsupported prediction_type {config.prediction_type}")
+
+    def _update_coeffs(self, config, step_index: int, order: int) -> Tuple[float, Tuple[float, ...], float]:
+        alpha_t, sigma_t, lambda_t = self._alpha_sigma_lambda(step_index + 1)
+        _, sigma_s0, lambda_s0 = self._alpha_sigma_lambda(step_index)
+        h = lambda_t - lambda_s0
+        exp_h = math.exp(-h)
+
+        if self.stochastic:
+            sample_coeff = sigma_t / sigma_s0 * exp_h
+            d0_coeff = alpha_t * (1.0 - math.exp(-2.0 * h))
+            noise_coeff = sigma_t * math.sqrt(1.0 - math.exp(-2.0 * h))
+            if config.solver_type == "midpoint":
+                d1_coeff = 0.5 * d0_coeff
+            else:
+                d1_coeff = alpha_t * ((1.0 - math.exp(-2.0 * h)) / (-2.0 * h) + 1.0)
+            d2_coeff = 0.0
+        else:
+            sample_coeff = sigma_t / sigma_s0
+            d0_coeff = -alpha_t * (exp_h - 1.0)
+            noise_coeff = 0.0
+            if config.solver_type == "midpoint" and order == 2:
+                d1_coeff = 0.5 * d0_coeff
+            else:
+                d1_coeff = alpha_t * ((exp_h - 1.0) / h + 1.0)
+            d2_coeff = -alpha_t * ((exp_h - 1.0 + h) / h**2 - 0.5)
+
+        if order == 1:
+            return sample_coeff, (d0_coeff,), noise_coeff
+
+        # Expand the finite differences D1 (and D2) over the x0 history, newest first
+        _, _, lambda_s1 = self._alpha_sigma_lambda(step_index - 1)
+        r0 = (lambda_s0 - lambda_s1) / h
+        if order == 2:
+            return sample_coeff, (d0_coeff + d1_coeff / r0, -d1_coeff / r0), noise_coeff
+
+        _, _, lambda_s2 = self._alpha_sigma_lambda(step_index - 2)
+        r1 = (lambda_s1 - lambda_s2) / h
+        # D1_0 = (m0 - m1) / r0, D1_1 = (m1 - m2) / r1
+        # D1 = D1_0 + r0 / (r0 + r1) * (D1_0 - D1_1), D2 = (D1_0 - D1_1) / (r0 + r1)
+        w1 = d1_coeff * (1.0 + r0 / (r0 + r1)) + d2_coeff / (r0 + r1)
+        w2 = -(d1_coeff * r0 / (r0 + r1) + d2_coeff / (r0 + r1))
+        c0 = d0_coeff + w1 / r0
+        c1 = -w1 / r0 + w2 / r1
+        c2 = -w2 / r1
+        return sample_coeff, (c0, c1, c2), 0.0
+
+    def step(
+        self,
+        step_index: int,
+        model_output: torch.Tensor,
+        sample: torch.Tensor,
+        x0_history: List[torch.Tensor],
+        generator: Optional[torch.Generator] = None,
+    ) -> torch.Tensor:
+        """
+        Advance `sample` by one step, equivalent to `DPMSolverMultistepScheduler.step`.
+
+        `x0_history` carries the x0 predictions between calls; start every trajectory with an empty
+        list. Returns the previous sample in the dtype of `model_output`.
+        """
+        sample_f32 = sample.to(torch.float32)
+        convert_sample, convert_output = self.convert_coeffs[step_index]
+        x0 = sample_f32 * convert_sample + model_output.to(torch.float32) * convert_output
+        x0_history.append(x0)
+        del x0_history[: -self.solver_order]
+
+        # Plain mul/add rather than `add(..., alpha=)`, which inductor can mis-fuse into a GEMM epilogue
+        prev_sample = sample_f32 * self.sample_coeffs[step_index]
+        for coeff, x0_prev in zip(self.x0_coeffs[step_index], reversed(x0_history)):
+            prev_sample = prev_sample + x0_prev * coeff
+        if self.noise_coeffs[step_index]:
+            noise = torch.randn(
+                sample.shape, generator=generator, device=sample.device, dtype=torch.float32
+            )
+            prev_sample = prev_sample + noise * self.noise_coeffs[step_index]
+        return prev_sample.to(model_output.dtype)
+
+    def rollout(
+        self, sample: torch.Tensor, x0: torch.Tensor, noise: Optional[torch.Tensor] = None
+    ) -> torch.Tensor:
+        """
+        Whole solver trajectory for given x0 predictions, without evaluating the model.
+
+        Args:
+            sample: (B, D) latent at `begin_index`.
+            x0: (K, B, D) x0 prediction of every step from `begin_index` on, K = num_inference_steps - begin_index.
+            noise: (K, B, D) per-step noise, required for stochastic plans.
+
+        Returns:
+            (K + 1, B, D) float32 latents at steps `begin_index` to `num_inference_steps`.
+        """
+        states = [sample.to(torch.float32)]
+        for k, step_index in enumerate(range(self.begin_index, self.num_inference_steps)):
+            prev_sample = states[-1] * self.sample_coeffs[step_index]
+            for j, coeff in enumerate(self.x0_coeffs[step_index]):
+                prev_sample = prev_sample + x0[k - j] * coeff
+            if self.noise_coeffs[step_index]:
+                prev_sample = prev_sample + noise[k] * self.noise_coeffs[step_index]
+            states.append(prev_sample)
+        return torch.stack(states)
+
+    def alpha_sigma(self, step_index: int) -> Tuple[float, float]:
+        """Signal and noise scales of step `step_index`: x_t = alpha_t * x0 + sigma_t * noise."""
+        alpha_t, sigma_t, _ = self._alpha_sigma_lambda(step_index)
+        return alpha_t, sigma_t
+
+
+class DPMSolverBatchPlan:
+    """
+    Several `DPMSolverSamplingPlan`s of one solver in shared coefficient tables, for a batch whose rows follow
+    different plans (step counts, warm-start begin indices).
+
+    The steps of all plans are concatenated, so step i of plan g is entry `offsets[g] + i` of every table.
+    All rows start at iteration 0 from their plan's `begin_index`; a row whose plan has no steps left keeps
+    its sample. The weights of a step are gathered per row, so it is one batched update without per-row
+    python control flow.
+
+    Args:
+        plans: the plans, all with the same solver order and stochasticity.
+    """
+
+    def __init__(self, plans: List[DPMSolverSamplingPlan]):
+        if len({(plan.solver_order, plan.stochastic) for plan in plans}) > 1:
+            raise ValueError("Batched plans need the same solver order and stochasticity")
+        self.plans = list(plans)
+        self.solver_order = plans[0].solver_order
+        self.stochastic = plans[0].stochastic
+        device = plans[0].timesteps.device
+        self.offsets: List[int] = []
+        total = 0
+        for plan in plans:
+            self.offsets.append(total)
+            total += plan.num_inference_steps
+        # Steps every plan runs; iteration k of plan g is step begin_index + k
+        self.num_steps: List[int] = [plan.num_inference_steps - plan.begin_index for plan in plans]
+        self.max_steps = max(self.num_steps)
+        self.begin_table = torch.tensor(
+            [offset + plan.begin_index for offset, plan in zip(self.offsets, plans)], dtype=torch.long, device=device
+        )
+        self.num_steps_table = torch.tensor(self.num_steps, dtype=torch.long, device=device)
+
+        self.timesteps = torch.cat([plan.timesteps for plan in plans])
+        self.timestep_embeddings = None
+        if all(plan.timestep_embeddings is not None for plan in plans):
+            self.timestep_embeddings = torch.cat([plan.timestep_embeddings for plan in plans])
+        self.convert_coeff_table = torch.tensor(
+            [coeffs for plan in plans for coeffs in plan.convert_coeffs], dtype=torch.float32, device=device
+        )
+        self.sample_coeff_table = torch.tensor(
+            [coeff for plan in plans for coeff in plan.sample_coeffs], dtype=torch.float32, device=device
+        )
+        self.x0_coeff_table = torch.tensor(
+            [coeffs + (0.0,) * (self.solver_order - len(coeffs)) for plan in plans for coeffs in plan.x0_coeffs],
+            dtype=torch.float32,
+            device=device,
+        )
+        self.noise_coeff_table = torch.tensor(
+            [coeff for plan in plans for coeff in plan.noise_coeffs], dtype=torch.float32, device=device
+        )
+
+    def new_x0_history(self, batch_size: int, dim: int, device: Optional[torch.device] = None) -> torch.Tensor:
+        """Empty (batch_size, solver_order, dim) x0 history for `batch_step`."""
+        return torch.zeros(batch_size, self.solver_order, dim, dtype=torch.float32, device=device)
+
+    def step_indices(self, plan_indices: torch.LongTensor, iteration: int) -> Tuple[torch.LongTensor, torch.BoolTensor]:
+        """
+        Table indices of the rows of plans `plan_indices` (B,) at `iteration`, and which rows still have a
+        step to run. Rows that are done point at the last step of their plan.
+        """
+        num_steps = self.num_steps_table[plan_indices]
+        return self.begin_table[plan_indices] + (num_steps - 1).clamp(max=iteration), num_steps > iteration
+
+    def batch_step(
+        self,
+        step_indices: torch.LongTensor,
+        model_output: torch.Tensor,
+        sample: torch.Tensor,
+        x0_history: torch.Tensor,
+        active: Optional[torch.BoolTensor] = None,
+        generator: Optional[torch.Generator] = None,
+    ) -> Tuple[torch.Tensor, torch.Tensor]:
+        """
+        Stateless step for a batch of independent trajectories, row b advancing from table entry
+        `step_indices[b]`, equivalent to `DPMSolverSamplingPlan.step` of its plan. History slots a row has not
+        filled yet get zero weights, since every plan restarts at order 1 at its `begin_index`.
+
+        Args:
+            step_indices: (B,) table index of every row (see `step_indices`).
+            model_output: (B, D) prediction head outputs at `timesteps[step_indices]`.
+            sample: (B, D) current samples.
+            x0_history: (B, solver_order, D) earlier x0 predictions, newest first (see `new_x0_history`).
+            active: (B,) rows to advance; the others keep their sample and history. None advances all rows.
+
+        Returns:
+            The previous samples in the dtype of `model_output` and the updated x0 history. The inputs
+            are left untouched.
+        """
+        sample_f32 = sample.to(torch.float32)
+        convert = self.convert_coeff_table[step_indices]
+        x0 = sample_f32 * convert[:, :1] + model_output.to(torch.float32) * convert[:, 1:]
+        new_history = torch.cat([x0.unsqueeze(1), x0_history[:, :-1]], dim=1)
+
+        prev_sample = sample_f32 * self.sample_coeff_table[step_indices].unsqueeze(-1)
+        prev_sample = prev_sample + (self.x0_coeff_table[step_indices].unsqueeze(-1) * new_history).sum(dim=1)
+        if self.stochastic:
+            noise = torch.randn(
+                sample.shape, generator=generator, device=sample.device, dtype=torch.float32
+            )
+            prev_sample = prev_sample + noise * self.noise_coeff_table[step_indices].unsqueeze(-1)
+        if active is not None:
+            prev_sample = torch.where(active[:, None], prev_sample, sample_f32)
+            new_history = torch.where(active[:, None, None], new_history, x0_history)
+        return prev_sample.to(model_output.dtype), new_history
@@ -0,0 +1,75 @@
+from typing import Callable, Dict, List
+
+from diffusers import DEISMultistepScheduler, UniPCMultistepScheduler
+
+from .dpm_solver import DPMSolverMultistepScheduler
+
+
+# name -> builder(base_scheduler) returning a new scheduler with the same noise schedule
+SOLVERS: Dict[str, Callable] = {}
+
+
+def register_solver(name: str):
+    """Register a solver builder under `name`; builders take the model's base `noise_scheduler`."""
+    def decorator(builder):
+        SOLVERS[name] = builder
+        return builder
+    return decorator
+
+
+def available_solvers() -> List[str]:
+    return sorted(SOLVERS)
+
+
+def build_solver(name: str, base_scheduler):
+    """
+    Build the scheduler registered as `name` on the noise schedule of `base_scheduler`.
+
+    The training schedule (betas, timestep count, prediction type, spacing) is taken from the base
+    scheduler, only the sampling algorithm changes.
+    """
+    if name not in SOLVERS:
+        raise ValueError(f"Unknown solver {name!r}, expected one of {available_solvers()}")
+    return SOLVERS[name](base_scheduler)
+
+
+def _schedule_kwargs(base_scheduler):
+    config = base_scheduler.config
+    return dict(
+        num_train_timesteps=config.num_train_timesteps,
+        # Explicit betas: diffusers schedulers do not know every `beta_schedule` name of the vendored solver
+        trained_betas=base_scheduler.betas.numpy(),
+        prediction_type=config.prediction_type,
+        timestep_spacing=config.timestep_spacing,
+        steps_offset=config.steps_offset,
+    )
+
+
+@register_solver("dpm-solver++-2m")
+def _dpm_solver_2m(base_scheduler):
+    return DPMSolverMultistepScheduler(**_schedule_kwargs(base_scheduler), algorithm_type="dpmsolver++", solver_order=2)
+
+
+@register_solver("dpm-solver++-3m")
+def _dpm_solver_3m(base_scheduler):
+    return DPMSolverMultistepScheduler(**_schedule_kwargs(base_scheduler), algorithm_type="dpmsolver++", solver_order=3)
+
+
+@register_solver("sde-dpm-solver++-2m")
+def _sde_dpm_solver_2m(base_scheduler):
+    return DPMSolverMultistepScheduler(**_schedule_kwargs(base_scheduler), algorithm_type="sde-dpmsolver++", solver_order=2)
+
+
+@register_solver("unipc")
+def _unipc(base_scheduler):
+    return UniPCMultistepScheduler(**_schedule_kwargs(base_scheduler), solver_order=2, solver_type="bh2")
+
+
+@register_solver("unipc-3")
+def _unipc_3(base_scheduler):
+    return UniPCMultistepScheduler(**_schedule_kwargs(base_scheduler), solver_order=3, solver_type="bh2")
+
+
+@register_solver("deis")
+def _deis(base_scheduler):
+    return DEISMultistepScheduler(**_schedule_kwargs(base_scheduler), solver_order=3)